@@ -0,0 +1,97 @@
+# scripts/benchmarks/bench_consumer_ingest.py
+"""
+Benchmark consumer ingestion strategies against a local Postgres: executemany INSERT ... ON CONFLICT
+vs COPY into a staging table + one set-based merge. Reports rows per second for each strategy.
+Tables are created in a scratch schema (bench_ingest), dropped at the end.
+
+Usage: POSTGRES_HOST=localhost POSTGRES_USER=postgres POSTGRES_PASSWORD=postgres POSTGRES_DB=postgres \
+       python scripts/benchmarks/bench_consumer_ingest.py [n_entities] [n_stops]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/consumer')))
+from bench_wire_format import make_feed
+from PostgreEngine import PostgreEngine
+
+from consumer import GTFSConsumer
+from producer import iter_entities
+
+SCHEMA = 'bench_ingest'
+
+TABLES = """
+CREATE TABLE trip_updates (
+    feed_timestamp     TIMESTAMPTZ NOT NULL,
+    trip_id            TEXT        NOT NULL,
+    start_time         TIME        NOT NULL,
+    start_date         DATE        NOT NULL,
+    PRIMARY KEY (trip_id, feed_timestamp)
+);
+CREATE TABLE stop_time_updates (
+    feed_timestamp     TIMESTAMPTZ NOT NULL,
+    trip_id            TEXT        NOT NULL,
+    stop_index         SMALLINT    NOT NULL,
+    stop_id            TEXT        NOT NULL,
+    arrival_time       TIMESTAMPTZ,
+    departure_time     TIMESTAMPTZ,
+    arrival_delay      INT,
+    departure_delay    INT,
+    PRIMARY KEY (trip_id, feed_timestamp, stop_index)
+);
+"""
+
+
+def get_engine() -> PostgreEngine:
+    return PostgreEngine(host = os.getenv('POSTGRES_HOST', 'localhost'),
+                         port = os.getenv('POSTGRES_PORT', '5432'),
+                         db = os.getenv('POSTGRES_DB', 'postgres'),
+                         user = os.getenv('POSTGRES_USER', 'postgres'),
+                         password = os.getenv('POSTGRES_PASSWORD', 'postgres'))
+
+
+def get_consumer(strategy: str) -> GTFSConsumer:
+    # No Kafka needed, only the transformation and ingestion methods are used
+    consumer = GTFSConsumer.__new__(GTFSConsumer)
+    consumer.ingest_strategy = strategy
+    return consumer
+
+
+def run(n_entities: int, n_stops: int) -> None:
+    tu_data = list(iter_entities(make_feed(n_entities, n_stops), 'json'))
+    trip_updates, stop_time_updates = get_consumer('insert').decompose_tu_data(tu_data)
+    print(f"{len(trip_updates)} trip updates, {len(stop_time_updates)} stop time updates")
+
+    with get_engine() as engine:
+        engine.execute_query(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        engine.execute_query(f"CREATE SCHEMA {SCHEMA}")
+        engine.execute_query(f"SET search_path TO {SCHEMA}")
+        engine.execute_query(TABLES)
+        engine.commit()
+
+        try:
+            for strategy in ('insert', 'copy'):
+                consumer = get_consumer(strategy)
+                # First pass inserts, second pass updates every row (conflicts)
+                for label in ('insert', 'upsert'):
+                    start = time.perf_counter()
+                    consumer.ingest_data(engine, 'trip_updates', trip_updates)
+                    consumer.ingest_data(engine, 'stop_time_updates', stop_time_updates)
+                    engine.commit()
+                    elapsed = time.perf_counter() - start
+                    n_rows = len(trip_updates) + len(stop_time_updates)
+                    print(f"  {strategy:<6} {label:<6}: {n_rows / elapsed:>10.0f} rows/s ({elapsed:.2f}s)")
+                engine.execute_query("TRUNCATE trip_updates, stop_time_updates")
+                engine.commit()
+        finally:
+            engine.execute_query(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            engine.commit()
+
+
+if __name__ == '__main__':
+    n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_stops = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    run(n_entities, n_stops)
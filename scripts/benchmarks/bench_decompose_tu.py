@@ -0,0 +1,55 @@
+# scripts/benchmarks/bench_decompose_tu.py
+"""
+Microbenchmark of the trip update decomposition: decompose_tu_data (dicts, then tuples for ingestion)
+vs decompose_tu_rows (memoized epoch conversion, tuples ready for COPY). Reports time per stop time row.
+
+Usage: python scripts/benchmarks/bench_decompose_tu.py [n_entities] [n_stops]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/consumer')))
+from bench_wire_format import make_feed
+
+from consumer import GTFSConsumer, epoch_to_datetime
+from producer import iter_entities
+
+
+def best_of(function, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(n_entities: int, n_stops: int) -> None:
+    tu_data = list(iter_entities(make_feed(n_entities, n_stops), 'json'))
+    consumer = GTFSConsumer.__new__(GTFSConsumer)
+
+    def dict_path():
+        trip_updates, stop_time_updates = consumer.decompose_tu_data(tu_data)
+        return [tuple(row.values()) for row in trip_updates], [tuple(row.values()) for row in stop_time_updates]
+
+    def row_path():
+        epoch_to_datetime.cache_clear()
+        return consumer.decompose_tu_rows(tu_data)
+
+    assert dict_path() == row_path()
+    n_rows = len(row_path()[1])
+    dict_time = best_of(dict_path)
+    row_time = best_of(row_path)
+    print(f"{n_entities} trip updates, {n_rows} stop time rows")
+    print(f"  decompose_tu_data + tuples : {dict_time * 1e6 / n_rows:.2f} us/row ({dict_time:.3f}s)")
+    print(f"  decompose_tu_rows          : {row_time * 1e6 / n_rows:.2f} us/row ({row_time:.3f}s), x{dict_time / row_time:.1f}")
+
+
+if __name__ == '__main__':
+    n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_stops = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    run(n_entities, n_stops)
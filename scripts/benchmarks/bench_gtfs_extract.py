@@ -0,0 +1,90 @@
+# scripts/benchmarks/bench_gtfs_extract.py
+"""
+Benchmark the GTFS static extract on a synthetic SNCF-sized archive served over local HTTP:
+disk mode (tmp_gtfs, legacy) vs spooled / in-memory streamed modes reading only the loaded tables.
+Each mode runs in its own subprocess so that the peak RSS only covers that mode.
+
+Usage: python scripts/benchmarks/bench_gtfs_extract.py [n_trips] [stops_per_trip]
+"""
+import functools
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/gtfs_update')))
+
+from bench_producer_memory import max_rss_mb
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def make_gtfs_archive(path: str, n_trips: int, stops_per_trip: int) -> None:
+    """
+    Write a GTFS zip with SNCF-like member shapes (stop_times dominates, plus members the pipeline drops)
+    """
+    n_stops = 9000
+    n_routes = 1500
+    with zipfile.ZipFile(path, 'w', compression = zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('agency.txt', 'agency_id,agency_name,agency_url,agency_timezone,agency_lang\n'
+                    'SNCF,SNCF,https://www.sncf.com,Europe/Paris,fr\n')
+        zf.writestr('feed_info.txt', 'feed_publisher_name,feed_publisher_url,feed_lang\nSNCF,https://www.sncf.com,fr\n')
+        zf.writestr('stops.txt', 'stop_id,stop_name,stop_desc,stop_lat,stop_lon,zone_id,stop_url,location_type,parent_station\n' + ''.join(
+            f'StopPoint:OCE{i},Gare {i},,{43 + i % 700 / 100:.5f},{1 + i % 900 / 100:.5f},,,0,StopArea:OCE{i}\n' for i in range(n_stops)))
+        zf.writestr('routes.txt', 'route_id,agency_id,route_short_name,route_long_name,route_desc,route_type,route_url,route_color,route_text_color\n' + ''.join(
+            f'OCE{i},SNCF,{i},Ligne {i},,2,,,\n' for i in range(n_routes)))
+        zf.writestr('trips.txt', 'route_id,service_id,trip_id,trip_headsign,direction_id,block_id,shape_id\n' + ''.join(
+            f'OCE{i % n_routes},{i},OCESN{i}F,{i},0,,\n' for i in range(n_trips)))
+        zf.writestr('calendar_dates.txt', 'service_id,date,exception_type\n' + ''.join(
+            f'{i},202501{d:02d},1\n' for i in range(n_trips) for d in range(1, 11)))
+        zf.writestr('transfers.txt', 'from_stop_id,to_stop_id,transfer_type,min_transfer_time\n' + ''.join(
+            f'StopPoint:OCE{i},StopPoint:OCE{i + 1},2,300\n' for i in range(n_stops - 1)))
+        with zf.open('stop_times.txt', 'w') as f:
+            f.write(b'trip_id,arrival_time,departure_time,stop_id,stop_sequence,stop_headsign,pickup_type,drop_off_type,shape_dist_traveled\n')
+            for i in range(n_trips):
+                start = 5 * 3600 + (i * 37) % (19 * 3600)
+                f.write(''.join(
+                    f'OCESN{i}F,{(t := start + s * 900) // 3600:02d}:{t // 60 % 60:02d}:00,{(t + 120) // 3600:02d}:{(t + 120) // 60 % 60:02d}:00,'
+                    f'StopPoint:OCE{(i + s * 7) % n_stops},{s},,0,0,\n'
+                    for s in range(stops_per_trip)).encode('utf-8'))
+
+
+def run_mode(mode: str, url: str) -> None:
+    import gtfs_update
+
+    baseline = max_rss_mb()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        df_dict = gtfs_update.pipeline_extract(url, mode = mode, spool_max_size = 8 * 1024 * 1024, tables = gtfs_update.GTFS_TABLES)
+    elapsed = time.perf_counter() - start
+    rows = sum(len(df) for df in df_dict.values())
+    print(f"  {mode:<8}: {elapsed:6.2f} s, peak RSS {max_rss_mb():7.1f} MB (baseline {baseline:6.1f} MB), "
+          f"{len(df_dict)} tables, {rows} rows")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in ('disk', 'spooled', 'memory'):
+        run_mode(sys.argv[1], sys.argv[2])
+    else:
+        n_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+        stops_per_trip = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+        with tempfile.TemporaryDirectory() as served_dir:
+            archive_path = os.path.join(served_dir, 'export_gtfs_voyages.zip')
+            make_gtfs_archive(archive_path, n_trips, stops_per_trip)
+            handler = functools.partial(QuietHandler, directory = served_dir)
+            server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+            threading.Thread(target = server.serve_forever, daemon = True).start()
+            url = f"http://127.0.0.1:{server.server_port}/export_gtfs_voyages.zip"
+            print(f"{n_trips} trips, {n_trips * stops_per_trip} stop_times ({os.path.getsize(archive_path) / 1e6:.1f} MB zip)")
+            for mode in ('disk', 'spooled', 'memory'):
+                subprocess.run([sys.executable, __file__, mode, url], check = True)
+            server.shutdown()
@@ -0,0 +1,87 @@
+# scripts/benchmarks/bench_gtfs_load.py
+"""
+Benchmark GTFS static load strategies against a local Postgres on a synthetic SNCF-like feed:
+executemany INSERT ... ON CONFLICT (legacy) vs COPY into staging tables + one set-based merge per table.
+Reports rows per second for each strategy, on empty tables (insert) then on loaded tables (upsert).
+GTFS tables of src/postgres/init.sql are created in a scratch schema (bench_gtfs_load), dropped at the end.
+
+Usage: POSTGRES_HOST=localhost POSTGRES_USER=postgres POSTGRES_PASSWORD=postgres POSTGRES_DB=postgres \
+       python scripts/benchmarks/bench_gtfs_load.py [n_trips] [stops_per_trip]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/gtfs_update')))
+from bench_gtfs_extract import make_gtfs_archive
+from PostgreEngine import PostgreEngine
+
+import gtfs_update
+
+SCHEMA = 'bench_gtfs_load'
+INIT_SQL_FILEPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/postgres/init.sql'))
+
+
+def gtfs_tables_ddl() -> str:
+    """
+    GTFS tables, indexes and foreign keys of init.sql
+    """
+    with open(INIT_SQL_FILEPATH) as f:
+        init_sql = f.read()
+    return init_sql[init_sql.index('-- GTFS Data'):init_sql.index('-- Read only role')]
+
+
+def run(n_trips: int, stops_per_trip: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive_path = os.path.join(tmp_dir, 'gtfs.zip')
+        make_gtfs_archive(archive_path, n_trips, stops_per_trip)
+        df_dict = gtfs_update.pipeline_transform(gtfs_update.load_df_dict_from_zip(archive_path, tables = gtfs_update.GTFS_TABLES))
+    n_rows = sum(len(df) for df in df_dict.values())
+    print(f"{n_trips} trips, {len(df_dict['stop_times'])} stop_times, {n_rows} rows")
+
+    pg_vars = {
+        'POSTGRES_HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'POSTGRES_PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'POSTGRES_DB': os.getenv('POSTGRES_DB', 'postgres'),
+        'POSTGRES_USER': os.getenv('POSTGRES_USER', 'postgres'),
+        'POSTGRES_PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres')
+    }
+    # pipeline_load opens its own connection, libpq picks the scratch schema up from PGOPTIONS
+    os.environ['PGOPTIONS'] = f"-c search_path={SCHEMA}"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = PostgreEngine(pg_vars['POSTGRES_HOST'], pg_vars['POSTGRES_PORT'], pg_vars['POSTGRES_DB'], pg_vars['POSTGRES_USER'], pg_vars['POSTGRES_PASSWORD'])
+        engine.connect()
+        engine.execute_query(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        engine.execute_query(f"CREATE SCHEMA {SCHEMA}")
+        engine.execute_query(f"SET search_path TO {SCHEMA}")
+        engine.execute_query(gtfs_tables_ddl())
+        engine.commit()
+
+    try:
+        for strategy in gtfs_update.LOAD_STRATEGIES:
+            # First pass inserts, second pass updates every row (conflicts)
+            for label in ('insert', 'upsert'):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    gtfs_update.pipeline_load(df_dict, pg_vars, strategy = strategy)
+                elapsed = time.perf_counter() - start
+                print(f"  {strategy:<6} {label:<6}: {n_rows / elapsed:>10.0f} rows/s ({elapsed:.2f}s)")
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine.execute_query(f"TRUNCATE {', '.join(gtfs_update.GTFS_TABLES)}")
+                engine.commit()
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.execute_query(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            engine.commit()
+            engine.close()
+
+
+if __name__ == '__main__':
+    n_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    stops_per_trip = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    run(n_trips, stops_per_trip)
@@ -0,0 +1,54 @@
+# scripts/benchmarks/bench_gtfs_read_csv.py
+"""
+Benchmark parsing stop_times.txt of a synthetic SNCF-sized archive:
+untyped pd.read_csv (legacy) vs the GTFS_SCHEMAS typed, column-pruned read with the c and pyarrow engines.
+
+Usage: python scripts/benchmarks/bench_gtfs_read_csv.py [n_trips] [stops_per_trip] [repeat]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/gtfs_update')))
+
+from bench_gtfs_extract import make_gtfs_archive
+
+import gtfs_update
+
+
+def best_of(fn, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == '__main__':
+    n_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    stops_per_trip = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive_path = os.path.join(tmp_dir, 'gtfs.zip')
+        make_gtfs_archive(archive_path, n_trips, stops_per_trip)
+        with zipfile.ZipFile(archive_path) as zf:
+            content = zf.read('stop_times.txt')
+    print(f"stop_times.txt: {n_trips * stops_per_trip} rows ({len(content) / 1e6:.0f} MB), best of {repeat}")
+
+    modes = {
+        'untyped': lambda: pd.read_csv(io.BytesIO(content)),
+        'typed-c': lambda: gtfs_update.read_gtfs_csv(io.BytesIO(content), 'stop_times', engine = 'c'),
+        'typed-pyarrow': lambda: gtfs_update.read_gtfs_csv(io.BytesIO(content), 'stop_times', engine = 'pyarrow')
+    }
+    for mode, fn in modes.items():
+        elapsed, df = best_of(fn, repeat)
+        memory = df.memory_usage(deep = True).sum() / 1e6
+        print(f"  {mode:<14}: {elapsed:6.3f} s, {len(df) / elapsed:12,.0f} rows/s, dataframe {memory:7.1f} MB, {len(df.columns)} columns")
@@ -0,0 +1,56 @@
+# scripts/benchmarks/bench_gtfs_time_conversion.py
+"""
+Benchmark GTFS time conversion of stop_times arrival / departure times:
+row-wise Series.apply of the reference converters (legacy) vs the vectorized converters.
+
+Usage: python scripts/benchmarks/bench_gtfs_time_conversion.py [n_rows] [repeat]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/gtfs_update')))
+
+import gtfs_update
+
+
+def make_times(n_rows: int) -> pd.Series:
+    """
+    GTFS times between 04:00:00 and 27:59:59 (over-midnight night trains), with a few missing values
+    """
+    rng = np.random.default_rng(42)
+    seconds = rng.integers(4 * 3600, 28 * 3600, n_rows)
+    times = pd.Series([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds], dtype = 'str')
+    times[rng.random(n_rows) < 0.01] = None
+    return times
+
+
+def best_of(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    times = make_times(n_rows)
+    print(f"{n_rows} GTFS times, best of {repeat}")
+
+    cases = {
+        'time (apply)': lambda: times.apply(gtfs_update.convert_gtfs_time_to_time),
+        'time (vectorized)': lambda: gtfs_update.convert_gtfs_times_to_time(times),
+        'timestamp (apply)': lambda: times.apply(gtfs_update.convert_gtfs_time_to_timestamp),
+        'timestamp (vectorized)': lambda: gtfs_update.convert_gtfs_times_to_timestamp(times),
+        'seconds (vectorized)': lambda: gtfs_update.convert_gtfs_times_to_seconds(times)
+    }
+    for case, fn in cases.items():
+        elapsed = best_of(fn, repeat)
+        print(f"  {case:<23}: {elapsed:6.3f} s, {n_rows / elapsed:12,.0f} rows/s")
@@ -0,0 +1,130 @@
+# scripts/benchmarks/bench_kafka_publish.py
+"""
+Benchmark per-cycle publish latency against a local fake broker:
+one KafkaProducer per send_to_kafka call (legacy) vs the long-lived KafkaEngine producer
+
+The fake broker simulates network round trips (TCP setup + metadata fetch per broker on bootstrap,
+one round trip per produce request of up to batch_size bytes). It does not speak the Kafka protocol.
+
+Usage: python scripts/benchmarks/bench_kafka_publish.py [n_records] [rtt_ms]
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+import KafkaEngine as kafka_engine_module
+from KafkaEngine import KafkaEngine
+
+from producer import send_to_kafka
+
+RTT = 0.005
+
+
+class FakeFuture:
+    def __init__(self):
+        self._callbacks = []
+        self._done = False
+
+    def add_callback(self, callback):
+        if self._done:
+            callback(None)
+        else:
+            self._callbacks.append(callback)
+        return self
+
+    def add_errback(self, errback):
+        return self
+
+    def resolve(self):
+        self._done = True
+        for callback in self._callbacks:
+            callback(None)
+
+
+class FakeBrokerProducer:
+    """
+    KafkaProducer look-alike: bootstrap and produce requests cost simulated round trips
+    """
+    def __init__(self, bootstrap_servers, value_serializer, linger_ms = 0, batch_size = 16384, **kwargs):
+        self.serializer = value_serializer
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_bytes = 0
+        self.lock = threading.Lock()
+        # TCP + API versions + metadata for each broker
+        time.sleep(RTT * 3 * len(bootstrap_servers))
+
+    def send(self, topic, value, key = None, headers = None):
+        future = FakeFuture()
+        size = len(self.serializer(value)) + (len(key) if key else 0)
+        with self.lock:
+            self.pending.append(future)
+            self.pending_bytes += size
+            if self.pending_bytes >= self.batch_size:
+                self._produce_request()
+        return future
+
+    def _produce_request(self):
+        time.sleep(RTT)
+        for future in self.pending:
+            future.resolve()
+        self.pending = []
+        self.pending_bytes = 0
+
+    def flush(self, timeout = None):
+        with self.lock:
+            if self.pending:
+                self._produce_request()
+
+    def close(self, timeout = None):
+        self.flush()
+
+
+def legacy_send_to_kafka(brokers, topic, data):
+    """
+    Previous send_to_kafka: new producer, send, flush and close on every call
+    """
+    producer = FakeBrokerProducer(bootstrap_servers = brokers,
+                                  value_serializer = lambda v: json.dumps(v).encode("utf-8"))
+    for record in data:
+        producer.send(topic, record)
+    producer.flush()
+    producer.close()
+
+
+def run(n_records: int, n_cycles: int = 5) -> None:
+    brokers = ["kafka1:29092", "kafka2:29093"]
+    data = [{'id': f'trip_{i}', 'trip_update': {'trip': {'tripId': f'trip_{i}'}, 'stopTimeUpdate': [{'stopId': 'StopPoint:OCE1', 'arrival': {'delay': 60}}] * 10}}
+            for i in range(n_records)]
+
+    legacy_times = []
+    for _ in range(n_cycles):
+        start = time.perf_counter()
+        legacy_send_to_kafka(brokers, 'gtfs-rt-tu', data)
+        legacy_times.append(time.perf_counter() - start)
+
+    engine_times = []
+    with patch.object(kafka_engine_module, 'KafkaProducer', FakeBrokerProducer), contextlib.redirect_stdout(io.StringIO()):
+        engine = KafkaEngine(brokers)
+        for _ in range(n_cycles):
+            start = time.perf_counter()
+            send_to_kafka(engine, 'gtfs-rt-tu', data)
+            engine_times.append(time.perf_counter() - start)
+        engine.close()
+
+    print(f"{n_records} records per cycle, {n_cycles} cycles, simulated RTT {RTT * 1000:.1f} ms")
+    print(f"  producer per call : first {legacy_times[0] * 1000:8.1f} ms, mean {sum(legacy_times) / n_cycles * 1000:8.1f} ms")
+    print(f"  long-lived engine : first {engine_times[0] * 1000:8.1f} ms, mean {sum(engine_times) / n_cycles * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    RTT = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else RTT
+    run(n_records)
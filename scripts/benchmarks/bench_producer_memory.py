@@ -0,0 +1,102 @@
+# scripts/benchmarks/bench_producer_memory.py
+"""
+Benchmark producer peak RSS on a synthetic feed: whole-feed lists (legacy) vs streaming chunks
+Each mode runs in its own subprocess so that the peak RSS only covers that mode.
+Redis is a local fake Redis, Kafka is a sink serializing records.
+
+Usage: python scripts/benchmarks/bench_producer_memory.py [n_entities] [chunk_size]
+"""
+import contextlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+
+
+class SinkKafkaEngine:
+    """
+    KafkaEngine stand-in serializing records and dropping them
+    """
+    wire_format = 'json'
+
+    def __init__(self):
+        from KafkaEngine import WIRE_FORMAT_SERIALIZERS
+        self.serialize = WIRE_FORMAT_SERIALIZERS[self.wire_format]
+        self.sent = 0
+
+    def send(self, topic, records, key = None):
+        for record in records:
+            self.serialize(record)
+        self.sent += len(records)
+        return len(records)
+
+
+def max_rss_mb() -> float:
+    """
+    Peak RSS of this process (VmHWM, ru_maxrss keeps the parent peak across exec on Linux)
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, feed_path: str, chunk_size: int) -> None:
+    import fakeredis
+    from LRUCache import LRUCache
+    from RedisEngine import LOCAL_CACHE_DEFAULTS, RedisEngine
+
+    import producer
+
+    with open(feed_path, 'rb') as f:
+        content = f.read()
+    redis_engine = RedisEngine.__new__(RedisEngine)
+    redis_engine.local_cache, redis_engine.outage_cache = None, LRUCache(**LOCAL_CACHE_DEFAULTS)
+    redis_engine.conn = fakeredis.FakeRedis(decode_responses=True)
+    kafka_engine = SinkKafkaEngine()
+    baseline = max_rss_mb()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'legacy':
+            feed = producer.gtfs_realtime_pb2.FeedMessage()
+            feed.ParseFromString(content)
+            _, all_data = producer.extract_ids_and_trip_updates(feed)
+            filtered_data = producer.filter_already_sent(redis_engine, 'trip_update', all_data)
+            producer.send_to_kafka(kafka_engine, 'gtfs-rt-tu', filtered_data)
+        else:
+            def fetch(url, session, state):
+                feed = producer.gtfs_realtime_pb2.FeedMessage()
+                feed.ParseFromString(content)
+                state['status'] = 'changed'
+                return feed
+            producer.fetch_gtfs_rt = fetch
+            producer.process_feed_data('http://feed', 'trip_update', 'gtfs-rt-tu', redis_engine, kafka_engine, chunk_size=chunk_size)
+
+    print(f"  {mode:<9}: peak RSS {max_rss_mb():7.1f} MB (baseline {baseline:7.1f} MB), {kafka_engine.sent} sent")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in ('legacy', 'streaming'):
+        run_mode(sys.argv[1], sys.argv[2], int(sys.argv[3]))
+    else:
+        from bench_wire_format import make_feed
+        n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+        chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        with tempfile.NamedTemporaryFile(suffix='.pb') as feed_file:
+            content = make_feed(n_entities, 15).SerializeToString()
+            feed_file.write(content)
+            feed_file.flush()
+            print(f"{n_entities} trip updates, 15 stops each ({len(content) / 1e6:.0f} MB), chunk size {chunk_size}")
+            del content
+            for mode in ('legacy', 'streaming'):
+                subprocess.run([sys.executable, __file__, mode, feed_file.name, str(chunk_size)], check=True)
@@ -0,0 +1,108 @@
+# scripts/benchmarks/bench_producer_runtimes.py
+"""
+Benchmark one polling cycle over N feeds: threaded runtime vs asyncio runtime, with local stubs
+(aiohttp HTTP stub with simulated upstream latency, fake Redis, Kafka sinks)
+
+Usage: python scripts/benchmarks/bench_producer_runtimes.py [latency_ms] [entities_per_feed]
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+import aiohttp
+import fakeredis
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+from AsyncRedisEngine import AsyncRedisEngine
+from bench_wire_format import make_feed
+from LRUCache import LRUCache
+from producer_async import process_feed_data_async
+from RedisEngine import LOCAL_CACHE_DEFAULTS, RedisEngine
+
+import producer
+
+
+class SinkKafkaEngine:
+    wire_format = 'msgpack'
+    def send(self, topic, records, key = None):
+        return len(records)
+
+
+class AsyncSinkKafkaEngine(SinkKafkaEngine):
+    async def send(self, topic, records, key = None):
+        return len(records)
+
+
+def start_stub(body: bytes, latency: float) -> str:
+    """
+    aiohttp stub on its own thread and event loop, every path serves the same feed after {latency} seconds
+    """
+    started = threading.Event()
+    address = {}
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return web.Response(body=body)
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get('/{name}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        address['url'] = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    started.wait()
+    return address['url']
+
+
+def make_feeds(base_url: str, n_feeds: int, run: str) -> list[dict]:
+    return [{'url': f'{base_url}/{run}_{i}', 'redis_type': f'{run}_{i}', 'topic': f'topic_{i}'} for i in range(n_feeds)]
+
+
+def run_threaded(feeds: list[dict], max_workers: int) -> float:
+    redis_engine = RedisEngine.__new__(RedisEngine)
+    redis_engine.local_cache, redis_engine.outage_cache = None, LRUCache(**LOCAL_CACHE_DEFAULTS)
+    redis_engine.conn = fakeredis.FakeRedis(decode_responses=True)
+    kafka_engine = SinkKafkaEngine()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(producer.process_feed_data, feed['url'], feed['redis_type'], feed['topic'], redis_engine, kafka_engine)
+                   for feed in feeds]
+        concurrent.futures.wait(futures)
+    return time.perf_counter() - start
+
+
+async def run_asyncio(feeds: list[dict]) -> float:
+    redis_engine = AsyncRedisEngine(host='localhost', port=6379)
+    redis_engine.conn = fakeredis.FakeAsyncRedis(decode_responses=True)
+    kafka_engine = AsyncSinkKafkaEngine()
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(process_feed_data_async(feed, session, redis_engine, kafka_engine) for feed in feeds))
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.2
+    n_entities = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    base_url = start_stub(make_feed(n_entities, 15).SerializeToString(), latency)
+    print(f"Upstream latency {latency * 1000:.0f} ms, {n_entities} entities per feed, wall time of one cycle")
+    for n_feeds in (2, 8, 32):
+        with contextlib.redirect_stdout(io.StringIO()):
+            two_threads = run_threaded(make_feeds(base_url, n_feeds, f'pool2_{n_feeds}'), 2)
+            thread_per_feed = run_threaded(make_feeds(base_url, n_feeds, f'pooln_{n_feeds}'), n_feeds)
+            event_loop = asyncio.run(run_asyncio(make_feeds(base_url, n_feeds, f'async_{n_feeds}')))
+        print(f"  {n_feeds:>2} feeds: threads(2) {two_threads:6.2f}s, thread per feed {thread_per_feed:6.2f}s, asyncio {event_loop:6.2f}s")
@@ -0,0 +1,129 @@
+# scripts/benchmarks/bench_redis_dedup.py
+"""
+Benchmark producer deduplication against a local fake Redis: per-entity EXISTS + SET vs pipelined SET NX EX,
+and steady-state polling (same feed every cycle, a few new ids) with and without the local dedup cache
+
+Usage: python scripts/benchmarks/bench_redis_dedup.py [n_entities]
+"""
+import os
+import sys
+import time
+
+import fakeredis
+
+import redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+from LRUCache import LRUCache
+from RedisEngine import LOCAL_CACHE_DEFAULTS, RedisEngine
+
+from producer import filter_already_sent, is_already_sent
+
+
+class RoundTripCounter:
+    """
+    Count network round trips: one per immediate command, one per pipeline execution
+    """
+    def __init__(self):
+        self.count = 0
+        self._execute_command = redis.Redis.execute_command
+        self._pipeline_execute = redis.client.Pipeline.execute
+
+    def __enter__(self):
+        counter = self
+
+        def execute_command(client, *args, **kwargs):
+            counter.count += 1
+            return counter._execute_command(client, *args, **kwargs)
+
+        def pipeline_execute(pipe, *args, **kwargs):
+            counter.count += 1
+            return counter._pipeline_execute(pipe, *args, **kwargs)
+
+        redis.Redis.execute_command = execute_command
+        redis.client.Pipeline.execute = pipeline_execute
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        redis.Redis.execute_command = self._execute_command
+        redis.client.Pipeline.execute = self._pipeline_execute
+
+
+class CommandCounter(RoundTripCounter):
+    """
+    Count Redis commands (pipelined commands and one command per key of a script call included)
+    """
+    def __enter__(self):
+        counter = self
+
+        def execute_command(client, *args, **kwargs):
+            counter.count += int(args[2]) if args[0] == 'EVAL' else 1
+            return counter._execute_command(client, *args, **kwargs)
+
+        def pipeline_execute(pipe, *args, **kwargs):
+            counter.count += len(pipe.command_stack)
+            return counter._pipeline_execute(pipe, *args, **kwargs)
+
+        redis.Redis.execute_command = execute_command
+        redis.client.Pipeline.execute = pipeline_execute
+        return self
+
+
+def get_engine(local_cache: LRUCache = None) -> RedisEngine:
+    engine = RedisEngine.__new__(RedisEngine)
+    engine.host, engine.port = 'fake', 0
+    engine.local_cache = local_cache
+    engine.outage_cache = LRUCache(**LOCAL_CACHE_DEFAULTS) if local_cache is None else None
+    engine.conn = fakeredis.FakeRedis(decode_responses=True)
+    return engine
+
+
+def run_steady_state(n_entities: int, n_cycles: int = 10, new_per_cycle: int = 20) -> None:
+    """
+    Poll the same feed {n_cycles} times, {new_per_cycle} entities appearing at each cycle
+    """
+    feeds = [[{'id': f'trip_{i}'} for i in range(cycle * new_per_cycle, cycle * new_per_cycle + n_entities)]
+             for cycle in range(n_cycles)]
+    results = {}
+    for label, local_cache in (('Redis only', None), ('local cache + Redis', LRUCache(**LOCAL_CACHE_DEFAULTS))):
+        engine = get_engine(local_cache)
+        sent = []
+        with CommandCounter() as commands:
+            start = time.perf_counter()
+            for data in feeds:
+                sent.append([item['id'] for item in filter_already_sent(engine, 'trip_update', data)])
+            elapsed = time.perf_counter() - start
+        results[label] = sent
+        hit_rate = f", local hit rate {local_cache.pop_stats()['hit_rate']:.1%}" if local_cache else ""
+        print(f"  {label:<20}: {commands.count:>7} Redis commands, {elapsed:.3f}s{hit_rate}")
+    assert results['Redis only'] == results['local cache + Redis']
+
+
+def run(n_entities: int) -> None:
+    data = [{'id': f'trip_{i}'} for i in range(n_entities)]
+
+    engine = get_engine()
+    with RoundTripCounter() as counter:
+        start = time.perf_counter()
+        legacy = [item for item in data if not is_already_sent(engine, 'trip_update', item['id'])]
+        legacy_time = time.perf_counter() - start
+
+    engine = get_engine()
+    with RoundTripCounter() as batch_counter:
+        start = time.perf_counter()
+        batch = filter_already_sent(engine, 'trip_update', data)
+        batch_time = time.perf_counter() - start
+
+    assert legacy == batch
+    print(f"{n_entities} entities")
+    print(f"  per-entity EXISTS + SET : {counter.count:>7} round trips, {legacy_time:.3f}s")
+    print(f"  pipelined SET NX EX     : {batch_counter.count:>7} round trips, {batch_time:.3f}s")
+    print(f"{n_entities} entities, 10 polls")
+    run_steady_state(n_entities)
+
+
+if __name__ == '__main__':
+    n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for size in (100, n_entities):
+        run(size)
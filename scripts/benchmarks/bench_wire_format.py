@@ -0,0 +1,73 @@
+# scripts/benchmarks/bench_wire_format.py
+"""
+Benchmark gtfs-rt wire formats: MessageToDict + JSON vs msgpack projection
+Reports bytes per message and CPU time per 10k entities on producer (encode) and consumer (decode) sides.
+
+Usage: python scripts/benchmarks/bench_wire_format.py [n_entities] [n_stops]
+"""
+import os
+import sys
+import time
+
+from google.transit import gtfs_realtime_pb2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/common')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/producer')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src/consumer')))
+from KafkaEngine import WIRE_FORMAT_SERIALIZERS
+
+from consumer import WIRE_FORMAT_DESERIALIZERS
+from producer import extract_ids_and_trip_updates
+
+
+def make_feed(n_entities: int, n_stops: int) -> gtfs_realtime_pb2.FeedMessage:
+    """
+    Synthetic SNCF-like trip update feed
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    base = 1751356800
+    for i in range(n_entities):
+        trip_update = feed.entity.add(id=f'OCESN{i:06d}F1234567:2025-07-01T08:00:00').trip_update
+        trip_update.trip.trip_id = f'OCESN{i:06d}F1234567:2025-07-01T08:00:00'
+        trip_update.trip.start_time = '08:00:00'
+        trip_update.trip.start_date = '20250701'
+        trip_update.timestamp = base
+        for stop in range(n_stops):
+            stop_time_update = trip_update.stop_time_update.add(stop_id=f'StopPoint:OCETGV INOUI-87{stop:06d}')
+            stop_time_update.arrival.time = base + stop * 600
+            stop_time_update.arrival.delay = (i + stop) % 5 * 60
+            stop_time_update.departure.time = base + stop * 600 + 120
+            stop_time_update.departure.delay = (i + stop) % 5 * 60
+    return feed
+
+
+def run(n_entities: int, n_stops: int) -> None:
+    feed = make_feed(n_entities, n_stops)
+    scale = 10000 / n_entities
+    raw_size = sum(entity.ByteSize() for entity in feed.entity) / n_entities
+    print(f"{n_entities} trip updates, {n_stops} stops each (raw FeedEntity: {raw_size:.0f} bytes/message)")
+
+    for wire_format in ('json', 'msgpack'):
+        serialize = WIRE_FORMAT_SERIALIZERS[wire_format]
+        deserialize = WIRE_FORMAT_DESERIALIZERS[wire_format]
+
+        start = time.process_time()
+        _, data = extract_ids_and_trip_updates(feed, wire_format)
+        payloads = [serialize(item) for item in data]
+        encode_time = time.process_time() - start
+
+        start = time.process_time()
+        for payload in payloads:
+            deserialize(payload)
+        decode_time = time.process_time() - start
+
+        size = sum(len(payload) for payload in payloads) / n_entities
+        print(f"  {wire_format:<8}: {size:7.0f} bytes/message, "
+              f"encode {encode_time * scale:6.2f}s / 10k, decode {decode_time * scale:6.2f}s / 10k")
+
+
+if __name__ == '__main__':
+    n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_stops = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    run(n_entities, n_stops)
@@ -0,0 +1,91 @@
+# src/common/LRUCache.py
+"""
+LRUCache class, bounded thread-safe in-memory cache with optional entry lifetimes and hit / miss counters
+(consumer state caches, producer local dedup cache)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_size: int = 100000, max_ttl: float | None = None):
+        """
+        Args:
+            max_size: Maximum number of entries, least recently used entries are evicted first
+            max_ttl: Maximum lifetime of an entry (seconds), entries never expire when None
+        """
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        # key -> (value, expiry on the time.monotonic() clock or None)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def get(self, key, default = None, now: float | None = None):
+        """
+        Return the value cached for {key}, {default} when missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= (time.monotonic() if now is None else now):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+
+    def put(self, key, value, ttl: float | None = None, now: float | None = None) -> None:
+        """
+        Cache {value} for {key} during {ttl} seconds (capped to max_ttl, max_ttl when None),
+        evicting the least recently used entries beyond max_size
+        """
+        if ttl is None or (self.max_ttl is not None and ttl > self.max_ttl):
+            ttl = self.max_ttl
+        if ttl is not None and ttl <= 0:
+            return
+        expiry = None if ttl is None else (time.monotonic() if now is None else now) + ttl
+        with self._lock:
+            self._entries[key] = (value, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+
+    def clear(self) -> None:
+        """
+        Forget every entry (counters are kept)
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+    def pop_stats(self) -> dict:
+        """
+        Return hit / miss counters since the last call and reset them
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'size': len(self._entries)
+            }
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+        return stats
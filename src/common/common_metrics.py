@@ -0,0 +1,43 @@
+# src/common/common_metrics.py
+"""
+Structured logging setup and Prometheus metrics server shared by the services (copied into each image at build time)
+"""
+import json
+import logging
+
+from prometheus_client import start_http_server
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per log line
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level: str = 'INFO') -> None:
+    """
+    Structured (JSON lines) logging on stderr at {level}
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logging.basicConfig(level = level, handlers = [handler], force = True)
+
+
+def start_metrics_server(port: int) -> None:
+    """
+    Serve the metrics on http://0.0.0.0:{port}/metrics (daemon thread), nothing when port is None
+    """
+    if port is None:
+        return
+    start_http_server(port)
+    logging.getLogger(__name__).info(f"Metrics served on port {port}")
@@ -2,15 +2,27 @@
 """
 PostgreEngine class to interact with the database
 """
+from contextlib import contextmanager
+import copy
+import logging
 import psycopg
+from psycopg_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
 
 class PostgreEngine:
-    def __init__(self, host: str, port:str, db: str, user: str, password: str):
+    def __init__(self, host: str, port:str, db: str, user: str, password: str, pool_config: dict | None = None):
+        """
+        pool_config: Pooled mode settings (psycopg_pool.ConnectionPool arguments, e.g. min_size, max_size, max_lifetime, max_idle).
+                     Without it, connect() opens a dedicated connection.
+        """
         self.host = host
         self.port = port
         self.db = db
         self.user = user
         self.password = password
+        self.pool_config = pool_config
+        self.pool = None
 
 
 
@@ -39,9 +51,63 @@ class PostgreEngine:
             raise e
         else:
             self.cursor = self.conn.cursor()
-            print(f"Connection to {self.host} established")
+            logger.info(f"Connection to {self.host} established")
 
     
+    def open_pool(self, wait_timeout: float | None = None):
+        """
+        Open the connection pool (pooled mode), connections are checked on checkout and recycled after max_lifetime
+        """
+        if self.pool is not None:
+            return
+        self.pool = ConnectionPool(
+            kwargs = {
+                'host': self.host,
+                'port': self.port,
+                'user': self.user,
+                'password': self.password,
+                'dbname': self.db
+            },
+            check = ConnectionPool.check_connection,
+            name = f"postgres-{self.host}",
+            open = True,
+            **(self.pool_config or {})
+        )
+        if wait_timeout:
+            self.pool.wait(timeout = wait_timeout)
+        logger.info(f"Connection pool to {self.host} opened")
+
+
+    def close_pool(self):
+        """
+        Close the connection pool
+        """
+        if self.pool is None:
+            return
+        self.pool.close()
+        self.pool = None
+        logger.info(f"Connection pool to {self.host} closed")
+
+
+    @contextmanager
+    def borrow(self):
+        """
+        Borrow a pooled connection, as an engine bound to it.
+        The connection goes back to the pool on exit (rolled back on error, discarded when broken).
+        """
+        if self.pool is None:
+            self.open_pool()
+        with self.pool.connection() as conn:
+            engine = copy.copy(self)
+            engine.pool = None
+            engine.conn = conn
+            engine.cursor = conn.cursor()
+            try:
+                yield engine
+            finally:
+                engine.cursor.close()
+
+
     def close(self):
         """
         Close the connection
@@ -52,7 +118,7 @@ class PostgreEngine:
         except Exception as e:
             raise e
         else:
-            print(f"Connection to {self.host} closed")
+            logger.info(f"Connection to {self.host} closed")
             return
 
 
@@ -65,7 +131,7 @@ class PostgreEngine:
         except Exception as e:
             raise e
         else:
-            print("Transaction committed")
+            logger.debug("Transaction committed")
             return
         
 
@@ -78,7 +144,7 @@ class PostgreEngine:
         except Exception as e:
             raise e
         else:
-            print("Transaction rolled back")
+            logger.debug("Transaction rolled back")
             return
 
 
@@ -91,7 +157,17 @@ class PostgreEngine:
         except Exception as e:
             raise e
         else:
-            print("Query executed")
+            logger.debug("Query executed")
+
+
+    def fetch_query(self, query: str, params: tuple | None = None) -> list:
+        """
+        Execute a query and return all its rows
+        """
+        self.cursor.execute(query, params)
+        rows = self.cursor.fetchall()
+        logger.debug(f"Query fetched {len(rows)} rows")
+        return rows
 
 
     def execute_batch_query(self, query: str, params_list: list):
@@ -103,4 +179,39 @@ class PostgreEngine:
         except Exception as e:
             raise e
         else:
-            print(f"Batch query executed with {len(params_list)} parameter sets")
\ No newline at end of file
+            logger.debug(f"Batch query executed with {len(params_list)} parameter sets")
+
+
+    def execute_copy_merge(self, table_name: str, columns: list, rows, conflict_columns: list) -> None:
+        """
+        Bulk upsert: stream rows with COPY into a temporary staging table,
+        then merge them into {table_name} with a single INSERT ... SELECT ... ON CONFLICT.
+        When a batch holds several rows with the same key, the last one wins (as with execute_batch_query).
+        """
+        stage_name = f"stage_{table_name}"
+        column_list = ', '.join(columns)
+        key_list = ', '.join(conflict_columns)
+        update_columns = [col for col in columns if col not in conflict_columns]
+        if update_columns:
+            conflict_action = "DO UPDATE SET " + ', '.join([f"{col} = EXCLUDED.{col}" for col in update_columns])
+        else:
+            conflict_action = "DO NOTHING"
+        # Session-scoped staging table, emptied at each commit
+        self.cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {stage_name}
+            (LIKE {table_name} INCLUDING DEFAULTS, stage_row BIGINT GENERATED ALWAYS AS IDENTITY)
+            ON COMMIT DELETE ROWS
+        """)
+        with self.cursor.copy(f"COPY {stage_name} ({column_list}) FROM STDIN") as copy:
+            row_count = 0
+            for row in rows:
+                copy.write_row(row)
+                row_count += 1
+        self.cursor.execute(f"""
+            INSERT INTO {table_name} ({column_list})
+            SELECT DISTINCT ON ({key_list}) {column_list} FROM {stage_name}
+            ORDER BY {key_list}, stage_row DESC
+            ON CONFLICT ({key_list}) {conflict_action}
+        """)
+        self.cursor.execute(f"TRUNCATE {stage_name}")
+        logger.debug(f"Copy merge executed with {row_count} rows")
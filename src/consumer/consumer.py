@@ -2,18 +2,165 @@
 """
 Extract GTFS RT messages from Kafka, process them and save them to the database
 """
-from datetime import datetime, timezone
-from kafka import KafkaConsumer
+import argparse
+from datetime import UTC, datetime, timedelta, timezone
+import functools
+from kafka import ConsumerRebalanceListener, KafkaConsumer, KafkaProducer, TopicPartition
 from kafka.admin import KafkaAdminClient, ConfigResource, ConfigResourceType
 import json
+import logging
+import msgpack
+import multiprocessing
 import os
+import signal
 import time
 from typing import List, Tuple
 
+from LRUCache import LRUCache
 from PostgreEngine import PostgreEngine
+from common_metrics import configure_logging, start_metrics_server
+from consumer_metrics import CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES, COMMIT_SECONDS, DECOMPOSE_SECONDS, INGEST_ROWS, INGEST_SECONDS, LAG, POLL_MESSAGES
+
+logger = logging.getLogger(__name__)
 
 DATA_SOURCES_FILEPATH = os.getenv('DATA_SOURCES_FILEPATH', 'config/data_sources.json')
 
+# Record header set by the producer to tell how the value is encoded (json when missing)
+WIRE_FORMAT_HEADER = 'format'
+
+WIRE_FORMAT_DESERIALIZERS = {
+    'json': lambda m: json.loads(m.decode('utf-8')),
+    'msgpack': lambda m: msgpack.unpackb(m, raw=False)
+}
+
+
+# Primary keys of the realtime tables (conflict targets of the upserts)
+CONFLICT_KEYS = {
+    'trip_updates': ['trip_id', 'feed_timestamp'],
+    'stop_time_updates': ['trip_id', 'feed_timestamp', 'stop_index'],
+    'alerts': ['alert_id', 'active_period_start', 'active_period_end'],
+    'alert_entities': ['alert_id', 'trip_id']
+}
+
+INGEST_STRATEGIES = ('insert', 'copy')
+
+# Row layouts of decompose_tu_rows
+TRIP_UPDATE_COLUMNS = ['feed_timestamp', 'trip_id', 'start_time', 'start_date']
+STOP_TIME_UPDATE_COLUMNS = ['feed_timestamp', 'trip_id', 'stop_index', 'stop_id',
+                            'arrival_time', 'departure_time', 'arrival_delay', 'departure_delay']
+
+CONSUMER_MODES = ('batch', 'stream', 'backfill')
+
+# Streaming mode defaults: flush when {flush_records} messages are buffered or the oldest one waited {flush_interval} seconds
+STREAM_DEFAULTS = {
+    'flush_records': 5000,
+    'flush_interval': 5.0,
+    'poll_timeout_ms': 1000,
+    'max_poll_records': 2000,
+    'lag_interval': 60
+}
+
+# Offsets are committed only after the batch is committed in Postgres.
+# A failing batch is retried {max_retries} times with exponential backoff, then sent to {dead_letter_topic}
+# (when set, each record acknowledged within {dead_letter_timeout} seconds) or rewound to the last committed offsets
+# to be consumed again.
+DELIVERY_DEFAULTS = {
+    'max_retries': 3,
+    'retry_backoff': 1.0,
+    'max_retry_backoff': 30.0,
+    'dead_letter_topic': None,
+    'dead_letter_timeout': 30.0
+}
+
+# Backfill mode: replay the topics from {start_offset} ('earliest', 'committed' or an offset) or {start_timestamp}
+# up to their end offsets at startup, in COPY batches of {batch_records} messages. Offsets are committed to {group_id},
+# kept apart from the live consumers, so an interrupted backfill is resumed with start_offset='committed'.
+BACKFILL_DEFAULTS = {
+    'group_id': 'gtfs-rt-backfill',
+    'start_offset': 'earliest',
+    'start_timestamp': None,
+    'batch_records': 50000,
+    'max_poll_records': 10000,
+    'poll_timeout_ms': 1000,
+    'progress_interval': 10
+}
+
+# Delta ingestion of stop_time_updates: a row is written only when its times / delays changed since the last row
+# written for its (trip_id, stop_id), or when that row is older than {heartbeat} seconds (feed time), so the latest
+# state stays visible to dashboards reading a time window. The last-seen state is bounded to {max_size} stops and
+# rebuilt at startup from the rows of the last {warm_start_hours} hours.
+DELTA_DEFAULTS = {
+    'enabled': False,
+    'max_size': 200000,
+    'heartbeat': 1800,
+    'warm_start_hours': 6
+}
+
+# Digests of the alerts written per (alert_id, active period) and (alert_id, trip_id) pairs written, so unchanged
+# alerts and known alert entities are not sent to Postgres again. Each cache holds up to {max_size} entries.
+ALERT_CACHE_DEFAULTS = {
+    'enabled': True,
+    'max_size': 50000
+}
+
+# Latest row per (trip_id, stop_id), to rebuild the delta ingestion state
+STOP_TIME_STATE_QUERY = """
+    SELECT trip_id, stop_id, arrival_time, departure_time, arrival_delay, departure_delay, feed_timestamp
+    FROM (
+        SELECT DISTINCT ON (trip_id, stop_id)
+            trip_id, stop_id, arrival_time, departure_time, arrival_delay, departure_delay, feed_timestamp
+        FROM stop_time_updates
+        WHERE feed_timestamp > NOW() - %s * INTERVAL '1 hour'
+        ORDER BY trip_id, stop_id, feed_timestamp DESC
+    ) AS latest
+    ORDER BY feed_timestamp DESC
+    LIMIT %s
+"""
+
+
+@functools.lru_cache(maxsize = 65536)
+def epoch_to_datetime(unix_timestamp):
+    """Memoized GTFSConsumer.unix_to_datetime (stops and trips of a feed share few distinct epochs)"""
+    if unix_timestamp is None:
+        return None
+    try:
+        return datetime.fromtimestamp(int(unix_timestamp), tz=UTC)
+    except (ValueError, OSError):
+        return None
+
+
+def parse_timestamp(value):
+    """Timezone-aware datetime from an ISO 8601 string (data_sources.json or command line), UTC when no offset is given"""
+    if value is None:
+        return None
+    timestamp = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    return timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo = UTC)
+
+
+class FlushOnRevoke(ConsumerRebalanceListener):
+    """Flush and commit the buffered messages before their partitions are handed over to another worker"""
+    def __init__(self, gtfs_consumer):
+        self.gtfs_consumer = gtfs_consumer
+        self.caches_cleared = False
+
+    def on_partitions_revoked(self, revoked):
+        logger.info(f"Partitions revoked: {sorted((tp.topic, tp.partition) for tp in revoked)}")
+        self.gtfs_consumer.flush(self.gtfs_consumer.stream_consumer)
+        # Nothing is handed over on the first join, keep the warm-started state
+        if not revoked:
+            return
+        # The trips and alerts of the revoked partitions may be written by another worker meanwhile
+        for cache in self.gtfs_consumer.get_caches().values():
+            cache.clear()
+        self.caches_cleared = True
+
+    def on_partitions_assigned(self, assigned):
+        logger.info(f"Partitions assigned: {sorted((tp.topic, tp.partition) for tp in assigned)}")
+        # Every worker flushed before the reassignment, warm start again from what they wrote
+        if self.caches_cleared and self.gtfs_consumer.stop_time_state is not None:
+            self.gtfs_consumer.load_stop_time_state()
+        self.caches_cleared = False
+
 
 def read_secret_or_env(secret_name, env_name = None):
     """
@@ -44,8 +191,47 @@ def read_secret_or_env(secret_name, env_name = None):
 class GTFSConsumer:
     def __init__(self, var_dict:dict):
         self.var_dict = var_dict
-        self.trip_update_consumer = self.get_consumer('gtfs-rt-tu', 'gtfs-rt-consumer')
-        self.service_alert_consumer = self.get_consumer('gtfs-rt-sa', 'gtfs-rt-consumer')
+        self.ingest_strategy = var_dict.get('INGEST_STRATEGY', 'insert')
+        if self.ingest_strategy not in INGEST_STRATEGIES:
+            raise ValueError(f"Unknown ingest strategy: {self.ingest_strategy}")
+        # Database engine in pooled mode, the pool lives as long as the consumer
+        self.db_engine = PostgreEngine(host = var_dict['POSTGRES_HOST'],
+                                       port = var_dict['POSTGRES_PORT'],
+                                       db = var_dict['POSTGRES_DB'],
+                                       user = var_dict['POSTGRES_USER'],
+                                       password = var_dict['POSTGRES_PASSWORD'],
+                                       pool_config = var_dict.get('POSTGRES_POOL', {'min_size': 1, 'max_size': 2}))
+        self.tu_topics = var_dict.get('TU_TOPICS', ['gtfs-rt-tu'])
+        self.sa_topics = var_dict.get('SA_TOPICS', ['gtfs-rt-sa'])
+        self.mode = var_dict.get('CONSUMER_MODE', 'batch')
+        if self.mode not in CONSUMER_MODES:
+            raise ValueError(f"Unknown consumer mode: {self.mode}")
+        self.stream_config = {**STREAM_DEFAULTS, **var_dict.get('STREAM', {})}
+        self.delivery_config = {**DELIVERY_DEFAULTS, **var_dict.get('DELIVERY', {})}
+        self.dead_letter_producer = None
+        self.backfill_config = {**BACKFILL_DEFAULTS, **var_dict.get('BACKFILL', {})}
+        self.backfill_config['start_timestamp'] = parse_timestamp(self.backfill_config['start_timestamp'])
+        # Kafka topic configuration (retention...) applied at startup, opt-in so a restart never shortens the replay window
+        self.topic_config = var_dict.get('TOPIC_CONFIG')
+        self.rows_written = 0
+        self.delta_config = {**DELTA_DEFAULTS, **var_dict.get('DELTA', {})}
+        self.stop_time_state = LRUCache(self.delta_config['max_size']) if self.delta_config['enabled'] else None
+        self.alert_cache_config = {**ALERT_CACHE_DEFAULTS, **var_dict.get('ALERT_CACHE', {})}
+        if self.alert_cache_config['enabled']:
+            self.alert_state = LRUCache(self.alert_cache_config['max_size'])
+            self.alert_entity_state = LRUCache(self.alert_cache_config['max_size'])
+        else:
+            self.alert_state = None
+            self.alert_entity_state = None
+        if self.mode == 'stream':
+            # One consumer for all topics, messages are routed by topic
+            self.tu_buffer = []
+            self.sa_buffer = []
+            self.first_buffered_at = None
+            self.stream_consumer = self.get_consumer(self.tu_topics + self.sa_topics, 'gtfs-rt-consumer', FlushOnRevoke(self))
+        elif self.mode == 'batch':
+            self.trip_update_consumer = self.get_consumer(self.tu_topics, 'gtfs-rt-consumer')
+            self.service_alert_consumer = self.get_consumer(self.sa_topics, 'gtfs-rt-consumer')
 
 
 
@@ -86,27 +272,133 @@ class GTFSConsumer:
         return date_str
 
     # Consumer message functions
-    def get_consumer(self, topic:str, group_id:str) -> KafkaConsumer:
-        """Get a Kafka consumer for a given topic and group ID"""
-        consumer = KafkaConsumer(topic,
+    def get_consumer(self, topics, group_id:str, listener: ConsumerRebalanceListener = None) -> KafkaConsumer:
+        """Get a Kafka consumer for a given topic (or list of topics) and group ID, with an optional rebalance listener"""
+        if isinstance(topics, str):
+            topics = [topics]
+        if listener is not None:
+            consumer = KafkaConsumer(bootstrap_servers = self.var_dict['KAFKA_BROKERS'],
+                                     auto_offset_reset = 'earliest',
+                                     enable_auto_commit = False,
+                                     group_id = group_id)
+            consumer.subscribe(topics, listener = listener)
+            return consumer
+        consumer = KafkaConsumer(*topics,
                                  bootstrap_servers = self.var_dict['KAFKA_BROKERS'],
                                  auto_offset_reset = 'earliest',
-                                 enable_auto_commit = True,
-                                 group_id = group_id,
-                                 value_deserializer = lambda m: json.loads(m.decode('utf-8'))
+                                 enable_auto_commit = False,
+                                 group_id = group_id
                                     )
         return consumer
 
+    def decode_message(self, value: bytes, headers: list) -> dict:
+        """Decode a message value according to its wire format header"""
+        wire_format = 'json'
+        for key, header_value in headers or []:
+            if key == WIRE_FORMAT_HEADER:
+                wire_format = header_value.decode('utf-8')
+        return WIRE_FORMAT_DESERIALIZERS[wire_format](value)
+
     def consume_messages(self, consumer: KafkaConsumer, timeout_ms:int = 1000, max_messages:int = 1000) -> List[dict]:
         """Consume messages from a Kafka consumer"""
         consumed_data = []
         messages = consumer.poll(timeout_ms = timeout_ms, max_records = max_messages)
+        POLL_MESSAGES.observe(sum(len(records) for records in messages.values()))
         for topic_partition, records in messages.items():
             for message in records:
-                message_data = message.value
+                try:
+                    message_data = self.decode_message(message.value, message.headers)
+                except (KeyError, ValueError) as e:
+                    logger.error(f"Error decoding message at {topic_partition} offset {message.offset}: {e}")
+                    continue
                 consumed_data.append(message_data)
         return consumed_data
 
+    def poll_messages(self, consumer: KafkaConsumer, timeout_ms:int = 1000, max_messages:int = 1000) -> tuple[list[dict], list[dict]]:
+        """Poll messages from a consumer subscribed to several topics, split into trip updates and service alerts"""
+        tu_data = []
+        sa_data = []
+        messages = consumer.poll(timeout_ms = timeout_ms, max_records = max_messages)
+        POLL_MESSAGES.observe(sum(len(records) for records in messages.values()))
+        for topic_partition, records in messages.items():
+            target = tu_data if topic_partition.topic in self.tu_topics else sa_data
+            for message in records:
+                try:
+                    target.append(self.decode_message(message.value, message.headers))
+                except (KeyError, ValueError) as e:
+                    logger.error(f"Error decoding message at {topic_partition} offset {message.offset}: {e}")
+        return tu_data, sa_data
+
+    def get_lag(self, consumer: KafkaConsumer) -> dict:
+        """Lag (messages behind the log end) of each assigned partition"""
+        partitions = list(consumer.assignment())
+        if not partitions:
+            return {}
+        end_offsets = consumer.end_offsets(partitions)
+        return {(tp.topic, tp.partition): end_offsets[tp] - consumer.position(tp) for tp in partitions}
+
+    def rewind(self, consumer: KafkaConsumer) -> None:
+        """Seek every assigned partition back to its last committed offset (uncommitted messages are consumed again)"""
+        for tp in consumer.assignment():
+            committed = consumer.committed(tp)
+            if committed is None:
+                consumer.seek_to_beginning(tp)
+            else:
+                consumer.seek(tp, committed)
+
+    def send_to_dead_letter(self, tu_data: list[dict], sa_data: list[dict], error: Exception) -> None:
+        """
+        Publish a batch that could not be ingested to the dead-letter topic (JSON, with its kind and the error as headers).
+        Raises if any record is not acknowledged, so that the batch offsets are not committed.
+        """
+        if self.dead_letter_producer is None:
+            self.dead_letter_producer = KafkaProducer(bootstrap_servers = self.var_dict['KAFKA_BROKERS'],
+                                                      value_serializer = lambda v: json.dumps(v).encode('utf-8'))
+        topic = self.delivery_config['dead_letter_topic']
+        futures = []
+        for kind, data in (('trip_update', tu_data), ('service_alert', sa_data)):
+            headers = [(WIRE_FORMAT_HEADER, b'json'), ('kind', kind.encode('utf-8')), ('error', repr(error).encode('utf-8'))]
+            for message_data in data:
+                futures.append(self.dead_letter_producer.send(topic, message_data, headers = headers))
+        self.dead_letter_producer.flush()
+        # flush() does not raise when a record fails, its future does
+        for future in futures:
+            future.get(timeout = self.delivery_config['dead_letter_timeout'])
+        logger.info(f"Sent {len(tu_data)} trip updates and {len(sa_data)} service alerts to dead-letter topic {topic}")
+
+    def commit_batch(self, consumers: list[KafkaConsumer], tu_data: list[dict], sa_data: list[dict]) -> bool:
+        """
+        Ingest a batch, then commit the consumers offsets (at-least-once delivery).
+        Returns True when the batch was ingested.
+        """
+        config = self.delivery_config
+        for attempt in range(config['max_retries'] + 1):
+            try:
+                self.ingest_batch(tu_data, sa_data)
+            except Exception as e:
+                error = e
+                logger.exception(f"Error during data ingestion (attempt {attempt + 1}/{config['max_retries'] + 1})")
+                if attempt < config['max_retries']:
+                    time.sleep(min(config['retry_backoff'] * 2 ** attempt, config['max_retry_backoff']))
+            else:
+                for consumer in consumers:
+                    consumer.commit()
+                return True
+
+        if config['dead_letter_topic']:
+            try:
+                self.send_to_dead_letter(tu_data, sa_data, error)
+            except Exception:
+                logger.exception("Error sending batch to dead-letter topic")
+            else:
+                for consumer in consumers:
+                    consumer.commit()
+                return False
+        logger.warning("Batch not ingested, rewinding to the last committed offsets")
+        for consumer in consumers:
+            self.rewind(consumer)
+        return False
+
     def close_consumer(self, consumer: KafkaConsumer) -> None:
         """Close a Kafka consumer"""
         consumer.close()
@@ -190,7 +482,67 @@ class GTFSConsumer:
                     stop_index += 1
                     
             except (KeyError, TypeError) as e:
-                print(f"Error processing trip update {elt.get('id', 'unknown')}: {e}")
+                logger.error(f"Error processing trip update {elt.get('id', 'unknown')}: {e}")
+                continue
+
+        return trip_updates, stop_time_updates
+
+    def decompose_tu_rows(self, tu_data:list[dict]) -> tuple[list[tuple], list[tuple]]:
+        """
+        Decompose trip update data into trip update and stop time update rows
+        (tuples in TRIP_UPDATE_COLUMNS / STOP_TIME_UPDATE_COLUMNS order, ready for COPY).
+        Same output as decompose_tu_data, with memoized epoch conversion and no intermediate dicts.
+        """
+        trip_updates = []
+        stop_time_updates = []
+        append_trip_update = trip_updates.append
+        append_stop_time_update = stop_time_updates.append
+        to_datetime = epoch_to_datetime
+
+        for elt in tu_data:
+            try:
+                trip_id = elt['id']
+                trip_update = elt['trip_update']
+                trip = trip_update['trip']
+                start_time = self.format_time(trip.get('startTime'))
+                start_date = self.format_date(trip.get('startDate'))
+                feed_timestamp = to_datetime(trip_update.get('timestamp'))
+
+                append_trip_update((feed_timestamp, trip_id, start_time, start_date))
+
+                stop_index = 0 # Departure station
+                for stop_time_update in trip_update.get('stopTimeUpdate', []):
+                    stop_id = stop_time_update.get('stopId')
+                    if not stop_id:
+                        continue
+
+                    if 'departure' in stop_time_update:
+                        departure = stop_time_update['departure']
+                        departure_time = to_datetime(departure.get('time'))
+                        departure_delay = departure.get('delay')
+                    else:
+                        departure_time = None
+                        departure_delay = None
+
+                    if 'arrival' in stop_time_update:
+                        arrival = stop_time_update['arrival']
+                        arrival_time = to_datetime(arrival.get('time'))
+                        arrival_delay = arrival.get('delay')
+                    else:
+                        arrival_time = departure_time
+                        arrival_delay = 0
+
+                    if not departure_time:
+                        departure_time = arrival_time
+                    if not departure_delay:
+                        departure_delay = arrival_delay
+
+                    append_stop_time_update((feed_timestamp, trip_id, stop_index, stop_id,
+                                             arrival_time, departure_time, arrival_delay, departure_delay))
+                    stop_index += 1
+
+            except (KeyError, TypeError) as e:
+                logger.error(f"Error processing trip update {elt.get('id', 'unknown')}: {e}")
                 continue
 
         return trip_updates, stop_time_updates
@@ -264,121 +616,478 @@ class GTFSConsumer:
                 })
                 
             except (KeyError, TypeError) as e:
-                print(f"Error processing service alert {elt.get('id', 'unknown')}: {e}")
+                logger.error(f"Error processing service alert {elt.get('id', 'unknown')}: {e}")
                 continue
 
         return alerts, entities
 
     # Ingestion functions
     def ingest_data(self, engine: PostgreEngine, table_name:str, data:List[dict]) -> None:
-        """Ingest data into a PostgreSQL table with upsert functionality"""
+        """Ingest data into a PostgreSQL table with upsert functionality, using the configured strategy"""
         if not data:
             return
-            
-        columns = list(data[0].keys())
-        placeholders = ', '.join(['%s'] * len(columns))
-        update_clause = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns])
-        
-        # Query with conflict resolution - update on conflict
-        query = f"""
-        INSERT INTO {table_name} ({', '.join(columns)}) 
-        VALUES ({placeholders}) 
-        ON CONFLICT DO UPDATE SET {update_clause}
-        """
-        
         # Convert list of dicts to list of tuples for batch insertion
-        params_list = [tuple(row.values()) for row in data]
-        
-        # Execute batch query
-        engine.execute_batch_query(query, params_list)
-        print(f"Processed {len(data)} records for {table_name} (inserted or updated)")
+        self.ingest_rows(engine, table_name, list(data[0].keys()), [tuple(row.values()) for row in data])
+
+    def ingest_rows(self, engine: PostgreEngine, table_name:str, columns:list[str], rows:list[tuple]) -> None:
+        """Ingest rows (tuples in {columns} order) into a PostgreSQL table with upsert functionality, using the configured strategy"""
+        if not rows:
+            return
+        start = time.perf_counter()
+        if self.ingest_strategy == 'copy' and table_name in CONFLICT_KEYS:
+            # COPY into a staging table and a single set-based merge
+            engine.execute_copy_merge(table_name, columns, rows, CONFLICT_KEYS[table_name])
+            logger.debug(f"Processed {len(rows)} records for {table_name} (copied and merged)")
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            update_clause = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns])
+            # Postgres needs the conflict target of DO UPDATE (primary key of the realtime tables)
+            conflict_target = f"({', '.join(CONFLICT_KEYS[table_name])}) " if table_name in CONFLICT_KEYS else ''
+
+            # Query with conflict resolution - update on conflict
+            query = f"""
+            INSERT INTO {table_name} ({', '.join(columns)}) 
+            VALUES ({placeholders}) 
+            ON CONFLICT {conflict_target}DO UPDATE SET {update_clause}
+            """
+
+            # Execute batch query
+            engine.execute_batch_query(query, rows)
+            logger.debug(f"Processed {len(rows)} records for {table_name} (inserted or updated)")
+        INGEST_SECONDS.labels(table_name).observe(time.perf_counter() - start)
+        INGEST_ROWS.labels(table_name).inc(len(rows))
+
+    def filter_stop_time_changes(self, rows: list[tuple]) -> tuple[list[tuple], dict]:
+        """
+        Keep the stop time update rows (STOP_TIME_UPDATE_COLUMNS order) whose times / delays changed since the last
+        row written for their (trip_id, stop_id), or whose last row is older than the heartbeat (delta ingestion).
+        Returns the kept rows and the new states, to record in stop_time_state once the rows are committed.
+        """
+        heartbeat = timedelta(seconds = self.delta_config['heartbeat'])
+        changes = {}
+        kept = []
+        for row in rows:
+            key = (row[1], row[3])
+            values = row[4:]
+            previous = changes[key] if key in changes else self.stop_time_state.get(key)
+            if (previous is not None and previous[:4] == values
+                    and row[0] is not None and previous[4] is not None and row[0] - previous[4] < heartbeat):
+                continue
+            changes[key] = (*values, row[0])
+            kept.append(row)
+        return kept, changes
+
+    def filter_alert_changes(self, alerts: list[dict]) -> tuple[list[dict], dict]:
+        """
+        Keep the alerts whose content changed since they were last written for their (alert_id, active period).
+        Returns the kept alerts and their digests, to record in alert_state once the alerts are committed.
+        """
+        changes = {}
+        kept = []
+        for alert in alerts:
+            key = (alert['alert_id'], alert['active_period_start'], alert['active_period_end'])
+            digest = hash(tuple(alert.values()))
+            previous = changes[key] if key in changes else self.alert_state.get(key)
+            if previous == digest:
+                continue
+            changes[key] = digest
+            kept.append(alert)
+        return kept, changes
+
+    def filter_new_alert_entities(self, entities: list[dict]) -> tuple[list[dict], dict]:
+        """
+        Keep the (alert_id, trip_id) pairs not written yet.
+        Returns the kept entities and the pairs to record in alert_entity_state once they are committed.
+        """
+        changes = {}
+        kept = []
+        for entity in entities:
+            key = (entity['alert_id'], entity['trip_id'])
+            if key in changes or self.alert_entity_state.get(key):
+                continue
+            changes[key] = True
+            kept.append(entity)
+        return kept, changes
+
+    def get_caches(self) -> dict:
+        """Enabled consumer state caches, by name"""
+        caches = {
+            'stop_time_state': self.stop_time_state,
+            'alert_state': self.alert_state,
+            'alert_entity_state': self.alert_entity_state
+        }
+        return {name: cache for name, cache in caches.items() if cache is not None}
+
+    def report_cache_stats(self) -> None:
+        """Print the hit rate of each state cache since the last report and export the counts"""
+        for name, cache in self.get_caches().items():
+            stats = cache.pop_stats()
+            CACHE_HITS.labels(name).inc(stats['hits'])
+            CACHE_MISSES.labels(name).inc(stats['misses'])
+            CACHE_EVICTIONS.labels(name).inc(stats['evictions'])
+            CACHE_ENTRIES.labels(name).set(stats['size'])
+            hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else "n/a"
+            logger.info(f"Cache {name}: hit rate {hit_rate} ({stats['hits']} hits, {stats['misses']} misses), "
+                  f"{stats['size']} entries, {stats['evictions']} evictions")
+
+    def load_stop_time_state(self) -> None:
+        """Rebuild the delta ingestion state from the latest stop time updates written (warm start)"""
+        with self.db_engine.borrow() as engine:
+            rows = engine.fetch_query(STOP_TIME_STATE_QUERY, (self.delta_config['warm_start_hours'], self.delta_config['max_size']))
+            engine.commit()
+        # Most recent stops first, put them last so that they are the last evicted
+        for trip_id, stop_id, *values in reversed(rows):
+            self.stop_time_state.put((trip_id, stop_id), tuple(values))
+        logger.info(f"Delta ingestion state warm started with {len(rows)} stops")
+
+    def ingest_batch(self, tu_data: list[dict], sa_data: list[dict]) -> None:
+        """Transform a batch of messages and ingest it in one transaction (pooled connection)"""
+        trip_updates, stop_time_updates = [], []
+        if tu_data:
+            start = time.perf_counter()
+            trip_updates, stop_time_updates = self.decompose_tu_rows(tu_data)
+            DECOMPOSE_SECONDS.labels('trip_update').observe(time.perf_counter() - start)
+        alerts, entities = [], []
+        if sa_data:
+            start = time.perf_counter()
+            alerts, entities = self.decompose_sa_data(sa_data)
+            DECOMPOSE_SECONDS.labels('service_alert').observe(time.perf_counter() - start)
+        stop_time_changes = {}
+        if self.stop_time_state is not None and stop_time_updates:
+            n_rows = len(stop_time_updates)
+            stop_time_updates, stop_time_changes = self.filter_stop_time_changes(stop_time_updates)
+            logger.debug(f"Delta ingestion: {len(stop_time_updates)}/{n_rows} stop time updates changed")
+        alert_changes = {}
+        if self.alert_state is not None and alerts:
+            n_alerts = len(alerts)
+            alerts, alert_changes = self.filter_alert_changes(alerts)
+            logger.debug(f"{len(alerts)}/{n_alerts} alerts changed")
+        entity_changes = {}
+        if self.alert_entity_state is not None and entities:
+            n_entities = len(entities)
+            entities, entity_changes = self.filter_new_alert_entities(entities)
+            logger.debug(f"{len(entities)}/{n_entities} alert entities new")
+        if not (trip_updates or stop_time_updates or alerts or entities):
+            return
+
+        # Borrow a pooled connection for the batch (no connection setup on the ingest path)
+        with self.db_engine.borrow() as engine:
+            if trip_updates:
+                logger.debug(f"Ingesting {len(trip_updates)} trip updates")
+                self.ingest_rows(engine, 'trip_updates', TRIP_UPDATE_COLUMNS, trip_updates)
+            if stop_time_updates:
+                logger.debug(f"Ingesting {len(stop_time_updates)} stop time updates")
+                self.ingest_rows(engine, 'stop_time_updates', STOP_TIME_UPDATE_COLUMNS, stop_time_updates)
+            if alerts:
+                logger.debug(f"Ingesting {len(alerts)} alerts")
+                self.ingest_data(engine, 'alerts', alerts)
+            if entities:
+                logger.debug(f"Ingesting {len(entities)} alert entities")
+                self.ingest_data(engine, 'alert_entities', entities)
+
+            # Commit all insertions
+            start = time.perf_counter()
+            engine.commit()
+            COMMIT_SECONDS.observe(time.perf_counter() - start)
+            logger.debug("All data committed successfully")
+        self.rows_written += len(trip_updates) + len(stop_time_updates) + len(alerts) + len(entities)
+
+        # Record the written states only once committed (a failed batch is filtered again when retried)
+        for cache, changes in ((self.stop_time_state, stop_time_changes),
+                               (self.alert_state, alert_changes),
+                               (self.alert_entity_state, entity_changes)):
+            for key, value in changes.items():
+                cache.put(key, value)
 
     # Main function (pipeline)
-    def run(self) -> None:
+    def run(self, configure_topics: bool = True) -> None:
         """Run the consumer"""
-        print("Setting topics config to delete old messages")
-        self.set_topic_config('gtfs-rt-tu')
-        self.set_topic_config('gtfs-rt-sa')
+        if configure_topics and self.topic_config and self.mode != 'backfill':
+            logger.info(f"Setting topics config: {self.topic_config}")
+            for topic in self.tu_topics + self.sa_topics:
+                self.set_topic_config(topic, self.topic_config)
+
+        logger.info(f"Starting message consumption ({self.mode} mode)")
+        self.db_engine.open_pool()
+        try:
+            if self.stop_time_state is not None and self.mode != 'backfill':
+                self.load_stop_time_state()
+            if self.mode == 'stream':
+                self.stream()
+            elif self.mode == 'backfill':
+                self.backfill(self.backfill_config['start_offset'], self.backfill_config['start_timestamp'])
+            else:
+                self.consume_loop()
+        finally:
+            self.db_engine.close_pool()
+            if self.dead_letter_producer is not None:
+                self.dead_letter_producer.close()
+
+    def flush(self, consumer: KafkaConsumer) -> None:
+        """Ingest the buffered messages and commit their offsets (streaming mode)"""
+        if not (self.tu_buffer or self.sa_buffer):
+            return
+        logger.info(f"Flushing {len(self.tu_buffer)} trip updates and {len(self.sa_buffer)} service alerts")
+        tu_buffer, sa_buffer = self.tu_buffer, self.sa_buffer
+        self.tu_buffer, self.sa_buffer, self.first_buffered_at = [], [], None
+        self.commit_batch([consumer], tu_buffer, sa_buffer)
+
+    def stream(self) -> None:
+        """
+        Poll continuously and flush to Postgres when {flush_records} messages are buffered
+        or the oldest buffered message waited {flush_interval} seconds.
+        Idle time is spent in Kafka's poll, lag is reported per partition every {lag_interval} seconds.
+        The buffer is also flushed before a rebalance revokes its partitions.
+        """
+        config = self.stream_config
+        consumer = self.stream_consumer
+        last_lag_report = time.monotonic()
+        try:
+            while True:
+                try:
+                    tu_data, sa_data = self.poll_messages(consumer, config['poll_timeout_ms'], config['max_poll_records'])
+                except Exception:
+                    logger.exception("Error consuming messages")
+                    time.sleep(config['poll_timeout_ms'] / 1000)
+                    continue
+                self.tu_buffer.extend(tu_data)
+                self.sa_buffer.extend(sa_data)
+
+                now = time.monotonic()
+                buffered = len(self.tu_buffer) + len(self.sa_buffer)
+                if buffered and self.first_buffered_at is None:
+                    self.first_buffered_at = now
+                if buffered >= config['flush_records'] or (buffered and now - self.first_buffered_at >= config['flush_interval']):
+                    self.flush(consumer)
+
+                if now - last_lag_report >= config['lag_interval']:
+                    last_lag_report = now
+                    for (topic, partition), lag in sorted(self.get_lag(consumer).items()):
+                        logger.info(f"Lag {topic}[{partition}]: {lag} messages")
+                        LAG.labels(topic, partition).set(lag)
+                    self.report_cache_stats()
+        except KeyboardInterrupt:
+            logger.info("Stopping message consumption by keyboard interrupt")
+        finally:
+            self.flush(consumer)
+            self.close_consumer(consumer)
+
+    def seek_to_start(self, consumer: KafkaConsumer, partitions: list[TopicPartition], start_offset = None, start_timestamp: datetime | None = None) -> None:
+        """
+        Seek the assigned partitions to {start_timestamp} (first message at or after it, end of partition when none),
+        or to {start_offset}: 'earliest', 'committed' (last committed offset of the group) or an offset
+        """
+        if start_timestamp is not None:
+            timestamp_ms = int(start_timestamp.timestamp() * 1000)
+            found = consumer.offsets_for_times({tp: timestamp_ms for tp in partitions})
+            end_offsets = consumer.end_offsets(partitions)
+            for tp in partitions:
+                consumer.seek(tp, found[tp].offset if found.get(tp) is not None else end_offsets[tp])
+        elif start_offset in (None, 'earliest'):
+            for tp, offset in consumer.beginning_offsets(partitions).items():
+                consumer.seek(tp, offset)
+        elif start_offset == 'committed':
+            self.rewind(consumer)
+        else:
+            for tp in partitions:
+                consumer.seek(tp, int(start_offset))
+
+    def backfill(self, start_offset = 'earliest', start_timestamp: datetime | None = None) -> None:
+        """
+        Replay the topics from {start_offset} or {start_timestamp} up to their end offsets at startup, at full speed:
+        large COPY batches, no sleeps, topic configs untouched. Progress and throughput are reported every {progress_interval} seconds.
+        """
+        config = self.backfill_config
+        self.ingest_strategy = 'copy'
+        consumer = KafkaConsumer(bootstrap_servers = self.var_dict['KAFKA_BROKERS'],
+                                 auto_offset_reset = 'earliest',
+                                 enable_auto_commit = False,
+                                 group_id = config['group_id'],
+                                 max_poll_records = config['max_poll_records'])
+        try:
+            partitions = [TopicPartition(topic, partition) for topic in self.tu_topics + self.sa_topics
+                          for partition in sorted(consumer.partitions_for_topic(topic) or [])]
+            consumer.assign(partitions)
+            end_offsets = consumer.end_offsets(partitions)
+            self.seek_to_start(consumer, partitions, start_offset, start_timestamp)
+            total = sum(max(end_offsets[tp] - consumer.position(tp), 0) for tp in partitions)
+            # Start positions become the committed offsets, a failed batch is rewound there
+            consumer.commit()
+            logger.info(f"Backfilling {total} messages from {len(partitions)} partitions (group {config['group_id']})")
+
+            tu_buffer, sa_buffer = [], []
+            start = last_report = time.monotonic()
+            while True:
+                pending = [tp for tp in partitions if consumer.position(tp) < end_offsets[tp]]
+                buffered = len(tu_buffer) + len(sa_buffer)
+                if buffered >= config['batch_records'] or (buffered and not pending):
+                    self.commit_batch([consumer], tu_buffer, sa_buffer)
+                    tu_buffer, sa_buffer = [], []
+                    continue # Positions are rewound when the batch was not ingested
+                if not pending:
+                    break
+
+                # Partitions done stop fetching, messages produced since the start are left to the live consumers
+                consumer.pause(*[tp for tp in partitions if tp not in pending])
+                tu_data, sa_data = self.poll_messages(consumer, config['poll_timeout_ms'], config['max_poll_records'])
+                tu_buffer.extend(tu_data)
+                sa_buffer.extend(sa_data)
 
-        print("Starting message consumption")
+                now = time.monotonic()
+                if now - last_report >= config['progress_interval']:
+                    last_report = now
+                    self.report_backfill_progress(consumer, partitions, end_offsets, total, now - start)
+            self.report_backfill_progress(consumer, partitions, end_offsets, total, time.monotonic() - start)
+            logger.info("Backfill done")
+        except KeyboardInterrupt:
+            logger.info("Stopping backfill by keyboard interrupt, resume it with start_offset='committed'")
+        finally:
+            self.close_consumer(consumer)
+
+    def report_backfill_progress(self, consumer: KafkaConsumer, partitions: list[TopicPartition], end_offsets: dict, total: int, elapsed: float) -> None:
+        """Print the backfill progress and throughput"""
+        remaining = sum(max(end_offsets[tp] - consumer.position(tp), 0) for tp in partitions)
+        done = total - remaining
+        elapsed = max(elapsed, 1e-9)
+        logger.info(f"Backfill progress: {done}/{total} messages ({done / total if total else 1:.1%}), "
+              f"{done / elapsed:.0f} messages/s, {self.rows_written / elapsed:.0f} rows/s")
+
+    def consume_loop(self) -> None:
+        """Consume, transform and ingest messages every 5 minutes until interrupted"""
         while True:
-            trip_updates = []
-            stop_time_updates = []
-            alerts = []
-            entities = []
-            
             # Get data from Kafka
             try:
                 tu_data = self.consume_messages(self.trip_update_consumer)
                 sa_data = self.consume_messages(self.service_alert_consumer)
-                print(f"Consumed {len(tu_data)} trip updates and {len(sa_data)} service alerts")
+                logger.info(f"Consumed {len(tu_data)} trip updates and {len(sa_data)} service alerts")
             except Exception as e:
-                print(f"Error consuming messages: {e}")
+                logger.error(f"Error consuming messages: {e}")
                 time.sleep(60)
                 continue
             except KeyboardInterrupt:
-                print("Stopping message consumption by keyboard interrupt")
+                logger.info("Stopping message consumption by keyboard interrupt")
                 self.close_consumer(self.trip_update_consumer)
                 self.close_consumer(self.service_alert_consumer)
                 break
-            else:
-                # Transform data
-                if tu_data or sa_data:
-                    print("Processing messages")
-                    if tu_data:
-                        trip_updates, stop_time_updates = self.decompose_tu_data(tu_data)
 
-                    if sa_data:
-                        alerts, entities = self.decompose_sa_data(sa_data)
+            # Transform and ingest data in DB
+            if tu_data or sa_data:
+                logger.info("Processing messages")
+                self.commit_batch([self.trip_update_consumer, self.service_alert_consumer], tu_data, sa_data)
+                self.report_cache_stats()
+                # Sleep for 5 minute to avoid consuming messages too fast
+                time.sleep(300)
+
+def stop_on_sigterm(signum, frame):
+    """Turn SIGTERM into KeyboardInterrupt so buffered messages are flushed and committed"""
+    raise KeyboardInterrupt
+
+
+def run_worker(var_dict: dict, index: int) -> None:
+    """Entry point of a consumer worker process"""
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    # Ctrl+C reaches the whole process group, the parent forwards it as SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Spawned processes start from scratch: logging setup, and one metrics port per worker
+    configure_logging(var_dict.get('LOG_LEVEL', 'INFO'))
+    if var_dict.get('METRICS_PORT') is not None:
+        start_metrics_server(var_dict['METRICS_PORT'] + index)
+    logger.info(f"Consumer worker {index} started (pid {os.getpid()})")
+    GTFSConsumer(var_dict).run(configure_topics = index == 0)
+
+
+def run_workers(var_dict: dict, n_workers: int) -> None:
+    """
+    Run {n_workers} streaming consumers in separate processes of the same consumer group:
+    Kafka spreads the partitions of all topics over them, each one decodes, transforms and ingests on its own.
+    The Postgres pool size (max_size) is shared between workers to cap server connections.
+    """
+    pool_config = dict(var_dict.get('POSTGRES_POOL', {'min_size': 1, 'max_size': 2}))
+    pool_config['max_size'] = max(1, pool_config.get('max_size', 2) // n_workers)
+    pool_config['min_size'] = min(pool_config.get('min_size', 1), pool_config['max_size'])
+    worker_var_dict = {**var_dict, 'CONSUMER_MODE': 'stream', 'POSTGRES_POOL': pool_config}
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target = run_worker, args = (worker_var_dict, index), name = f"consumer-worker-{index}")
+                 for index in range(n_workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping consumer workers")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+
+def parse_args(argv = None) -> argparse.Namespace:
+    """Command line options, the backfill mode replays the topics instead of following them"""
+    parser = argparse.ArgumentParser(description = "GTFS RT consumer")
+    parser.add_argument('--backfill', action = 'store_true', help = "Replay the topics up to their current end, then exit")
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument('--from-offset', help = "Backfill start: 'earliest' (default), 'committed' (resume) or an offset")
+    start.add_argument('--from-timestamp', type = parse_timestamp, help = "Backfill start, ISO 8601 (UTC when no offset is given)")
+    # Unknown arguments are ignored (the compose command is appended to the image entrypoint)
+    return parser.parse_known_args(argv)[0]
 
-            # Ingest data in DB
-            if trip_updates or stop_time_updates or alerts or entities:
-                try:
-                    with PostgreEngine(host = self.var_dict['POSTGRES_HOST'],
-                                     port = self.var_dict['POSTGRES_PORT'],
-                                     db = self.var_dict['POSTGRES_DB'],
-                                     user = self.var_dict['POSTGRES_USER'],
-                                     password = self.var_dict['POSTGRES_PASSWORD']) as engine:
-                        
-                        if trip_updates:
-                            print(f"Ingesting {len(trip_updates)} trip updates")
-                            self.ingest_data(engine, 'trip_updates', trip_updates)
-                        if stop_time_updates:
-                            print(f"Ingesting {len(stop_time_updates)} stop time updates")
-                            self.ingest_data(engine, 'stop_time_updates', stop_time_updates)
-                        if alerts:
-                            print(f"Ingesting {len(alerts)} alerts")
-                            self.ingest_data(engine, 'alerts', alerts)
-                        if entities:
-                            print(f"Ingesting {len(entities)} alert entities")
-                            self.ingest_data(engine, 'alert_entities', entities)
-                        
-                        # Commit all insertions
-                        engine.commit()
-                        print("All data committed successfully")
-                        
-                except Exception as e:
-                    print(f"Error during data ingestion: {e}")
-                    continue
-                finally:
-                    # Sleep for 5 minute to avoid consuming messages too fast
-                    time.sleep(300)
 
 if __name__ == "__main__":
+    args = parse_args()
+
     # Fetch data sources URL
     with open(DATA_SOURCES_FILEPATH, 'r') as f:
         data_sources = json.load(f)
 
+        # Topics of the configured feeds, grouped by kind
+        feeds = data_sources.get('feeds', [])
+        tu_topics = sorted({feed.get('topic', 'gtfs-rt-tu') for feed in feeds if feed['kind'] == 'trip_update'})
+        sa_topics = sorted({feed.get('topic', 'gtfs-rt-sa') for feed in feeds if feed['kind'] == 'service_alert'})
+
         var_dict = {
             'KAFKA_BROKERS': data_sources['kafka_brokers'],
+            'TU_TOPICS': tu_topics or ['gtfs-rt-tu'],
+            'SA_TOPICS': sa_topics or ['gtfs-rt-sa'],
+            'CONSUMER_MODE': data_sources.get('consumer_mode', 'batch'),
+            'STREAM': data_sources.get('stream', {}),
+            'DELIVERY': data_sources.get('delivery', {}),
+            'WORKERS': data_sources.get('consumer_workers', 1),
+            'INGEST_STRATEGY': data_sources.get('ingest_strategy', 'insert'),
+            'BACKFILL': data_sources.get('backfill', {}),
+            'TOPIC_CONFIG': data_sources.get('topic_config'),
+            'DELTA': data_sources.get('delta_ingestion', {}),
+            'ALERT_CACHE': data_sources.get('alert_cache', {}),
             'POSTGRES_HOST': data_sources['postgres_host'],
             'POSTGRES_PORT': data_sources['postgres_port'],
             'POSTGRES_DB': data_sources['postgres_db'],
+            'POSTGRES_POOL': data_sources.get('postgres_pool', {'min_size': 1, 'max_size': 2}),
             'POSTGRES_USER': read_secret_or_env('postgres_user', 'POSTGRES_USER'),
-            'POSTGRES_PASSWORD': read_secret_or_env('postgres_password', 'POSTGRES_PASSWORD')
+            'POSTGRES_PASSWORD': read_secret_or_env('postgres_password', 'POSTGRES_PASSWORD'),
+            'LOG_LEVEL': data_sources.get('log_level', 'INFO'),
+            'METRICS_PORT': data_sources.get('metrics', {}).get('consumer_port')
         }
     del data_sources
+    configure_logging(var_dict['LOG_LEVEL'])
+
+    if args.backfill:
+        # One process, replaying from the given start with its own consumer group
+        var_dict['CONSUMER_MODE'] = 'backfill'
+        if args.from_timestamp is not None:
+            var_dict['BACKFILL'] = {**var_dict['BACKFILL'], 'start_timestamp': args.from_timestamp}
+        elif args.from_offset is not None:
+            var_dict['BACKFILL'] = {**var_dict['BACKFILL'], 'start_offset': args.from_offset}
+        start_metrics_server(var_dict['METRICS_PORT'])
+        GTFSConsumer(var_dict).run()
 
-    # Consumer engine
-    engine = GTFSConsumer(var_dict)
-    engine.run()
+    # Consumer engine, or one engine per worker process (metrics served by each worker, on consecutive ports)
+    elif var_dict['WORKERS'] > 1:
+        signal.signal(signal.SIGTERM, stop_on_sigterm)
+        run_workers(var_dict, var_dict['WORKERS'])
+    else:
+        start_metrics_server(var_dict['METRICS_PORT'])
+        engine = GTFSConsumer(var_dict)
+        engine.run()
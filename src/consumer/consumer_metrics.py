@@ -0,0 +1,21 @@
+# src/consumer/consumer_metrics.py
+"""
+Consumer metrics (Prometheus text format, served on a local port by common_metrics.start_metrics_server)
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets (seconds) of the database calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+POLL_SIZE_BUCKETS = (0, 1, 10, 100, 500, 1000, 2000, 5000, 10000)
+
+POLL_MESSAGES = Histogram('gtfs_consumer_poll_messages', 'Messages returned by a Kafka poll', buckets = POLL_SIZE_BUCKETS)
+DECOMPOSE_SECONDS = Histogram('gtfs_consumer_decompose_seconds', 'Time to decompose a batch into rows', ['kind'], buckets = LATENCY_BUCKETS)
+INGEST_ROWS = Counter('gtfs_consumer_ingest_rows', 'Rows written by table', ['table'])
+INGEST_SECONDS = Histogram('gtfs_consumer_ingest_seconds', 'Write latency of a batch by table', ['table'], buckets = LATENCY_BUCKETS)
+COMMIT_SECONDS = Histogram('gtfs_consumer_commit_seconds', 'Postgres commit latency of a batch', buckets = LATENCY_BUCKETS)
+LAG = Gauge('gtfs_consumer_lag', 'Messages behind the end of the partition', ['topic', 'partition'])
+CACHE_HITS = Counter('gtfs_consumer_cache_hits', 'State cache lookups that found an entry', ['cache'])
+CACHE_MISSES = Counter('gtfs_consumer_cache_misses', 'State cache lookups that found no entry', ['cache'])
+CACHE_EVICTIONS = Counter('gtfs_consumer_cache_evictions', 'State cache entries evicted (max_size reached)', ['cache'])
+CACHE_ENTRIES = Gauge('gtfs_consumer_cache_entries', 'State cache entries at the last report', ['cache'])
+
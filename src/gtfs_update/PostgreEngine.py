@@ -103,4 +103,40 @@ class PostgreEngine:
         except Exception as e:
             raise e
         else:
-            print(f"Batch query executed with {len(params_list)} parameter sets")
\ No newline at end of file
+            print(f"Batch query executed with {len(params_list)} parameter sets")
+
+
+    def execute_copy_merge(self, table_name: str, columns: list, chunks, conflict_columns: list) -> int:
+        """
+        Bulk upsert: stream CSV chunks (str, no header, empty unquoted field as NULL) with COPY into a temporary staging table,
+        then merge them into {table_name} with a single INSERT ... SELECT ... ON CONFLICT.
+        When the data holds several rows with the same key, the last one wins (as with execute_batch_query).
+        Returns the number of merged rows.
+        """
+        stage_name = f"stage_{table_name}"
+        column_list = ', '.join(columns)
+        key_list = ', '.join(conflict_columns)
+        update_columns = [col for col in columns if col not in conflict_columns]
+        if update_columns:
+            conflict_action = "DO UPDATE SET " + ', '.join([f"{col} = EXCLUDED.{col}" for col in update_columns])
+        else:
+            conflict_action = "DO NOTHING"
+        # Transaction-scoped staging table
+        self.cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {stage_name}
+            (LIKE {table_name} INCLUDING DEFAULTS, stage_row BIGINT GENERATED ALWAYS AS IDENTITY)
+            ON COMMIT DROP
+        """)
+        with self.cursor.copy(f"COPY {stage_name} ({column_list}) FROM STDIN (FORMAT csv)") as copy:
+            for chunk in chunks:
+                copy.write(chunk)
+        self.cursor.execute(f"""
+            INSERT INTO {table_name} ({column_list})
+            SELECT DISTINCT ON ({key_list}) {column_list} FROM {stage_name}
+            ORDER BY {key_list}, stage_row DESC
+            ON CONFLICT ({key_list}) {conflict_action}
+        """)
+        row_count = self.cursor.rowcount
+        self.cursor.execute(f"TRUNCATE {stage_name}")
+        print(f"Copy merge executed with {row_count} rows")
+        return row_count
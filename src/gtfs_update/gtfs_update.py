@@ -2,17 +2,84 @@
 """
 ETL Pipeline to update GTFS data in DB
 """
+import contextlib
+import functools
 import json
+import numpy as np
 import os
 import pandas as pd
 import requests
+import tempfile
 import zipfile
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
 from PostgreEngine import PostgreEngine
 
 DATA_SOURCES_FILEPATH = os.getenv('DATA_SOURCES_FILEPATH', 'config/data_sources.json')
 
+# Columns read for each table loaded into the DB (src/postgres/init.sql), in insertion order (foreign key dependencies).
+# Repeated ids are categoricals, columns missing from a feed are left out.
+GTFS_SCHEMAS = {
+    'agency': {
+        'agency_id': 'str',
+        'agency_name': 'str',
+        'agency_url': 'str',
+        'agency_timezone': 'str',
+        'agency_lang': 'str'
+    },
+    'stops': {
+        'stop_id': 'str',
+        'stop_name': 'str',
+        'stop_lat': 'float64',
+        'stop_lon': 'float64',
+        'location_type': 'Int8',
+        'parent_station': 'str'
+    },
+    'routes': {
+        'route_id': 'str',
+        'agency_id': 'category',
+        'route_short_name': 'str',
+        'route_long_name': 'str',
+        'route_type': 'Int16'
+    },
+    'trips': {
+        'route_id': 'category',
+        'service_id': 'category',
+        'trip_id': 'str',
+        'trip_headsign': 'str',
+        'direction_id': 'Int8',
+        'block_id': 'str'
+    },
+    'stop_times': {
+        'trip_id': 'category',
+        'arrival_time': 'str',
+        'departure_time': 'str',
+        'stop_id': 'category',
+        'stop_sequence': 'int32',
+        'pickup_type': 'Int8',
+        'drop_off_type': 'Int8'
+    }
+}
+GTFS_TABLES = list(GTFS_SCHEMAS)
+
+CSV_ENGINE = 'pyarrow'
+
+SECONDS_PER_DAY = 24 * 3600
+
+LOAD_STRATEGIES = ('insert', 'copy')
+COPY_CHUNK_ROWS = 100000
+
+# stop_times GTFS time columns -> seconds since the start of the service day columns
+STOP_TIMES_SECONDS_COLUMNS = {
+    'arrival_time': 'arrival_seconds',
+    'departure_time': 'departure_seconds'
+}
+
+EXTRACT_MODES = ('disk', 'spooled', 'memory')
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 'spooled' mode keeps archives up to this size (bytes) in memory, larger ones roll over to a temp file
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
 def read_secret_or_env(secret_name, env_name = None):
     """
     Read a secret from Docker secrets file, fallback to environment variable
@@ -75,36 +142,103 @@ def remove_tmp_files() -> None:
     return
 
 
-def load_df_dict() -> dict:
+def read_gtfs_csv(f, table_name: str, engine: str = CSV_ENGINE) -> pd.DataFrame:
+    """
+    Parse a GTFS .txt file object (binary, seekable).
+    Tables of GTFS_SCHEMAS only keep their DB columns with explicit dtypes, other tables are read as is.
+    """
+    schema = GTFS_SCHEMAS.get(table_name)
+    if schema is None:
+        return pd.read_csv(f)
+    # The pyarrow engine needs usecols as a list of existing columns
+    header = [col.strip().strip('"') for col in f.readline().decode('utf-8-sig').split(',')]
+    f.seek(0)
+    usecols = [col for col in header if col in schema]
+    return pd.read_csv(f, engine = engine, usecols = usecols, dtype = {col: schema[col] for col in usecols})
+
+
+def load_df_dict(tables: list | None = None, engine: str = CSV_ENGINE) -> dict:
     """
-    Load all files in tmp_gtfs into a dictionary
+    Load the files in tmp_gtfs into a dictionary
+    tables: Only read these tables, other files are skipped without being parsed (all files when None)
     """
     df_dict = {}
     for file in os.listdir('tmp_gtfs'):
         if file.endswith('.txt'):
-            df = pd.read_csv(f'tmp_gtfs/{file}')
             file_name = file.split('.')[0]
-            df_dict[file_name] = df
+            if tables is not None and file_name not in tables:
+                continue
+            with open(f'tmp_gtfs/{file}', 'rb') as f:
+                df_dict[file_name] = read_gtfs_csv(f, file_name, engine = engine)
     return df_dict
 
 
-def pipeline_extract(url:str) -> dict:
+def download_gtfs_archive(url: str, spool_max_size: int = SPOOL_MAX_SIZE):
+    """
+    Stream the GTFS zip file from source into a temporary file object, rewound for reading.
+    spool_max_size: Size (bytes) above which the download rolls over from memory to an anonymous temp file,
+                    0 keeps the whole archive in memory.
     """
-    Extract all files from the zip file and save them in tmp_gtfs, then load them into a dictionary and remove the tmp_gtfs folder
+    # Closed if the download fails, handed over to the caller otherwise
+    with contextlib.ExitStack() as stack:
+        archive = stack.enter_context(tempfile.SpooledTemporaryFile(max_size = spool_max_size))
+        with requests.get(url, stream = True) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size = DOWNLOAD_CHUNK_SIZE):
+                archive.write(chunk)
+        stack.pop_all()
+    archive.seek(0)
+    return archive
+
+
+def load_df_dict_from_zip(archive, tables: list | None = None, engine: str = CSV_ENGINE) -> dict:
     """
-    data = download_gtfs_data(url)
-    extract_data_from_zip(data)
-    df_dict = load_df_dict()
-    remove_tmp_files()    
+    Read the .txt members of the zip archive (path or file object) straight into dataframes, keyed by table name.
+    tables: Only read these tables, other members are skipped without being decompressed (all members when None)
+    """
+    df_dict = {}
+    with zipfile.ZipFile(archive, 'r') as zip_ref:
+        for member in zip_ref.infolist():
+            file = os.path.basename(member.filename)
+            if member.is_dir() or not file.endswith('.txt'):
+                continue
+            file_name = file.split('.')[0]
+            if tables is not None and file_name not in tables:
+                continue
+            with zip_ref.open(member) as f:
+                df_dict[file_name] = read_gtfs_csv(f, file_name, engine = engine)
     return df_dict
 
 
+def pipeline_extract(url:str, mode: str = 'disk', spool_max_size: int = SPOOL_MAX_SIZE, tables: list | None = None, engine: str = CSV_ENGINE) -> dict:
+    """
+    Extract the GTFS files into a dictionary of dataframes.
+    mode: 'disk' extracts every member to tmp_gtfs then loads them back (legacy),
+          'spooled' / 'memory' stream the download to a temp file object and parse the members straight from the zip
+          ('memory' never rolls over to disk, 'spooled' does above spool_max_size bytes).
+    tables: Only read these tables (all members when None)
+    engine: pd.read_csv engine for the GTFS_SCHEMAS tables, 'pyarrow' is faster, 'c' has a lower peak memory
+    """
+    if mode not in EXTRACT_MODES:
+        raise ValueError(f"Unknown extract mode: {mode}")
+    if mode == 'disk':
+        data = download_gtfs_data(url)
+        extract_data_from_zip(data)
+        df_dict = load_df_dict(tables = tables, engine = engine)
+        remove_tmp_files()
+        return df_dict
+
+    with download_gtfs_archive(url, spool_max_size = spool_max_size if mode == 'spooled' else 0) as archive:
+        return load_df_dict_from_zip(archive, tables = tables, engine = engine)
+
+
 
 # TRANSFORM
 def convert_gtfs_time_to_timestamp(time_str):
     """
     Convert GTFS time format (HH:MM:SS) to PostgreSQL timestamp.
     GTFS times can exceed 24:00:00 to represent times after midnight.
+    Row-wise reference of convert_gtfs_times_to_timestamp.
     """
     if pd.isna(time_str) or time_str == '':
         return None
@@ -137,6 +271,7 @@ def convert_gtfs_time_to_time(time_str):
     Convert GTFS time format (HH:MM:SS) to PostgreSQL time format.
     GTFS times can exceed 24:00:00 to represent times after midnight.
     For times >= 24:00:00, convert to equivalent time on next day (e.g., 24:09:00 -> 00:09:00).
+    Row-wise reference of convert_gtfs_times_to_time.
     """
     if pd.isna(time_str) or time_str == '':
         return None
@@ -157,12 +292,80 @@ def convert_gtfs_time_to_time(time_str):
         return None
 
 
+def convert_gtfs_times_to_seconds(times: pd.Series) -> pd.Series:
+    """
+    Vectorized GTFS time (H:MM:SS or HH:MM:SS, hours can exceed 24) to seconds since the start of the service day.
+    The service-day offset is seconds // SECONDS_PER_DAY (1 for 24:09:00).
+    Returns an Int32 series, <NA> for missing or malformed times.
+    """
+    values = np.char.strip(times.to_numpy(dtype = str, na_value = ''))
+    lengths = np.char.str_len(values)
+    width = max(8, int(lengths.max(initial = 0)))
+    if len(values):
+        # Right-aligned fixed width (0H:MM:SS), then one digit per column (unicode code points minus '0')
+        values = np.char.rjust(values, width, '0')
+    digits = values.astype(f'U{width}').view(np.uint32).reshape(-1, width).astype(np.int32) - ord('0')
+    hour_digits = digits[:, :-6]
+    minute_second_digits = digits[:, [-5, -4, -2, -1]]
+    colon = ord(':') - ord('0')
+    valid = ((lengths >= 7)
+             & (digits[:, -6] == colon) & (digits[:, -3] == colon)
+             & ((hour_digits >= 0) & (hour_digits <= 9)).all(axis = 1)
+             & ((minute_second_digits >= 0) & (minute_second_digits <= 9)).all(axis = 1)
+             & (digits[:, -5] < 6) & (digits[:, -2] < 6))
+    hours = hour_digits @ (10 ** np.arange(hour_digits.shape[1] - 1, -1, -1, dtype = np.int32))
+    seconds = (hours * 3600
+               + digits[:, -5] * 600 + digits[:, -4] * 60
+               + digits[:, -2] * 10 + digits[:, -1])
+    seconds[~valid] = 0
+    return pd.Series(pd.arrays.IntegerArray(seconds.astype(np.int32), ~valid), index = times.index, name = times.name)
+
+
+@functools.cache
+def _times_of_day() -> np.ndarray:
+    """
+    datetime.time of every second of a day, indexed by seconds since midnight
+    """
+    return np.array([time(second // 3600, second // 60 % 60, second % 60) for second in range(SECONDS_PER_DAY)], dtype = object)
+
+
+def convert_gtfs_seconds_to_time(seconds: pd.Series) -> pd.Series:
+    """
+    Seconds since the start of the service day (convert_gtfs_times_to_seconds) to datetime.time (None when <NA>).
+    Seconds beyond a day wrap to the equivalent time of day.
+    """
+    missing = seconds.isna().to_numpy()
+    converted = _times_of_day()[seconds.fillna(0).to_numpy(dtype = np.int64) % SECONDS_PER_DAY]
+    converted[missing] = None
+    return pd.Series(converted, index = seconds.index, name = seconds.name, dtype = object)
+
+
+def convert_gtfs_times_to_time(times: pd.Series) -> pd.Series:
+    """
+    Vectorized convert_gtfs_time_to_time: GTFS times to datetime.time (None when missing or malformed).
+    Times >= 24:00:00 wrap to the equivalent time of day (e.g., 24:09:00 -> 00:09:00).
+    """
+    return convert_gtfs_seconds_to_time(convert_gtfs_times_to_seconds(times))
+
+
+def convert_gtfs_times_to_timestamp(times: pd.Series, service_date = None) -> pd.Series:
+    """
+    Vectorized convert_gtfs_time_to_timestamp: GTFS times to timestamps of {service_date} (today by default),
+    times >= 24:00:00 fall on the following days. Returns a datetime64 series, NaT when missing or malformed
+    (minutes or seconds >= 60 included, where the row-wise converter carried them over).
+    """
+    if service_date is None:
+        service_date = datetime.now().date()
+    seconds = convert_gtfs_times_to_seconds(times)
+    return pd.Timestamp(service_date) + pd.to_timedelta(seconds, unit = 's')
+
+
 def clean_df(df: pd.DataFrame, actions:dict) -> pd.DataFrame:
     """
     Clean the dataframe based on the actions dictionary
     """
     if 'drop_col' in actions.keys():
-        df = df.drop(actions['drop_col'], axis = 1)
+        df = df.drop(actions['drop_col'], axis = 1, errors = 'ignore')
 
     if 'fillna' in actions.keys():
         df = df.fillna(actions['fillna'])
@@ -175,11 +378,11 @@ def pipeline_transform(df_dict: dict) -> dict:
     Clean the dataframe based on the actions dictionary
     """
     # Clean feed_info
-    df_dict.pop('feed_info')
+    df_dict.pop('feed_info', None)
     # Clean calendar_dates
-    df_dict.pop('calendar_dates')
+    df_dict.pop('calendar_dates', None)
     # Clean transfers
-    df_dict.pop('transfers')
+    df_dict.pop('transfers', None)
 
     # Clean stop_times
     actions = {
@@ -187,11 +390,13 @@ def pipeline_transform(df_dict: dict) -> dict:
     }
     df_dict['stop_times'] = clean_df(df_dict['stop_times'], actions = actions)
     
-    # Convert GTFS time format to PostgreSQL time format for stop_times
-    if 'arrival_time' in df_dict['stop_times'].columns:
-        df_dict['stop_times']['arrival_time'] = df_dict['stop_times']['arrival_time'].apply(convert_gtfs_time_to_time)
-    if 'departure_time' in df_dict['stop_times'].columns:
-        df_dict['stop_times']['departure_time'] = df_dict['stop_times']['departure_time'].apply(convert_gtfs_time_to_time)
+    # Convert GTFS time format for stop_times: seconds since the service day start (ordered, over-midnight safe)
+    # and PostgreSQL time format (display time of day)
+    for time_column, seconds_column in STOP_TIMES_SECONDS_COLUMNS.items():
+        if time_column in df_dict['stop_times'].columns:
+            seconds = convert_gtfs_times_to_seconds(df_dict['stop_times'][time_column])
+            df_dict['stop_times'][seconds_column] = seconds
+            df_dict['stop_times'][time_column] = convert_gtfs_seconds_to_time(seconds)
 
     # Clean routes
     actions = {
@@ -221,12 +426,25 @@ def pipeline_transform(df_dict: dict) -> dict:
 
 
 # LOAD
-def pipeline_load(df_dict: dict, pg_vars: dict) -> None:
+def iter_csv_chunks(df: pd.DataFrame, chunk_rows: int = COPY_CHUNK_ROWS):
     """
-    Load all dataframes into the database
+    Serialize the dataframe as CSV chunks of {chunk_rows} rows for COPY (no header, missing values as empty fields)
     """
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index = False, header = False)
+
+
+def pipeline_load(df_dict: dict, pg_vars: dict, strategy: str = 'insert') -> None:
+    """
+    Load all dataframes into the database, in a single transaction
+    strategy: 'insert' upserts with executemany INSERT ... ON CONFLICT,
+              'copy' streams each dataframe with COPY into a staging table then merges it with one statement per table
+    """
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(f"Unknown load strategy: {strategy}")
+
     # insertion order based on foreign key dependencies
-    insertion_order = ['agency', 'stops', 'routes', 'trips', 'stop_times']
+    insertion_order = GTFS_TABLES
     
     # Define primary keys for each table (Avoid error on duplicates)
     primary_keys = {
@@ -254,6 +472,11 @@ def pipeline_load(df_dict: dict, pg_vars: dict) -> None:
                 # Get primary key columns for this table
                 primary_key_columns = primary_keys[table_name]
                 primary_key_column = ', '.join(primary_key_columns)
+
+                if strategy == 'copy':
+                    print(f"Copying {len(df)} rows into {table_name}")
+                    pg.execute_copy_merge(table_name, list(df.columns), iter_csv_chunks(df), primary_key_columns)
+                    continue
                 
                 # Generate update assignments for non-primary key columns
                 non_pk_columns = [col for col in df.columns if col not in primary_key_columns]
@@ -267,8 +490,8 @@ def pipeline_load(df_dict: dict, pg_vars: dict) -> None:
                     ON CONFLICT ({primary_key_column}) DO UPDATE SET
                     {update_assignments}
                 """
-                # Convert dataframe -> list of tuples for batch insert
-                values_list = [tuple(row) for row in df.to_numpy()]
+                # Convert dataframe -> list of tuples for batch insert (missing values as NULL)
+                values_list = [tuple(row) for row in df.astype(object).where(df.notna(), None).to_numpy()]
                 
                 # Execute insert
                 print(f"Inserting {len(values_list)} rows into {table_name}")
@@ -288,12 +511,17 @@ def main(variables: dict):
     """
     Apply the ETL pipeline to the GTFS data
     """
-    df_dict = pipeline_extract(variables['GTFS_URL'])
+    extract_config = variables.get('GTFS_EXTRACT', {})
+    df_dict = pipeline_extract(variables['GTFS_URL'],
+                               mode = extract_config.get('mode', 'disk'),
+                               spool_max_size = extract_config.get('spool_max_size', SPOOL_MAX_SIZE),
+                               tables = GTFS_TABLES,
+                               engine = extract_config.get('csv_engine', CSV_ENGINE))
     df_dict = pipeline_transform(df_dict)
     # Debug
     # for key, df in df_dict.items():
         # print(f'DF {key} size : {df.shape[0]}')
-    pipeline_load(df_dict, variables)
+    pipeline_load(df_dict, variables, strategy = variables.get('GTFS_LOAD_STRATEGY', 'insert'))
 
 
 if __name__ == "__main__":
@@ -303,6 +531,8 @@ if __name__ == "__main__":
 
     var_dict = {
         'GTFS_URL': data_sources['gtfs_url'],
+        'GTFS_EXTRACT': data_sources.get('gtfs_extract', {}),
+        'GTFS_LOAD_STRATEGY': data_sources.get('gtfs_load_strategy', 'insert'),
         'POSTGRES_HOST': data_sources['postgres_host'],
         'POSTGRES_PORT': data_sources['postgres_port'],
         'POSTGRES_DB': data_sources['postgres_db'],
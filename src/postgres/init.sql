@@ -103,6 +103,8 @@ CREATE TABLE IF NOT EXISTS agency (
     PRIMARY KEY (agency_id)
 );
 
+-- arrival_time / departure_time: display time of day (wrapped after midnight)
+-- arrival_seconds / departure_seconds: seconds since the start of the service day (86400+ after midnight)
 CREATE TABLE IF NOT EXISTS stop_times (
     trip_id            TEXT        NOT NULL,
     arrival_time       TIME,
@@ -111,9 +113,15 @@ CREATE TABLE IF NOT EXISTS stop_times (
     stop_sequence      INT         NOT NULL,
     pickup_type        SMALLINT,
     drop_off_type      SMALLINT,
+    arrival_seconds    INT,
+    departure_seconds  INT,
     PRIMARY KEY (trip_id, stop_sequence)
 );
 
+-- Real-time joins on (trip_id, stop_id), departure boards per stop
+CREATE INDEX IF NOT EXISTS ix_stop_times_trip_stop ON stop_times (trip_id, stop_id) INCLUDE (arrival_seconds, departure_seconds);
+CREATE INDEX IF NOT EXISTS ix_stop_times_stop_departure ON stop_times (stop_id, departure_seconds);
+
 CREATE TABLE IF NOT EXISTS routes (
     route_id           TEXT        NOT NULL,
     agency_id          TEXT        NOT NULL,
@@ -0,0 +1,11 @@
+-- Seconds since the start of the service day on stop_times, for databases created before these columns.
+-- init.sql only runs on an empty data directory, apply this script once on existing databases:
+--   docker compose exec -T postgres psql -U <user> -d gtfs < src/postgres/migrations/001_stop_times_seconds.sql
+-- The columns stay NULL until the next GTFS update reloads stop_times.
+ALTER TABLE stop_times
+    ADD COLUMN IF NOT EXISTS arrival_seconds INT,
+    ADD COLUMN IF NOT EXISTS departure_seconds INT;
+
+-- Real-time joins on (trip_id, stop_id), departure boards per stop
+CREATE INDEX IF NOT EXISTS ix_stop_times_trip_stop ON stop_times (trip_id, stop_id) INCLUDE (arrival_seconds, departure_seconds);
+CREATE INDEX IF NOT EXISTS ix_stop_times_stop_departure ON stop_times (stop_id, departure_seconds);
@@ -0,0 +1,124 @@
+#src/producer/AsyncKafkaEngine.py
+"""
+AsyncKafkaEngine class, asyncio counterpart of KafkaEngine (aiokafka)
+"""
+import asyncio
+import functools
+import logging
+import time
+
+from aiokafka import AIOKafkaProducer
+from aiokafka.errors import KafkaError
+from KafkaEngine import WIRE_FORMAT_HEADER, WIRE_FORMAT_SERIALIZERS
+from producer_metrics import KAFKA_DELIVERIES, KAFKA_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncKafkaEngine:
+    def __init__(self, brokers, linger_ms: int = 100, batch_size: int = 131072, compression_type: str | None = None, wire_format: str = 'json', **producer_config):
+        if wire_format not in WIRE_FORMAT_SERIALIZERS:
+            raise ValueError(f"Unknown wire format: {wire_format}")
+        self.brokers = brokers
+        self.wire_format = wire_format
+        self.headers = [(WIRE_FORMAT_HEADER, wire_format.encode("utf-8"))]
+        self.producer_config = {
+            'linger_ms': linger_ms,
+            'max_batch_size': batch_size,
+            'compression_type': compression_type,
+            **producer_config
+        }
+        self.producer = None
+        self._start_lock = asyncio.Lock()
+        self.delivered = 0
+        self.failed = 0
+
+
+    async def _get_producer(self) -> AIOKafkaProducer:
+        """
+        Start the producer on first use, then reuse it (shared by all feed tasks)
+        """
+        async with self._start_lock:
+            if self.producer is None:
+                producer = AIOKafkaProducer(bootstrap_servers = self.brokers,
+                                            value_serializer = WIRE_FORMAT_SERIALIZERS[self.wire_format],
+                                            **self.producer_config)
+                await producer.start()
+                self.producer = producer
+                logger.info(f"Kafka producer connected to {self.brokers}")
+            return self.producer
+
+
+    async def is_ready(self, topics: list) -> bool:
+        """
+        Readiness probe: brokers reachable and metadata available for all topics
+        """
+        try:
+            producer = await self._get_producer()
+            for topic in topics:
+                if not await producer.partitions_for(topic):
+                    return False
+            return True
+        except (KafkaError, OSError) as e:
+            logger.warning(f"Kafka not ready: {e}")
+            return False
+
+
+    def _on_delivery(self, topic: str, sent_at: float, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            KAFKA_DELIVERIES.labels(topic, 'failed').inc()
+            self.failed += 1
+            if not future.cancelled():
+                logger.warning(f"Kafka delivery failed: {future.exception()}")
+        else:
+            KAFKA_SEND_SECONDS.labels(topic).observe(time.perf_counter() - sent_at)
+            KAFKA_DELIVERIES.labels(topic, 'delivered').inc()
+            self.delivered += 1
+
+
+    async def send(self, topic: str, records: list, key = None) -> int:
+        """
+        Queue records for asynchronous delivery, results are tracked by delivery callbacks.
+        key: Optional callable returning the record key (str) of a record, used for partitioning.
+        Returns the number of queued records.
+        """
+        producer = await self._get_producer()
+        queued = 0
+        on_delivery = functools.partial(self._on_delivery, topic, time.perf_counter())
+        for record in records:
+            try:
+                record_key = key(record) if key else None
+                future = await producer.send(topic, record, key = record_key.encode("utf-8") if record_key else None, headers = self.headers)
+                future.add_done_callback(on_delivery)
+                queued += 1
+            except (KafkaError, TypeError, ValueError) as e:
+                logger.error(f"Error sending individual message to Kafka: {e}")
+                KAFKA_DELIVERIES.labels(topic, 'failed').inc()
+                self.failed += 1
+        return queued
+
+
+    def pop_stats(self) -> dict:
+        """
+        Return delivery counters since the last call and reset them
+        """
+        stats = {'delivered': self.delivered, 'failed': self.failed}
+        self.delivered = 0
+        self.failed = 0
+        return stats
+
+
+    async def close(self) -> None:
+        """
+        Deliver pending records and stop the producer (shutdown hook)
+        """
+        if self.producer is None:
+            return
+        try:
+            await self.producer.flush()
+            await self.producer.stop()
+            logger.info("Kafka producer closed")
+        except KafkaError as e:
+            logger.error(f"Error closing Kafka producer: {e}")
+        finally:
+            self.producer = None
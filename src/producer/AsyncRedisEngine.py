@@ -0,0 +1,163 @@
+#src/producer/AsyncRedisEngine.py
+"""
+AsyncRedisEngine class, asyncio counterpart of RedisEngine (redis.asyncio)
+"""
+import logging
+import time
+
+import redis.asyncio as redis
+from LRUCache import LRUCache
+from producer_metrics import REDIS_ROUND_TRIPS
+from redis.exceptions import RedisError
+from RedisEngine import (
+    CLAIM_CHANGED_SCRIPT,
+    CLAIM_KEYS_SCRIPT,
+    CLAIMED,
+    LOCAL_CACHE_DEFAULTS,
+    PRUNE_FINGERPRINTS_SCRIPT,
+    PRUNE_INTERVAL,
+    prune_due,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisEngine:
+    def __init__(self, host:str, port:int, health_check_interval:int = 30, decode_responses: bool = True, local_cache: LRUCache | None = None):
+        self.host = host
+        self.port = port
+        self.local_cache = local_cache
+        # Keys published while Redis is unavailable, when there is no local cache
+        self.outage_cache = LRUCache(**LOCAL_CACHE_DEFAULTS) if local_cache is None else None
+        # hash key -> time.monotonic() of the last fingerprint pruning
+        self.last_pruned = {}
+        self.conn = redis.Redis(
+            host=self.host,
+            port=self.port,
+            decode_responses=decode_responses,
+            health_check_interval=health_check_interval
+        )
+
+    async def close(self):
+        await self.conn.aclose()
+
+    async def ping(self):
+        """
+        Check if the Redis connection is alive.
+        """
+        try:
+            REDIS_ROUND_TRIPS.labels('ping').inc()
+            return await self.conn.ping()
+        except RedisError as e:
+            logger.warning(f"Redis PING failed: {e}")
+            return False
+
+    async def claim_many(self, keys, ttl):
+        """
+        Atomically claim a list of keys (SET NX EX) in a single pipelined round trip.
+        Returns a list of booleans, True when the key was newly claimed.
+        Keys found in the local cache are not sent to Redis.
+        If Redis is unavailable, keys are new once: they are then remembered in the local (or outage) cache.
+        """
+        if not keys:
+            return []
+        if self.local_cache is None:
+            return await self._claim_remote(keys, ttl)
+        seen = [self.local_cache.get(key) is not None for key in keys]
+        claimed = iter(await self._claim_remote([key for key, hit in zip(keys, seen) if not hit], ttl))
+        return [False if hit else next(claimed) for hit in seen]
+
+    async def _claim_remote(self, keys, ttl):
+        if not keys:
+            return []
+        try:
+            REDIS_ROUND_TRIPS.labels('claim_many').inc()
+            if self.local_cache is None:
+                async with self.conn.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.set(key, "1", ex=ttl, nx=True)
+                    return [bool(result) for result in await pipe.execute()]
+            # One scripted command, also returning the remaining lifetime of the keys claimed earlier
+            results = await self.conn.eval(CLAIM_KEYS_SCRIPT, len(keys), *keys, ttl)
+        except RedisError as e:
+            logger.warning(f"Redis claim failed: {e}")
+            return self._claim_local(keys, ttl)
+        claimed = []
+        for key, ttl_ms in zip(keys, results):
+            is_new = ttl_ms == CLAIMED
+            self.local_cache.put(key, True, ttl if is_new or ttl_ms < 0 else ttl_ms / 1000)
+            claimed.append(is_new)
+        return claimed
+
+    def _claim_local(self, keys, ttl):
+        """
+        Redis fallback: publish unknown keys once, then remember them locally so the next polls do not republish them
+        (in the local cache, or in the outage cache when there is none)
+        """
+        if self.local_cache is not None:
+            for key in keys:
+                self.local_cache.put(key, True, ttl)
+            return [True] * len(keys)
+        claimed = [self.outage_cache.get(key) is None for key in keys]
+        for key, is_new in zip(keys, claimed):
+            if is_new:
+                self.outage_cache.put(key, True, ttl)
+        return claimed
+
+    async def claim_changed(self, hash_key, fingerprints):
+        """
+        Compare (id, digest) pairs with the digests stored in the hash {hash_key} and store the new ones,
+        in a single scripted round trip. Returns a list of booleans, True when the id is new or its digest changed.
+        Ids whose digest matches the local cache are not sent to Redis.
+        If Redis is unavailable, ids unknown to the local (or outage) cache are considered as changed.
+        """
+        if not fingerprints:
+            return []
+        if self.local_cache is None:
+            return await self._claim_changed_remote(hash_key, fingerprints)
+        unchanged = [self.local_cache.get(f"{hash_key}:{field}") == digest for field, digest in fingerprints]
+        changed = iter(await self._claim_changed_remote(hash_key, [fingerprint for fingerprint, hit in zip(fingerprints, unchanged) if not hit]))
+        return [False if hit else next(changed) for hit in unchanged]
+
+    async def _claim_changed_remote(self, hash_key, fingerprints):
+        if not fingerprints:
+            return []
+        args = [int(time.time())]
+        for field, digest in fingerprints:
+            args.extend((field, digest))
+        try:
+            REDIS_ROUND_TRIPS.labels('claim_changed').inc()
+            result = [bool(changed) for changed in await self.conn.eval(CLAIM_CHANGED_SCRIPT, 1, hash_key, *args)]
+        except RedisError as e:
+            logger.warning(f"Redis fingerprint check failed: {e}")
+            result = self._claim_changed_local(hash_key, fingerprints)
+        if self.local_cache is not None:
+            for field, digest in fingerprints:
+                self.local_cache.put(f"{hash_key}:{field}", digest)
+        return result
+
+    def _claim_changed_local(self, hash_key, fingerprints):
+        """
+        Redis fallback: ids missing from the local cache are changed,
+        without a local cache the digests published during the outage are remembered in the outage cache
+        """
+        if self.local_cache is not None:
+            return [True] * len(fingerprints)
+        result = [self.outage_cache.get(f"{hash_key}:{field}") != digest for field, digest in fingerprints]
+        for field, digest in fingerprints:
+            self.outage_cache.put(f"{hash_key}:{field}", digest)
+        return result
+
+    async def prune_fingerprints(self, hash_key, max_age, interval: float = PRUNE_INTERVAL):
+        """
+        Remove fingerprints not seen during the last {max_age} seconds from the hash {hash_key},
+        at most once every {interval} seconds. Returns the number of removed fields.
+        """
+        if not prune_due(self.last_pruned, hash_key, interval):
+            return 0
+        try:
+            REDIS_ROUND_TRIPS.labels('prune_fingerprints').inc()
+            return await self.conn.eval(PRUNE_FINGERPRINTS_SCRIPT, 1, hash_key, int(time.time()) - max_age)
+        except RedisError as e:
+            logger.warning(f"Redis fingerprint pruning failed: {e}")
+            return 0
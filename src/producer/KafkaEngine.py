@@ -0,0 +1,154 @@
+#src/producer/KafkaEngine.py
+"""
+KafkaEngine class to publish messages to Kafka with a long-lived producer
+"""
+import functools
+import json
+import logging
+import threading
+import time
+
+import msgpack
+from kafka import KafkaProducer
+from kafka.errors import KafkaError
+from producer_metrics import KAFKA_DELIVERIES, KAFKA_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+# Record header telling consumers how the value is encoded
+WIRE_FORMAT_HEADER = 'format'
+
+WIRE_FORMAT_SERIALIZERS = {
+    'json': lambda v: json.dumps(v).encode("utf-8"),
+    'msgpack': lambda v: msgpack.packb(v, use_bin_type=True)
+}
+
+
+class KafkaEngine:
+    def __init__(self, brokers, linger_ms: int = 100, batch_size: int = 131072, compression_type: str | None = None, wire_format: str = 'json', **producer_config):
+        if wire_format not in WIRE_FORMAT_SERIALIZERS:
+            raise ValueError(f"Unknown wire format: {wire_format}")
+        self.brokers = brokers
+        self.wire_format = wire_format
+        self.headers = [(WIRE_FORMAT_HEADER, wire_format.encode("utf-8"))]
+        self.producer_config = {
+            'linger_ms': linger_ms,
+            'batch_size': batch_size,
+            'compression_type': compression_type,
+            **producer_config
+        }
+        self.producer = None
+        self._producer_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.delivered = 0
+        self.failed = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def _get_producer(self) -> KafkaProducer:
+        """
+        Create the producer on first use, then reuse it (shared between threads, KafkaProducer is thread-safe)
+        """
+        with self._producer_lock:
+            if self.producer is None:
+                self.producer = KafkaProducer(bootstrap_servers = self.brokers,
+                                              value_serializer = WIRE_FORMAT_SERIALIZERS[self.wire_format],
+                                              **self.producer_config)
+                logger.info(f"Kafka producer connected to {self.brokers}")
+            return self.producer
+
+
+    def is_ready(self, topics: list) -> bool:
+        """
+        Readiness probe: brokers reachable and metadata available for all topics
+        """
+        try:
+            producer = self._get_producer()
+            return all(producer.partitions_for(topic) for topic in topics)
+        except KafkaError as e:
+            logger.warning(f"Kafka not ready: {e}")
+            return False
+
+
+    def _on_delivery(self, topic, sent_at, _metadata):
+        KAFKA_SEND_SECONDS.labels(topic).observe(time.perf_counter() - sent_at)
+        KAFKA_DELIVERIES.labels(topic, 'delivered').inc()
+        with self._stats_lock:
+            self.delivered += 1
+
+
+    def _on_error(self, topic, e):
+        KAFKA_DELIVERIES.labels(topic, 'failed').inc()
+        with self._stats_lock:
+            self.failed += 1
+        logger.warning(f"Kafka delivery failed: {e}")
+
+
+    def send(self, topic: str, records: list, key = None) -> int:
+        """
+        Queue records for asynchronous delivery, results are tracked by delivery callbacks.
+        key: Optional callable returning the record key (str) of a record, used for partitioning.
+        Returns the number of queued records.
+        """
+        producer = self._get_producer()
+        queued = 0
+        sent_at = time.perf_counter()
+        on_delivery = functools.partial(self._on_delivery, topic, sent_at)
+        on_error = functools.partial(self._on_error, topic)
+        for record in records:
+            try:
+                record_key = key(record) if key else None
+                future = producer.send(topic, record, key = record_key.encode("utf-8") if record_key else None, headers = self.headers)
+                future.add_callback(on_delivery)
+                future.add_errback(on_error)
+                queued += 1
+            except (KafkaError, TypeError, ValueError) as e:
+                logger.error(f"Error sending individual message to Kafka: {e}")
+                KAFKA_DELIVERIES.labels(topic, 'failed').inc()
+                with self._stats_lock:
+                    self.failed += 1
+        return queued
+
+
+    def pop_stats(self) -> dict:
+        """
+        Return delivery counters since the last call and reset them
+        """
+        with self._stats_lock:
+            stats = {'delivered': self.delivered, 'failed': self.failed}
+            self.delivered = 0
+            self.failed = 0
+        return stats
+
+
+    def flush(self, timeout: float | None = None) -> None:
+        """
+        Block until all queued records are delivered
+        """
+        if self.producer is not None:
+            self.producer.flush(timeout = timeout)
+
+
+    def close(self, timeout: float = 10) -> None:
+        """
+        Deliver pending records and close the producer (shutdown hook)
+        """
+        with self._producer_lock:
+            if self.producer is None:
+                return
+            try:
+                self.producer.flush(timeout = timeout)
+                self.producer.close(timeout = timeout)
+                logger.info("Kafka producer closed")
+            except KafkaError as e:
+                logger.error(f"Error closing Kafka producer: {e}")
+            finally:
+                self.producer = None
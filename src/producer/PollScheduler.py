@@ -0,0 +1,157 @@
+#src/producer/PollScheduler.py
+"""
+PollScheduler class to poll each feed on its own adaptive cadence
+"""
+import concurrent.futures
+import logging
+import random
+import threading
+import time
+
+from producer_metrics import FEED_LAG, FEED_NEXT_POLL, FEED_POLLS
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    def __init__(self, feeds: dict, min_interval: float = 30, max_interval: float = 300, max_backoff: float = 900, margin: float = 5):
+        """
+        Args:
+            feeds: Feed name -> callable polling the feed once and returning its state dict
+                   ({'status': 'changed' | 'unchanged' | 'error', 'timestamp': feed header timestamp})
+            min_interval: Minimum delay between two polls of a feed (seconds)
+            max_interval: Maximum delay between two polls of a healthy feed (seconds)
+            max_backoff: Maximum delay after consecutive errors (seconds)
+            margin: Delay added to the expected upstream refresh time (seconds)
+        """
+        self.feeds = feeds
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.margin = margin
+        self._lock = threading.Lock()
+        self.states = {name: {
+            'next_poll': 0.0,
+            'last_poll': None,
+            'interval': min_interval,
+            'last_timestamp': None,
+            'refresh_period': None,
+            'lag': None,
+            'consecutive_errors': 0,
+            'polls': 0,
+            'changed': 0,
+            'unchanged': 0,
+            'errors': 0
+        } for name in feeds}
+
+
+    def _clamp(self, delay: float) -> float:
+        return min(max(delay, self.min_interval), self.max_interval)
+
+
+    def update(self, name: str, status: str, feed_timestamp: int | None = None, now: float | None = None) -> float:
+        """
+        Record a poll outcome and schedule the next poll of the feed.
+        The feed lag and the delay until the next poll are exported as metrics.
+        Returns the delay until the next poll.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self.states[name]
+            delay = self._schedule(state, status, feed_timestamp, now)
+            state['next_poll'] = now + delay
+            lag = state['lag']
+
+        FEED_POLLS.labels(name, status).inc()
+        FEED_NEXT_POLL.labels(name).set(delay)
+        if lag is not None:
+            FEED_LAG.labels(name).set(lag)
+        return delay
+
+
+    def _schedule(self, state: dict, status: str, feed_timestamp: int, now: float) -> float:
+        """
+        Update the feed state with a poll outcome, return the delay until the next poll
+        """
+        state['polls'] += 1
+        state['last_poll'] = now
+
+        if status == 'error':
+            state['errors'] += 1
+            state['consecutive_errors'] += 1
+            # Exponential backoff with jitter
+            backoff = min(self.max_backoff, self.min_interval * 2 ** state['consecutive_errors'])
+            return backoff * (0.5 + random.random() / 2)
+
+        state['consecutive_errors'] = 0
+        if status == 'changed' and feed_timestamp:
+            if state['last_timestamp'] and feed_timestamp > state['last_timestamp']:
+                period = feed_timestamp - state['last_timestamp']
+                if state['refresh_period'] is None:
+                    state['refresh_period'] = period
+                else:
+                    state['refresh_period'] = 0.7 * state['refresh_period'] + 0.3 * period
+            state['last_timestamp'] = feed_timestamp
+        if state['last_timestamp']:
+            state['lag'] = now - state['last_timestamp']
+
+        expected = None
+        if state['last_timestamp'] and state['refresh_period']:
+            expected = state['last_timestamp'] + state['refresh_period'] + self.margin
+
+        if status == 'changed':
+            state['changed'] += 1
+            state['interval'] = self.min_interval
+            delay = expected - now if expected else self.min_interval
+        else:
+            state['unchanged'] += 1
+            if expected and expected > now:
+                delay = expected - now
+            else:
+                # Upstream is late: poll less and less often
+                state['interval'] = min(state['interval'] * 2, self.max_interval)
+                delay = state['interval']
+
+        return self._clamp(delay)
+
+
+    def _poll(self, name: str) -> dict:
+        return self.feeds[name]()
+
+
+    def run(self, stop_event: threading.Event | None = None) -> None:
+        """
+        Poll feeds when they are due until stop_event is set
+        """
+        stop_event = stop_event or threading.Event()
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers = len(self.feeds)) as executor:
+            while not stop_event.is_set():
+                now = time.time()
+                for name in self.feeds:
+                    if name not in running and self.states[name]['next_poll'] <= now:
+                        running[name] = executor.submit(self._poll, name)
+
+                idle = [self.states[name]['next_poll'] for name in self.feeds if name not in running]
+                timeout = max(0.0, min(idle) - time.time()) if idle else None
+                if running:
+                    done, _ = concurrent.futures.wait(running.values(), timeout = timeout,
+                                                      return_when = concurrent.futures.FIRST_COMPLETED)
+                else:
+                    stop_event.wait(timeout)
+                    continue
+
+                for name, future in list(running.items()):
+                    if future not in done:
+                        continue
+                    del running[name]
+                    try:
+                        feed_state = future.result() or {}
+                        status = feed_state.get('status', 'error')
+                    except Exception:
+                        logger.exception(f"Error polling feed {name}")
+                        feed_state, status = {}, 'error'
+                    delay = self.update(name, status, feed_state.get('timestamp'))
+                    lag = self.states[name]['lag']
+                    lag_str = f"{lag:.0f}s" if lag is not None else "unknown"
+                    logger.info(f"Feed {name}: {status}, lag {lag_str}, next poll in {delay:.0f}s")
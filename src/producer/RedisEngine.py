@@ -1,15 +1,95 @@
 #src/producer/RedisEngine.py
 
+import logging
 import redis
+import time
 from redis.exceptions import RedisError, ConnectionError, TimeoutError
 
+from LRUCache import LRUCache
+from producer_metrics import REDIS_ROUND_TRIPS
+
+logger = logging.getLogger(__name__)
+
+
+# Local dedup cache settings (data_sources.json "local_cache"), cached keys are checked in Redis again after max_ttl seconds
+LOCAL_CACHE_DEFAULTS = {
+    'max_size': 100000,
+    'max_ttl': 3600
+}
+
+# SET NX EX for each key, returns CLAIMED for a newly claimed key or the remaining lifetime (ms) of a key claimed earlier
+CLAIMED = -3
+CLAIM_KEYS_SCRIPT = """
+local result = {}
+for i = 1, #KEYS do
+    if redis.call('SET', KEYS[i], '1', 'EX', ARGV[1], 'NX') then
+        result[i] = -3
+    else
+        result[i] = redis.call('PTTL', KEYS[i])
+    end
+end
+return result
+"""
+
+# Fingerprints are stored as "<digest>:<last_seen_epoch>" fields of one hash per feed type
+CLAIM_CHANGED_SCRIPT = """
+local result = {}
+for i = 2, #ARGV, 2 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    local changed = 1
+    if current then
+        local sep = string.find(current, ':', 1, true)
+        if sep and string.sub(current, 1, sep - 1) == ARGV[i + 1] then
+            changed = 0
+        end
+    end
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1] .. ':' .. ARGV[1])
+    result[#result + 1] = changed
+end
+return result
+"""
+
+PRUNE_FINGERPRINTS_SCRIPT = """
+local entries = redis.call('HGETALL', KEYS[1])
+local removed = 0
+for i = 1, #entries, 2 do
+    local sep = string.find(entries[i + 1], ':', 1, true)
+    local last_seen = sep and tonumber(string.sub(entries[i + 1], sep + 1)) or 0
+    if last_seen < tonumber(ARGV[1]) then
+        redis.call('HDEL', KEYS[1], entries[i])
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+# The prune script reads the whole hash, so each hash is pruned at most once per interval (seconds)
+PRUNE_INTERVAL = 600
+
+
+def prune_due(last_pruned: dict, hash_key: str, interval: float, now: float | None = None) -> bool:
+    """
+    Return True and record {now} in {last_pruned} when {hash_key} was not pruned during the last {interval} seconds
+    """
+    now = time.monotonic() if now is None else now
+    if hash_key in last_pruned and now - last_pruned[hash_key] < interval:
+        return False
+    last_pruned[hash_key] = now
+    return True
+
 
 class RedisEngine():
-    def __init__(self, host:str, port:int, health_check_interval:int = 30, decode_responses: bool = True):
+    def __init__(self, host:str, port:int, health_check_interval:int = 30, decode_responses: bool = True, local_cache: LRUCache = None):
         self.host = host
         self.port = port
         self.health_check_interval = health_check_interval
         self.decode_responses = decode_responses
+        # Optional in-process layer answering "seen recently" without a Redis round trip
+        self.local_cache = local_cache
+        # Keys published while Redis is unavailable, when there is no local cache
+        self.outage_cache = LRUCache(**LOCAL_CACHE_DEFAULTS) if local_cache is None else None
+        # hash key -> time.monotonic() of the last fingerprint pruning
+        self.last_pruned = {}
         self.conn = None
         self._connect()
 
@@ -22,44 +102,179 @@ class RedisEngine():
                 health_check_interval=self.health_check_interval
             )
             self.conn.ping()
-            print("Redis connection established.")
+            logger.info("Redis connection established.")
         except (ConnectionError, TimeoutError, RedisError) as e:
             self.conn = None
-            print(f"Redis connection failed: {e}")
+            logger.warning(f"Redis connection failed: {e}")
 
     def _reconnect_if_needed(self):
         if self.conn is None:
-            print("Attempting Redis reconnection...")
+            logger.info("Attempting Redis reconnection...")
             self._connect()
 
 
     def set(self, key, value, ttl):
+        if self.local_cache is not None:
+            self.local_cache.put(key, value, ttl)
         self._reconnect_if_needed()
         if not self.conn:
-            print("Redis unavailable. Cannot perform 'set'.")
+            logger.warning("Redis unavailable. Cannot perform 'set'.")
             return
         try:
+            REDIS_ROUND_TRIPS.labels('set').inc()
             self.conn.set(key, value, ttl)
-            print(f"SET key='{key}' with TTL={ttl}s")
+            logger.debug(f"SET key='{key}' with TTL={ttl}s")
         except RedisError as e:
-            print(f"Redis SET failed: {e}")
+            logger.warning(f"Redis SET failed: {e}")
             self.conn = None
 
     def exists(self, key):
         """
-        Check if key exists in Redis.
+        Check if key exists in Redis (or was set recently by this process when the local cache is enabled).
         """
+        if self.local_cache is not None and self.local_cache.get(key) is not None:
+            return True
         self._reconnect_if_needed()
         if not self.conn:
-            print("Redis unavailable. Cannot perform 'exists'.")
+            logger.warning("Redis unavailable. Cannot perform 'exists'.")
             return False
         try:
+            REDIS_ROUND_TRIPS.labels('exists').inc()
             return self.conn.exists(key) == 1
         except RedisError as e:
-            print(f"Redis EXISTS failed: {e}")
+            logger.warning(f"Redis EXISTS failed: {e}")
             self.conn = None
             return False
 
+    def claim_many(self, keys, ttl):
+        """
+        Atomically claim a list of keys (SET NX EX) in a single pipelined round trip.
+        Returns a list of booleans, True when the key was newly claimed.
+        Keys found in the local cache are not sent to Redis.
+        If Redis is unavailable, keys are new once: they are then remembered in the local (or outage) cache.
+        """
+        if not keys:
+            return []
+        if self.local_cache is None:
+            return self._claim_remote(keys, ttl)
+        seen = [self.local_cache.get(key) is not None for key in keys]
+        claimed = iter(self._claim_remote([key for key, hit in zip(keys, seen) if not hit], ttl))
+        return [False if hit else next(claimed) for hit in seen]
+
+    def _claim_remote(self, keys, ttl):
+        if not keys:
+            return []
+        self._reconnect_if_needed()
+        if not self.conn:
+            logger.warning("Redis unavailable. Cannot perform 'claim_many'.")
+            return self._claim_local(keys, ttl)
+        try:
+            REDIS_ROUND_TRIPS.labels('claim_many').inc()
+            if self.local_cache is None:
+                pipe = self.conn.pipeline(transaction=False)
+                for key in keys:
+                    pipe.set(key, "1", ex=ttl, nx=True)
+                return [bool(result) for result in pipe.execute()]
+            # One scripted command, also returning the remaining lifetime of the keys claimed earlier
+            results = self.conn.eval(CLAIM_KEYS_SCRIPT, len(keys), *keys, ttl)
+        except RedisError as e:
+            logger.warning(f"Redis claim failed: {e}")
+            self.conn = None
+            return self._claim_local(keys, ttl)
+        claimed = []
+        for key, ttl_ms in zip(keys, results):
+            is_new = ttl_ms == CLAIMED
+            # Keys claimed by an earlier poll are only cached for their remaining lifetime in Redis
+            self.local_cache.put(key, True, ttl if is_new or ttl_ms < 0 else ttl_ms / 1000)
+            claimed.append(is_new)
+        return claimed
+
+    def _claim_local(self, keys, ttl):
+        """
+        Redis fallback: publish unknown keys once, then remember them locally so the next polls do not republish them
+        (in the local cache, or in the outage cache when there is none)
+        """
+        if self.local_cache is not None:
+            # Keys reaching Redis already missed the local cache
+            for key in keys:
+                self.local_cache.put(key, True, ttl)
+            return [True] * len(keys)
+        claimed = [self.outage_cache.get(key) is None for key in keys]
+        for key, is_new in zip(keys, claimed):
+            if is_new:
+                self.outage_cache.put(key, True, ttl)
+        return claimed
+
+    def claim_changed(self, hash_key, fingerprints):
+        """
+        Compare (id, digest) pairs with the digests stored in the hash {hash_key} and store the new ones,
+        in a single scripted round trip. Returns a list of booleans, True when the id is new or its digest changed.
+        Ids whose digest matches the local cache are not sent to Redis.
+        If Redis is unavailable, ids unknown to the local (or outage) cache are considered as changed.
+        """
+        if not fingerprints:
+            return []
+        if self.local_cache is None:
+            return self._claim_changed_remote(hash_key, fingerprints)
+        unchanged = [self.local_cache.get(f"{hash_key}:{field}") == digest for field, digest in fingerprints]
+        changed = iter(self._claim_changed_remote(hash_key, [fingerprint for fingerprint, hit in zip(fingerprints, unchanged) if not hit]))
+        return [False if hit else next(changed) for hit in unchanged]
+
+    def _claim_changed_remote(self, hash_key, fingerprints):
+        if not fingerprints:
+            return []
+        self._reconnect_if_needed()
+        if self.conn:
+            args = [int(time.time())]
+            for field, digest in fingerprints:
+                args.extend((field, digest))
+            try:
+                REDIS_ROUND_TRIPS.labels('claim_changed').inc()
+                result = [bool(changed) for changed in self.conn.eval(CLAIM_CHANGED_SCRIPT, 1, hash_key, *args)]
+            except RedisError as e:
+                logger.warning(f"Redis fingerprint check failed: {e}")
+                self.conn = None
+                result = self._claim_changed_local(hash_key, fingerprints)
+        else:
+            logger.warning("Redis unavailable. Cannot perform 'claim_changed'.")
+            result = self._claim_changed_local(hash_key, fingerprints)
+        if self.local_cache is not None:
+            # Local entries expire before Redis prunes the field, so last seen times keep being refreshed
+            for field, digest in fingerprints:
+                self.local_cache.put(f"{hash_key}:{field}", digest)
+        return result
+
+    def _claim_changed_local(self, hash_key, fingerprints):
+        """
+        Redis fallback: ids missing from the local cache are changed,
+        without a local cache the digests published during the outage are remembered in the outage cache
+        """
+        if self.local_cache is not None:
+            return [True] * len(fingerprints)
+        result = [self.outage_cache.get(f"{hash_key}:{field}") != digest for field, digest in fingerprints]
+        for field, digest in fingerprints:
+            self.outage_cache.put(f"{hash_key}:{field}", digest)
+        return result
+
+    def prune_fingerprints(self, hash_key, max_age, interval: float = PRUNE_INTERVAL):
+        """
+        Remove fingerprints not seen during the last {max_age} seconds from the hash {hash_key},
+        at most once every {interval} seconds. Returns the number of removed fields.
+        """
+        if not prune_due(self.last_pruned, hash_key, interval):
+            return 0
+        self._reconnect_if_needed()
+        if not self.conn:
+            logger.warning("Redis unavailable. Cannot perform 'prune_fingerprints'.")
+            return 0
+        try:
+            REDIS_ROUND_TRIPS.labels('prune_fingerprints').inc()
+            return self.conn.eval(PRUNE_FINGERPRINTS_SCRIPT, 1, hash_key, int(time.time()) - max_age)
+        except RedisError as e:
+            logger.warning(f"Redis fingerprint pruning failed: {e}")
+            self.conn = None
+            return 0
+
 
     def get_key(self, key):
         """
@@ -67,12 +282,13 @@ class RedisEngine():
         """
         self._reconnect_if_needed()
         if not self.conn:
-            print("Redis connection not available, skipping 'get'")
+            logger.warning("Redis connection not available, skipping 'get'")
             return False
         try:
+            REDIS_ROUND_TRIPS.labels('get').inc()
             return self.conn.get(key)
         except RedisError as e:
-            print(f"Redis GET failed for key={key}: {e}")
+            logger.warning(f"Redis GET failed for key={key}: {e}")
             return False
         
     def ping(self):
@@ -81,12 +297,13 @@ class RedisEngine():
         """
         self._reconnect_if_needed()
         if not self.conn:
-            print("Redis unavailable. Cannot perform 'ping'.")
+            logger.warning("Redis unavailable. Cannot perform 'ping'.")
             return False
         try:
+            REDIS_ROUND_TRIPS.labels('ping').inc()
             return self.conn.ping()
         except RedisError as e:
-            print(f"Redis PING failed: {e}")
+            logger.warning(f"Redis PING failed: {e}")
             self.conn = None
             return False
 
@@ -2,65 +2,319 @@
 """
 Extract GTFS data from SNCF API and send them to Kafka
 """
-import concurrent.futures
+import functools
 from google.transit import gtfs_realtime_pb2
 from google.protobuf.json_format import MessageToDict
-from kafka import KafkaProducer
+from google.protobuf.message import DecodeError
+import hashlib
+import itertools
 import json
+import logging
 import os
 import requests
+import signal
+import threading
 import time
-from typing import List
 
 
-from RedisEngine import RedisEngine
+from KafkaEngine import KafkaEngine
+from LRUCache import LRUCache
+from PollScheduler import PollScheduler
+from RedisEngine import LOCAL_CACHE_DEFAULTS, RedisEngine
+from common_metrics import configure_logging, start_metrics_server
+from producer_metrics import ENTITIES, FETCH_SECONDS, PARSE_SECONDS
+
+logger = logging.getLogger(__name__)
 
 
 DATA_SOURCES_FILEPATH = os.getenv('DATA_SOURCES_FILEPATH', 'config/data_sources.json')
 
+# Persistent HTTP sessions (keep-alive, one per poll thread: requests.Session is not thread-safe) and per-URL conditional fetch state
+HTTP_SESSIONS = threading.local()
+FEED_STATES = {}
+
+# Feed kinds and their default topics
+FEED_KINDS = {'trip_update': 'gtfs-rt-tu', 'service_alert': 'gtfs-rt-sa'}
+RECORD_KEY_STRATEGIES = (None, 'trip_id', 'alert_id', 'entity_id')
+
+# Fields ignored when fingerprinting an entity (they change on every feed without any real update)
+VOLATILE_FIELDS = ('timestamp',)
+
+
+
+def load_feeds(data_sources: dict) -> list[dict]:
+    """
+    Read the feed list from the data sources config.
+    Each feed declares its name, url, kind ("trip_update" or "service_alert"), Kafka topic and record key strategy
+    ("trip_id", "alert_id", "entity_id" or null). Falls back to the SNCF gtfs_rt_tu_url / gtfs_rt_sa_url entries.
+    """
+    feeds = data_sources.get('feeds')
+    if not feeds:
+        feeds = [
+            {'name': 'trip_update', 'url': data_sources['gtfs_rt_tu_url'], 'kind': 'trip_update', 'topic': 'gtfs-rt-tu', 'key': 'trip_id'},
+            {'name': 'service_alert', 'url': data_sources['gtfs_rt_sa_url'], 'kind': 'service_alert', 'topic': 'gtfs-rt-sa', 'key': 'alert_id'}
+        ]
+    names = set()
+    for feed in feeds:
+        if feed['kind'] not in FEED_KINDS:
+            raise ValueError(f"Unknown kind {feed['kind']} for feed {feed['name']}")
+        if feed.get('key') not in RECORD_KEY_STRATEGIES:
+            raise ValueError(f"Unknown key strategy {feed.get('key')} for feed {feed['name']}")
+        if feed['name'] in names:
+            raise ValueError(f"Duplicate feed name {feed['name']}")
+        names.add(feed['name'])
+        feed.setdefault('topic', FEED_KINDS[feed['kind']])
+        feed.setdefault('key', None)
+        # Redis dedup namespace, one per feed
+        feed.setdefault('redis_type', feed['name'])
+    return feeds
+
+
+def record_key(item: dict, strategy: str) -> str:
+    """
+    Kafka record key of an entity, so that all updates of a trip (or alert) land on the same partition
+    """
+    if strategy == 'trip_id':
+        trip_id = item.get('trip_update', {}).get('trip', {}).get('tripId')
+        return trip_id or item['id']
+    if strategy in ('alert_id', 'entity_id'):
+        return item['id']
+    return None
+
+
+def read_feed_header(content: bytes) -> gtfs_realtime_pb2.FeedHeader:
+    """
+    Parse only the FeedHeader of a serialized FeedMessage (field 1, written first by feed producers).
+    Returns None if the message does not start with its header.
+    """
+    if not content or content[0] != 0x0A:
+        return None
+    length, shift, position = 0, 0, 1
+    while position < len(content):
+        byte = content[position]
+        length |= (byte & 0x7F) << shift
+        position += 1
+        if not byte & 0x80:
+            break
+        shift += 7
+    header = gtfs_realtime_pb2.FeedHeader()
+    try:
+        header.ParseFromString(content[position:position + length])
+    except DecodeError:
+        return None
+    return header
+
+
+def conditional_headers(feed_state: dict) -> dict:
+    """
+    HTTP request headers for a conditional GET of a feed
+    """
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+    if feed_state.get('etag'):
+        headers['If-None-Match'] = feed_state['etag']
+    if feed_state.get('last_modified'):
+        headers['If-Modified-Since'] = feed_state['last_modified']
+    return headers
+
+
+def parse_feed_content(url: str, content: bytes, response_headers, feed_state: dict) -> gtfs_realtime_pb2.FeedMessage:
+    """
+    Compare a feed body with the previous poll (body digest and FeedHeader timestamp) and parse it if it changed.
+    Returns None when the feed is unchanged.
+    The HTTP validators (ETag / Last-Modified) are only saved with the snapshot they describe, once it is known good,
+    so that a body failing to parse is fetched again on the next poll instead of being answered by a 304.
+    """
+    validators = {'etag': response_headers.get('ETag'), 'last_modified': response_headers.get('Last-Modified')}
+
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    header = read_feed_header(content)
+    timestamp = header.timestamp if header is not None and header.timestamp else None
+    if digest == feed_state.get('digest') or (timestamp and timestamp == feed_state.get('timestamp')):
+        logger.debug(f"Feed unchanged since last poll (timestamp={timestamp}): {url}")
+        feed_state.update({**validators, 'status': 'unchanged'})
+        return None
+
+    feed = gtfs_realtime_pb2.FeedMessage()
+    start = time.perf_counter()
+    feed.ParseFromString(content)
+    PARSE_SECONDS.labels(url).observe(time.perf_counter() - start)
+    feed_state.update({**validators, 'digest': digest, 'timestamp': timestamp or feed.header.timestamp, 'status': 'changed'})
+    return feed
 
 
-def fetch_gtfs_rt(url:str) -> gtfs_realtime_pb2.FeedMessage:
+def get_http_session() -> requests.Session:
+    """
+    Return the HTTP session of the calling thread, created on first use
+    """
+    session = getattr(HTTP_SESSIONS, 'session', None)
+    if session is None:
+        session = HTTP_SESSIONS.session = requests.Session()
+    return session
+
+
+def fetch_gtfs_rt(url:str, session: requests.Session | None = None, feed_state: dict | None = None) -> gtfs_realtime_pb2.FeedMessage:
     """
     Fetch GTFS data from SNCF API
 
+    When a feed_state dict is given, it is used to send If-None-Match / If-Modified-Since headers
+    and to compare the feed header timestamp and body digest with the previous call.
+    An unchanged feed is not parsed: None is returned and feed_state['status'] is set to 'unchanged'.
+
     Args:
         url (str): The URL of the SNCF API
+        session (requests.Session): Persistent HTTP session (keep-alive), plain requests.get if None
+        feed_state (dict): State of the feed kept between calls
 
     Returns:
         gtfs_realtime_pb2.FeedMessage: The GTFS data
     """
+    http = session or requests
+    state = feed_state if feed_state is not None else {}
+
     try:
-        response = requests.get(url, timeout=10)
+        start = time.perf_counter()
+        response = http.get(url, timeout=10, headers=conditional_headers(state))
+        FETCH_SECONDS.labels(url).observe(time.perf_counter() - start)
+        if response.status_code == 304:
+            logger.debug(f"Feed not modified (304): {url}")
+            state['status'] = 'unchanged'
+            return None
         response.raise_for_status()
-        feed = gtfs_realtime_pb2.FeedMessage()
-        feed.ParseFromString(response.content)
-        return feed
+        return parse_feed_content(url, response.content, response.headers, state)
     except Exception as e:
-        print(e)
+        logger.error(f"Error fetching {url}: {e}")
+        state['status'] = 'error'
         return None
 
 
-def extract_ids_and_trip_updates(feed: gtfs_realtime_pb2.FeedMessage) -> list[dict]:
-    """
-    Extract IDs and trip updates from GTFS data
-    """
-    all_ids = []
-    all_data = []
-    if feed:
-        for entity in feed.entity:
-            entity_data = {}
-            entity_data['id'] = entity.id
-            all_ids.append(entity.id)
-            # Convert protobuf trip_update to dictionary for JSON serialization (Kafka messages)
-            if entity.HasField('trip_update'):
-                entity_data['trip_update'] = MessageToDict(entity.trip_update)
-            elif entity.HasField('alert'):
-                entity_data['alert'] = MessageToDict(entity.alert)
-            else:
-                print(f"Unknown entity type: {entity}")
-                continue
-            all_data.append(entity_data)
+def project_trip_update(trip_update: gtfs_realtime_pb2.TripUpdate) -> dict:
+    """
+    Compact projection of a trip update, limited to the fields read by the consumer (and the trip id used as record key).
+    Keys and field presence match MessageToDict output.
+    """
+    data = {}
+    if trip_update.HasField('trip'):
+        trip = {}
+        if trip_update.trip.HasField('trip_id'):
+            trip['tripId'] = trip_update.trip.trip_id
+        if trip_update.trip.HasField('start_time'):
+            trip['startTime'] = trip_update.trip.start_time
+        if trip_update.trip.HasField('start_date'):
+            trip['startDate'] = trip_update.trip.start_date
+        data['trip'] = trip
+    if trip_update.HasField('timestamp'):
+        data['timestamp'] = trip_update.timestamp
+
+    stop_time_updates = []
+    for stop_time_update in trip_update.stop_time_update:
+        stu = {}
+        if stop_time_update.HasField('stop_id'):
+            stu['stopId'] = stop_time_update.stop_id
+        for event_name in ('arrival', 'departure'):
+            if stop_time_update.HasField(event_name):
+                event = getattr(stop_time_update, event_name)
+                stu[event_name] = {}
+                if event.HasField('time'):
+                    stu[event_name]['time'] = event.time
+                if event.HasField('delay'):
+                    stu[event_name]['delay'] = event.delay
+        stop_time_updates.append(stu)
+    if stop_time_updates:
+        data['stopTimeUpdate'] = stop_time_updates
+    return data
+
+
+def project_translated_string(translated_string: gtfs_realtime_pb2.TranslatedString) -> dict:
+    """
+    Compact projection of a translated string (language and text only)
+    """
+    translations = []
+    for translation in translated_string.translation:
+        item = {'text': translation.text}
+        if translation.HasField('language'):
+            item['language'] = translation.language
+        translations.append(item)
+    return {'translation': translations} if translations else {}
+
+
+def project_alert(alert: gtfs_realtime_pb2.Alert) -> dict:
+    """
+    Compact projection of a service alert, limited to the fields read by the consumer.
+    Keys and field presence match MessageToDict output.
+    """
+    data = {}
+    active_periods = []
+    for active_period in alert.active_period:
+        period = {}
+        if active_period.HasField('start'):
+            period['start'] = active_period.start
+        if active_period.HasField('end'):
+            period['end'] = active_period.end
+        active_periods.append(period)
+    if active_periods:
+        data['activePeriod'] = active_periods
+
+    informed_entities = []
+    for informed_entity in alert.informed_entity:
+        entity = {}
+        if informed_entity.HasField('trip') and informed_entity.trip.HasField('trip_id'):
+            entity['trip'] = {'tripId': informed_entity.trip.trip_id}
+        informed_entities.append(entity)
+    if informed_entities:
+        data['informedEntity'] = informed_entities
+
+    if alert.HasField('cause'):
+        data['cause'] = gtfs_realtime_pb2.Alert.Cause.Name(alert.cause)
+    if alert.HasField('severity_level'):
+        data['severityLevel'] = gtfs_realtime_pb2.Alert.SeverityLevel.Name(alert.severity_level)
+    if alert.HasField('header_text'):
+        data['headerText'] = project_translated_string(alert.header_text)
+    if alert.HasField('description_text'):
+        data['descriptionText'] = project_translated_string(alert.description_text)
+    return data
+
+
+def iter_entities(feed: gtfs_realtime_pb2.FeedMessage, wire_format: str = 'json'):
+    """
+    Yield feed entities one by one as dictionaries (Kafka messages).
+    With the msgpack wire format, entities are projected on the fields read by the consumer instead of being fully converted.
+    """
+    if not feed:
+        return
+    if wire_format == 'msgpack':
+        convert_trip_update, convert_alert = project_trip_update, project_alert
+    else:
+        convert_trip_update, convert_alert = MessageToDict, MessageToDict
+
+    for entity in feed.entity:
+        entity_data = {}
+        entity_data['id'] = entity.id
+        # Convert protobuf trip_update to dictionary for JSON serialization (Kafka messages)
+        if entity.HasField('trip_update'):
+            entity_data['trip_update'] = convert_trip_update(entity.trip_update)
+        elif entity.HasField('alert'):
+            entity_data['alert'] = convert_alert(entity.alert)
+        else:
+            logger.warning(f"Unknown entity type: {entity}")
+            continue
+        yield entity_data
+
+
+def iter_chunks(iterable, chunk_size: int):
+    """
+    Group an iterable into lists of at most chunk_size items
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def extract_ids_and_trip_updates(feed: gtfs_realtime_pb2.FeedMessage, wire_format: str = 'json') -> tuple[list[str], list[dict]]:
+    """
+    Extract IDs and trip updates from GTFS data (whole feed in memory, see iter_entities for streaming)
+    """
+    all_ids = [entity.id for entity in feed.entity] if feed else []
+    all_data = list(iter_entities(feed, wire_format))
     return all_ids, all_data
 
 
@@ -74,125 +328,208 @@ def is_already_sent(redis_engine: RedisEngine, type:str, id: str, delay: int = 1
     return False
 
 
-def send_to_kafka(brokers, topic:str, data:list[dict]):
+def filter_already_sent(redis_engine: RedisEngine, type:str, data:list[dict], delay: int = 10800) -> list[dict]:
+    """
+    Keep only the items not sent to Kafka during the last {delay} seconds.
+    All ids are checked and claimed in a single Redis round trip (pipelined SET NX EX).
+    """
+    if not data:
+        return []
+    keys = [f"{type}_{item['id']}" for item in data]
+    claimed = redis_engine.claim_many(keys, delay)
+    return [item for item, is_new in zip(data, claimed) if is_new]
+
+
+def strip_volatile_fields(data):
+    """
+    Recursively remove volatile fields from an entity payload
+    """
+    if isinstance(data, dict):
+        return {key: strip_volatile_fields(value) for key, value in data.items() if key not in VOLATILE_FIELDS}
+    if isinstance(data, list):
+        return [strip_volatile_fields(value) for value in data]
+    return data
+
+
+def entity_fingerprint(item: dict) -> str:
+    """
+    Compact hash of an entity payload, volatile fields excluded
+    """
+    payload = json.dumps(strip_volatile_fields(item), sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def filter_unchanged(redis_engine: RedisEngine, type:str, data:list[dict]) -> list[dict]:
     """
-    Send data to Kafka
+    Keep only the items whose content changed since they were last sent to Kafka (fingerprint mode).
+    Fingerprints are stored in one Redis hash per feed type (see prune_fingerprints for expiry).
     """
     if not data:
-        print(f"No new data to send to topic {topic}")
+        return []
+    fingerprints = [(item['id'], entity_fingerprint(item)) for item in data]
+    changed = redis_engine.claim_changed(f"fingerprints_{type}", fingerprints)
+    return [item for item, is_changed in zip(data, changed) if is_changed]
+
+
+def prune_fingerprints(redis_engine: RedisEngine, type:str, delay: int = 10800) -> None:
+    """
+    Forget fingerprints of entities not seen during the last {delay} seconds (fingerprint mode)
+    """
+    removed = redis_engine.prune_fingerprints(f"fingerprints_{type}", delay)
+    if removed:
+        logger.info(f"Pruned {removed} expired {type} fingerprints")
+
+
+def send_to_kafka(kafka_engine: KafkaEngine, topic:str, data:list[dict], key_strategy: str | None = None):
+    """
+    Send data to Kafka (asynchronous delivery through the long-lived producer), keyed by {key_strategy}
+    """
+    if not data:
+        logger.debug(f"No new data to send to topic {topic}")
         return
-        
-    producer = KafkaProducer(bootstrap_servers = brokers, 
-                             value_serializer=lambda v: json.dumps(v).encode("utf-8"))
 
-    sent_count = 0
-    failed_count = 0
-    
-    for record in data:
-        try:
-            producer.send(topic, record)
-            sent_count += 1
-        except Exception as e:
-            print(f"Error sending individual message to Kafka: {e}")
-            failed_count += 1
-    
-    # Ensure all messages are sent before closing
-    producer.flush()
-    producer.close()
-    
-    print(f"Sent {sent_count} messages to topic {topic}, {failed_count} failed")
+    key = functools.partial(record_key, strategy = key_strategy) if key_strategy else None
+    queued_count = kafka_engine.send(topic, data, key)
+    ENTITIES.labels(topic, 'published').inc(queued_count)
+    logger.debug(f"Queued {queued_count} messages to topic {topic}, {len(data) - queued_count} failed")
     return
 
 
-def process_feed_data(url: str, redis_type: str, kafka_topic: str, redis_engine: RedisEngine, kafka_brokers: List[str]) -> None:
+def process_feed_data(url: str, redis_type: str, kafka_topic: str, redis_engine: RedisEngine, kafka_engine: KafkaEngine, dedup_mode: str = 'id', chunk_size: int = 1000, key_strategy: str | None = None) -> dict:
     """
     Process GTFS feed (TU or SA)
+
+    Entities are converted, deduplicated and published chunk by chunk, so that at most
+    {chunk_size} converted entities are held in memory at once.
     
     Args:
         url: The GTFS feed URL
-        redis_type: Type for Redis keys ("trip_update" or "service_alert")
+        redis_type: Namespace for Redis keys (feed name)
         kafka_topic: Kafka topic to send data to
         redis_engine: Redis engine instance
-        kafka_brokers: List of Kafka brokers
+        kafka_engine: Kafka engine instance (shared producer)
+        dedup_mode: "id" to send each entity once per 3 hours, "fingerprint" to send it again whenever its content changes
+        chunk_size: Number of entities per dedup / publish batch
+        key_strategy: Record key strategy ("trip_id", "alert_id", "entity_id" or None)
+
+    Returns:
+        dict: The feed state ('status' and feed header 'timestamp'), used by the scheduler
     """
-    # Fetch feed data
-    feed = fetch_gtfs_rt(url)
-    if not feed:
-        print(f"Failed to fetch data from {url}")
-        return
-    
-    _, all_data = extract_ids_and_trip_updates(feed)
-    print(f'Fetched {len(all_data)} items from {kafka_topic}')
-    
-    # Filter out already sent data
-    filtered_data = []
-    for item in all_data:
-        if not is_already_sent(redis_engine, redis_type, item['id'], 10800):
-            filtered_data.append(item)
-    
-    print(f'After filtering: {len(filtered_data)} new items for {kafka_topic}')
+    # Fetch feed data (skip the whole cycle when the feed did not change)
+    feed_state = FEED_STATES.setdefault(url, {})
+    feed = fetch_gtfs_rt(url, get_http_session(), feed_state)
+    if feed is None:
+        if feed_state.get('status') != 'unchanged':
+            logger.warning(f"Failed to fetch data from {url}")
+        return feed_state
     
-    # Send to Kafka
-    send_to_kafka(brokers = kafka_brokers, topic = kafka_topic, data = filtered_data)
-
-
-def main(redis_engine: RedisEngine, kafka_brokers: List[str]):
-    """
-    Main function to extract GTFS data from SNCF API and send them to Kafka
-    """
-    # Parallel processing of TU and SA feeds
-    with concurrent.futures.ThreadPoolExecutor(max_workers = 2) as executor:
-        tu_future = executor.submit(
-            process_feed_data,
-            GTFS_RT_TU_URL,
-            "trip_update", 
-            'gtfs-rt-tu',
-            redis_engine,
-            kafka_brokers
-        )
-        
-        sa_future = executor.submit(
-            process_feed_data,
-            GTFS_RT_SA_URL,
-            "service_alert",
-            'gtfs-rt-sa', 
-            redis_engine,
-            kafka_brokers
-        )
-        
-        # Wait for both tasks to complete
-        concurrent.futures.wait([tu_future, sa_future])
-        
-        try:
-            tu_future.result()
-        except Exception as e:
-            print(f"Error processing trip updates: {e}")
-            
-        try:
-            sa_future.result()
-        except Exception as e:
-            print(f"Error processing service alerts: {e}")
+    fetched_count = 0
+    new_count = 0
+    for chunk in iter_chunks(iter_entities(feed, kafka_engine.wire_format), chunk_size):
+        fetched_count += len(chunk)
+        # Filter out already sent data
+        if dedup_mode == 'fingerprint':
+            filtered_data = filter_unchanged(redis_engine, redis_type, chunk)
+        else:
+            filtered_data = filter_already_sent(redis_engine, redis_type, chunk, 10800)
+        new_count += len(filtered_data)
+        ENTITIES.labels(kafka_topic, 'fetched').inc(len(chunk))
+        ENTITIES.labels(kafka_topic, 'filtered').inc(len(chunk) - len(filtered_data))
+        # Send to Kafka
+        if filtered_data:
+            send_to_kafka(kafka_engine = kafka_engine, topic = kafka_topic, data = filtered_data, key_strategy = key_strategy)
+    del feed
+
+    if dedup_mode == 'fingerprint':
+        prune_fingerprints(redis_engine, redis_type, 10800)
+    logger.info(f'Fetched {fetched_count} items from {kafka_topic}, {new_count} new items sent')
+    return feed_state
+
+
+def wait_until_ready(redis_engine: RedisEngine, kafka_engine: KafkaEngine, topics: list[str], timeout: float = 300, interval: float = 5) -> bool:
+    """
+    Wait until Redis answers a ping and Kafka metadata can be fetched for all topics
+    """
+    deadline = time.time() + timeout
+    while True:
+        redis_ready = bool(redis_engine.ping())
+        kafka_ready = kafka_engine.is_ready(topics)
+        if redis_ready and kafka_ready:
+            logger.info("Redis and Kafka are ready")
+            return True
+        if time.time() >= deadline:
+            logger.warning(f"Services not ready after {timeout}s (redis={redis_ready}, kafka={kafka_ready}), starting anyway")
+            return False
+        time.sleep(interval)
+
+
+def main(redis_engine: RedisEngine, kafka_engine: KafkaEngine, feeds: list[dict], dedup_mode: str = 'id', polling: dict | None = None, chunk_size: int = 1000, stop_event = None):
+    """
+    Main function to extract GTFS data from SNCF API and send them to Kafka.
+    Each feed is polled on its own adaptive cadence until stop_event is set.
+    """
+    def poll(feed: dict):
+        feed_state = process_feed_data(feed['url'], feed['redis_type'], feed['topic'], redis_engine, kafka_engine, dedup_mode, chunk_size, feed['key'])
+        stats = kafka_engine.pop_stats()
+        logger.info(f"Kafka deliveries since last poll: {stats['delivered']} delivered, {stats['failed']} failed")
+        if redis_engine.local_cache is not None:
+            cache_stats = redis_engine.local_cache.pop_stats()
+            logger.info(f"Local dedup cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['size']} entries")
+        return feed_state
+
+    scheduler = PollScheduler({feed['name']: functools.partial(poll, feed) for feed in feeds}, **(polling or {}))
+    scheduler.run(stop_event)
+
+
+def shutdown(signum, frame):
+    """
+    Turn SIGTERM into SystemExit so the Kafka producer is flushed and closed
+    """
+    raise SystemExit(0)
 
 
 if __name__ == "__main__":
     # Fetch data sources URL
     with open(DATA_SOURCES_FILEPATH, 'r') as f:
         data_sources = json.load(f)
-    GTFS_RT_TU_URL = data_sources['gtfs_rt_tu_url']
-    GTFS_RT_SA_URL = data_sources['gtfs_rt_sa_url']
+    FEEDS = load_feeds(data_sources)
     REDIS_HOST = data_sources['redis_host']
     REDIS_PORT = data_sources['redis_port']
     KAFKA_BROKERS = data_sources['kafka_brokers']
+    DEDUP_MODE = data_sources.get('dedup_mode', 'id')
+    KAFKA_PRODUCER_CONFIG = data_sources.get('kafka_producer', {})
+    POLLING_CONFIG = data_sources.get('polling', {})
+    CHUNK_SIZE = data_sources.get('chunk_size', 1000)
+    RUNTIME = data_sources.get('runtime', 'threaded')
+    LOCAL_CACHE_CONFIG = data_sources.get('local_cache', {})
+    LOG_LEVEL = data_sources.get('log_level', 'INFO')
+    METRICS_PORT = data_sources.get('metrics', {}).get('producer_port')
     del data_sources
 
-    # Wait to let Kafka & Redis to be ready in case of restart
-    time.sleep(180)
+    configure_logging(LOG_LEVEL)
+    start_metrics_server(METRICS_PORT)
 
-    # Redis engine 
-    redis_engine = RedisEngine(host = REDIS_HOST, port = REDIS_PORT)
+    STARTUP_TIMEOUT = POLLING_CONFIG.pop('startup_timeout', 300)
 
-    # Start extraction loop
-    while True:
-        main(redis_engine, KAFKA_BROKERS)
-        # Wait
-        time.sleep(300)
\ No newline at end of file
+    # asyncio runtime: all feeds on one event loop
+    if RUNTIME == 'asyncio':
+        import asyncio
+
+        from producer_async import run_async
+        asyncio.run(run_async(REDIS_HOST, REDIS_PORT, KAFKA_BROKERS, KAFKA_PRODUCER_CONFIG, FEEDS,
+                              DEDUP_MODE, POLLING_CONFIG, CHUNK_SIZE, STARTUP_TIMEOUT, LOCAL_CACHE_CONFIG))
+    else:
+        # Redis engine, behind a local dedup cache unless "local_cache" is null
+        local_cache = LRUCache(**{**LOCAL_CACHE_DEFAULTS, **LOCAL_CACHE_CONFIG}) if LOCAL_CACHE_CONFIG is not None else None
+        redis_engine = RedisEngine(host = REDIS_HOST, port = REDIS_PORT, local_cache = local_cache)
+
+        # Kafka engine (one producer for the whole process lifetime)
+        kafka_engine = KafkaEngine(KAFKA_BROKERS, **KAFKA_PRODUCER_CONFIG)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        # Start extraction loop once Kafka & Redis are ready (in case of restart)
+        try:
+            wait_until_ready(redis_engine, kafka_engine, sorted({feed['topic'] for feed in FEEDS}), timeout = STARTUP_TIMEOUT)
+            main(redis_engine, kafka_engine, FEEDS, DEDUP_MODE, POLLING_CONFIG, CHUNK_SIZE)
+        finally:
+            kafka_engine.close()
@@ -0,0 +1,199 @@
+# src/producer/producer_async.py
+"""
+asyncio runtime of the producer: all configured feeds are polled concurrently on one event loop
+(aiohttp, redis.asyncio and aiokafka), sharing one Redis client and one Kafka producer
+"""
+import asyncio
+import functools
+import logging
+import signal
+import time
+
+import aiohttp
+from AsyncKafkaEngine import AsyncKafkaEngine
+from AsyncRedisEngine import AsyncRedisEngine
+from LRUCache import LRUCache
+from PollScheduler import PollScheduler
+from producer_metrics import ENTITIES, FETCH_SECONDS
+from RedisEngine import LOCAL_CACHE_DEFAULTS
+
+from producer import (
+    FEED_STATES,
+    conditional_headers,
+    entity_fingerprint,
+    iter_chunks,
+    iter_entities,
+    parse_feed_content,
+    record_key,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def fetch_gtfs_rt_async(session: aiohttp.ClientSession, url: str, feed_state: dict):
+    """
+    Conditional GET of a GTFS-RT feed, see producer.fetch_gtfs_rt.
+    The protobuf is parsed in a worker thread to keep the event loop responsive.
+    """
+    try:
+        start = time.perf_counter()
+        async with session.get(url, headers = conditional_headers(feed_state), timeout = aiohttp.ClientTimeout(total = 10)) as response:
+            if response.status == 304:
+                logger.debug(f"Feed not modified (304): {url}")
+                feed_state['status'] = 'unchanged'
+                return None
+            response.raise_for_status()
+            content = await response.read()
+            headers = response.headers
+        FETCH_SECONDS.labels(url).observe(time.perf_counter() - start)
+        return await asyncio.to_thread(parse_feed_content, url, content, headers, feed_state)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception(f"Error fetching {url}")
+        feed_state['status'] = 'error'
+        return None
+
+
+async def filter_already_sent_async(redis_engine: AsyncRedisEngine, type: str, data: list[dict], delay: int = 10800) -> list[dict]:
+    """
+    Keep only the items not sent to Kafka during the last {delay} seconds, see producer.filter_already_sent
+    """
+    if not data:
+        return []
+    claimed = await redis_engine.claim_many([f"{type}_{item['id']}" for item in data], delay)
+    return [item for item, is_new in zip(data, claimed) if is_new]
+
+
+async def filter_unchanged_async(redis_engine: AsyncRedisEngine, type: str, data: list[dict]) -> list[dict]:
+    """
+    Keep only the items whose content changed since they were last sent to Kafka, see producer.filter_unchanged
+    """
+    if not data:
+        return []
+    fingerprints = [(item['id'], entity_fingerprint(item)) for item in data]
+    changed = await redis_engine.claim_changed(f"fingerprints_{type}", fingerprints)
+    return [item for item, is_changed in zip(data, changed) if is_changed]
+
+
+async def process_feed_data_async(feed: dict, session: aiohttp.ClientSession, redis_engine: AsyncRedisEngine, kafka_engine: AsyncKafkaEngine, dedup_mode: str = 'id', chunk_size: int = 1000) -> dict:
+    """
+    Process one GTFS-RT feed, see producer.process_feed_data.
+    The event loop is released between chunks (Redis and Kafka awaits).
+    """
+    feed_state = FEED_STATES.setdefault(feed['url'], {})
+    message = await fetch_gtfs_rt_async(session, feed['url'], feed_state)
+    if message is None:
+        if feed_state.get('status') != 'unchanged':
+            logger.warning(f"Failed to fetch data from {feed['url']}")
+        return feed_state
+
+    key = functools.partial(record_key, strategy = feed['key']) if feed.get('key') else None
+    fetched_count = 0
+    new_count = 0
+    for chunk in iter_chunks(iter_entities(message, kafka_engine.wire_format), chunk_size):
+        fetched_count += len(chunk)
+        if dedup_mode == 'fingerprint':
+            filtered_data = await filter_unchanged_async(redis_engine, feed['redis_type'], chunk)
+        else:
+            filtered_data = await filter_already_sent_async(redis_engine, feed['redis_type'], chunk, 10800)
+        new_count += len(filtered_data)
+        ENTITIES.labels(feed['topic'], 'fetched').inc(len(chunk))
+        ENTITIES.labels(feed['topic'], 'filtered').inc(len(chunk) - len(filtered_data))
+        if filtered_data:
+            queued_count = await kafka_engine.send(feed['topic'], filtered_data, key)
+            ENTITIES.labels(feed['topic'], 'published').inc(queued_count)
+    del message
+
+    if dedup_mode == 'fingerprint':
+        await redis_engine.prune_fingerprints(f"fingerprints_{feed['redis_type']}", 10800)
+    logger.info(f"Fetched {fetched_count} items from {feed['topic']}, {new_count} new items sent")
+    return feed_state
+
+
+async def poll_feed(feed: dict, scheduler: PollScheduler, stop_event: asyncio.Event, **process_kwargs) -> None:
+    """
+    Poll one feed on its adaptive cadence until stop_event is set
+    """
+    name = feed['name']
+    while not stop_event.is_set():
+        try:
+            feed_state = await process_feed_data_async(feed, **process_kwargs)
+            status = feed_state.get('status', 'error')
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Error polling feed {name}")
+            feed_state, status = {}, 'error'
+        delay = scheduler.update(name, status, feed_state.get('timestamp'))
+        logger.info(f"Feed {name}: {status}, next poll in {delay:.0f}s")
+        local_cache = process_kwargs['redis_engine'].local_cache
+        if local_cache is not None:
+            cache_stats = local_cache.pop_stats()
+            logger.info(f"Local dedup cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['size']} entries")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout = delay)
+        except TimeoutError:
+            pass
+
+
+async def wait_until_ready_async(redis_engine: AsyncRedisEngine, kafka_engine: AsyncKafkaEngine, topics: list[str], timeout: float = 300, interval: float = 5) -> bool:
+    """
+    Wait until Redis answers a ping and Kafka metadata can be fetched for all topics
+    """
+    deadline = time.time() + timeout
+    while True:
+        redis_ready, kafka_ready = await asyncio.gather(redis_engine.ping(), kafka_engine.is_ready(topics))
+        if redis_ready and kafka_ready:
+            logger.info("Redis and Kafka are ready")
+            return True
+        if time.time() >= deadline:
+            logger.warning(f"Services not ready after {timeout}s (redis={redis_ready}, kafka={kafka_ready}), starting anyway")
+            return False
+        await asyncio.sleep(interval)
+
+
+async def main_async(redis_engine: AsyncRedisEngine, kafka_engine: AsyncKafkaEngine, feeds: list[dict], dedup_mode: str = 'id', polling: dict | None = None,
+                     chunk_size: int = 1000, stop_event: asyncio.Event | None = None, shutdown_timeout: float = 30) -> None:
+    """
+    Run one polling task per feed on the current event loop until stop_event is set (SIGTERM / SIGINT).
+    Running polls get {shutdown_timeout} seconds to finish before being cancelled.
+    """
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    scheduler = PollScheduler({feed['name']: None for feed in feeds}, **(polling or {}))
+    connector = aiohttp.TCPConnector(limit_per_host = 4, keepalive_timeout = 600)
+    async with aiohttp.ClientSession(connector = connector, auto_decompress = True) as session:
+        tasks = [asyncio.create_task(poll_feed(feed, scheduler, stop_event, session = session, redis_engine = redis_engine,
+                                               kafka_engine = kafka_engine, dedup_mode = dedup_mode, chunk_size = chunk_size),
+                                     name = feed['name'])
+                 for feed in feeds]
+        await stop_event.wait()
+        logger.info("Shutting down feed tasks")
+        _, pending = await asyncio.wait(tasks, timeout = shutdown_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions = True)
+
+
+async def run_async(redis_host: str, redis_port: int, kafka_brokers: list[str], kafka_producer_config: dict, feeds: list[dict],
+                    dedup_mode: str = 'id', polling: dict | None = None, chunk_size: int = 1000, startup_timeout: float = 300,
+                    local_cache_config: dict | None = None) -> None:
+    """
+    Entry point of the asyncio runtime (engines lifecycle)
+    """
+    local_cache = LRUCache(**{**LOCAL_CACHE_DEFAULTS, **local_cache_config}) if local_cache_config is not None else None
+    redis_engine = AsyncRedisEngine(host = redis_host, port = redis_port, local_cache = local_cache)
+    kafka_engine = AsyncKafkaEngine(kafka_brokers, **kafka_producer_config)
+    try:
+        await wait_until_ready_async(redis_engine, kafka_engine, sorted({feed['topic'] for feed in feeds}), timeout = startup_timeout)
+        await main_async(redis_engine, kafka_engine, feeds, dedup_mode, polling, chunk_size)
+    finally:
+        await kafka_engine.close()
+        await redis_engine.close()
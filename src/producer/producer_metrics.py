@@ -0,0 +1,19 @@
+# src/producer/producer_metrics.py
+"""
+Producer metrics (Prometheus text format, served on a local port by common_metrics.start_metrics_server)
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets (seconds) of the network calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FETCH_SECONDS = Histogram('gtfs_producer_fetch_seconds', 'Feed HTTP fetch latency', ['url'], buckets = LATENCY_BUCKETS)
+PARSE_SECONDS = Histogram('gtfs_producer_parse_seconds', 'Feed protobuf parse time', ['url'], buckets = LATENCY_BUCKETS)
+ENTITIES = Counter('gtfs_producer_entities', 'Feed entities by stage (fetched, filtered by dedup, published)', ['topic', 'stage'])
+REDIS_ROUND_TRIPS = Counter('gtfs_producer_redis_round_trips', 'Redis round trips by operation', ['operation'])
+KAFKA_SEND_SECONDS = Histogram('gtfs_producer_kafka_send_seconds', 'Kafka send latency, from send to broker acknowledgement', ['topic'], buckets = LATENCY_BUCKETS)
+KAFKA_DELIVERIES = Counter('gtfs_producer_kafka_deliveries', 'Kafka deliveries by result', ['topic', 'result'])
+FEED_POLLS = Counter('gtfs_producer_feed_polls', 'Feed polls by outcome (changed, unchanged, error)', ['feed', 'status'])
+FEED_LAG = Gauge('gtfs_producer_feed_lag_seconds', 'Age of the last feed snapshot (feed header timestamp) at the last poll', ['feed'])
+FEED_NEXT_POLL = Gauge('gtfs_producer_feed_next_poll_seconds', 'Delay until the next poll of the feed, set at each poll', ['feed'])
+
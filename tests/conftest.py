@@ -1,6 +1,18 @@
 import sys
 import os
 
+from google.transit import gtfs_realtime_pb2
+
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
-    sys.path.insert(0, project_root) 
\ No newline at end of file
+    sys.path.insert(0, project_root)
+
+
+def make_feed_bytes(timestamp, trip_ids):
+    """Serialized GTFS-RT feed with one bare trip update per trip id"""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = timestamp
+    for trip_id in trip_ids:
+        feed.entity.add(id=trip_id).trip_update.trip.trip_id = trip_id
+    return feed.SerializeToString()
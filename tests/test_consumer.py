@@ -1,11 +1,21 @@
+import contextlib
+import io
+import json
+import logging
+import msgpack
 import pytest
+from hypothesis import given, settings, strategies as st
 from unittest.mock import MagicMock, patch
 import sys
 import os
 
-# Ensure src/consumer is in path
+# Ensure src/consumer and src/producer are in path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/consumer')))
-from consumer import GTFSConsumer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/producer')))
+from consumer import GTFSConsumer, run_workers, STOP_TIME_UPDATE_COLUMNS, TRIP_UPDATE_COLUMNS
+from google.protobuf.json_format import MessageToDict
+from google.transit import gtfs_realtime_pb2
+from src.producer.producer import project_alert, project_trip_update
 
 # Patch KafkaConsumer and KafkaAdminClient for all tests
 def pytest_configure():
@@ -36,6 +46,34 @@ def var_dict():
         'POSTGRES_PASSWORD': 'pass'
     }
 
+def make_consumer(var_dict, **config):
+    """Consumer built from {var_dict} updated with the {config} entries"""
+    var_dict.update(config)
+    return GTFSConsumer(var_dict)
+
+def record_batches(consumer):
+    """Replace ingest_batch with a recorder of the (trip update ids, service alert ids) of each batch"""
+    batches = []
+    consumer.ingest_batch = lambda tu_data, sa_data: batches.append(([m['id'] for m in tu_data], [m['id'] for m in sa_data]))
+    return batches
+
+def encode_message(message_id):
+    return json.dumps({'id': message_id}).encode()
+
+@pytest.fixture
+def make_state_consumer(var_dict):
+    """Consumer over a mocked connection pool, configured with {config_key}: {config}, recording the rows written"""
+    def make(config_key, **config):
+        consumer = make_consumer(var_dict, **{config_key: config})
+        engine = MagicMock()
+        consumer.db_engine = MagicMock()
+        consumer.db_engine.borrow.return_value.__enter__.return_value = engine
+        written = []
+        consumer.ingest_rows = lambda engine, table, columns, rows: written.append((table, [(row[0].timestamp(), row[3]) for row in rows]))
+        consumer.ingest_data = lambda engine, table, data: written.append((table, [tuple(row.values())[:2] for row in data]))
+        return consumer, engine, written
+    return make
+
 def test_unix_to_datetime_valid(var_dict):
     consumer = GTFSConsumer(var_dict)
     dt = consumer.unix_to_datetime(1609459200)  # 2021-01-01 00:00:00 UTC
@@ -90,6 +128,37 @@ def test_ingest_data_with_data(var_dict):
     assert args[0] == 'INSERT INTO table (a, b) VALUES (%s, %s)'
     assert args[1] == [(1, 2), (3, 4)]
 
+def test_ingest_data_conflict_target(var_dict):
+    consumer = GTFSConsumer(var_dict)
+    engine = MagicMock()
+    consumer.ingest_data(engine, 'alert_entities', [{'alert_id': 'a1', 'trip_id': 't1'}])
+    query = ' '.join(engine.execute_batch_query.call_args.args[0].split())
+    assert 'ON CONFLICT (alert_id, trip_id) DO UPDATE' in query
+
+def test_ingest_data_copy_strategy(var_dict):
+    var_dict['INGEST_STRATEGY'] = 'copy'
+    consumer = GTFSConsumer(var_dict)
+    engine = MagicMock()
+    data = [{'alert_id': 'a1', 'trip_id': 't1'}, {'alert_id': 'a1', 'trip_id': 't2'}]
+    consumer.ingest_data(engine, 'alert_entities', data)
+    engine.execute_batch_query.assert_not_called()
+    table_name, columns, rows, conflict_columns = engine.execute_copy_merge.call_args.args
+    assert (table_name, columns, conflict_columns) == ('alert_entities', ['alert_id', 'trip_id'], ['alert_id', 'trip_id'])
+    assert list(rows) == [('a1', 't1'), ('a1', 't2')]
+
+def test_ingest_data_copy_strategy_unknown_table_falls_back(var_dict):
+    var_dict['INGEST_STRATEGY'] = 'copy'
+    consumer = GTFSConsumer(var_dict)
+    engine = MagicMock()
+    consumer.ingest_data(engine, 'table', [{'a': 1}])
+    engine.execute_copy_merge.assert_not_called()
+    engine.execute_batch_query.assert_called_once()
+
+def test_unknown_ingest_strategy(var_dict):
+    var_dict['INGEST_STRATEGY'] = 'bulk'
+    with pytest.raises(ValueError):
+        GTFSConsumer(var_dict)
+
 def test_get_consumer_creates_kafka_consumer(var_dict):
     consumer = GTFSConsumer(var_dict)
     with patch('consumer.KafkaConsumer') as mock_kafka:
@@ -98,13 +167,32 @@ def test_get_consumer_creates_kafka_consumer(var_dict):
         assert mock_kafka.called
         assert c == mock_kafka.return_value
 
+def test_consumer_subscribes_to_configured_topics(var_dict):
+    var_dict['TU_TOPICS'] = ['op1-tu', 'op2-tu']
+    with patch('consumer.KafkaConsumer') as mock_kafka:
+        consumer = GTFSConsumer(var_dict)
+    assert mock_kafka.call_args_list[0].args == ('op1-tu', 'op2-tu')
+    assert mock_kafka.call_args_list[1].args == ('gtfs-rt-sa',)
+    assert consumer.sa_topics == ['gtfs-rt-sa']
+
 def test_consume_messages_returns_data(var_dict):
     consumer = GTFSConsumer(var_dict)
     fake_consumer = MagicMock()
-    fake_consumer.poll.return_value = {('topic', 0): [MagicMock(value={'foo': 'bar'})]}
+    fake_consumer.poll.return_value = {('topic', 0): [MagicMock(value=b'{"foo": "bar"}', headers=[])]}
     result = consumer.consume_messages(fake_consumer)
     assert result == [{'foo': 'bar'}]
 
+def test_consume_messages_decodes_msgpack(var_dict):
+    consumer = GTFSConsumer(var_dict)
+    fake_consumer = MagicMock()
+    fake_consumer.poll.return_value = {('topic', 0): [
+        MagicMock(value=msgpack.packb({'foo': 'bar'}), headers=[('format', b'msgpack')]),
+        MagicMock(value=b'{"foo": "baz"}', headers=[('format', b'json')]),
+        MagicMock(value=b'not json', headers=[], offset=3)
+    ]}
+    result = consumer.consume_messages(fake_consumer)
+    assert result == [{'foo': 'bar'}, {'foo': 'baz'}]
+
 def test_close_consumer_calls_close(var_dict):
     consumer = GTFSConsumer(var_dict)
     fake_consumer = MagicMock()
@@ -116,4 +204,526 @@ def test_set_topic_config_calls_admin_client(var_dict):
     with patch('consumer.KafkaAdminClient') as mock_admin:
         mock_admin.return_value = MagicMock()
         consumer.set_topic_config('topic', {'retention.ms': '1000'})
-        assert mock_admin.called 
\ No newline at end of file
+        assert mock_admin.called 
+
+def make_stream_consumer(var_dict, polls, **stream_config):
+    from kafka.structs import TopicPartition
+    consumer = make_consumer(var_dict, CONSUMER_MODE='stream', STREAM={'lag_interval': 3600, **stream_config})
+    consumer.stream_consumer.poll.side_effect = [
+        {TopicPartition(topic, 0): [MagicMock(value=encode_message(value), headers=[]) for value in values]
+         for topic, values in poll.items()}
+        for poll in polls
+    ] + [KeyboardInterrupt()]
+    return consumer, record_batches(consumer)
+
+def test_stream_flushes_on_record_count(var_dict):
+    consumer, batches = make_stream_consumer(var_dict, [
+        {'gtfs-rt-tu': ['t1', 't2']},
+        {'gtfs-rt-tu': ['t3'], 'gtfs-rt-sa': ['a1']},
+        {},
+        {'gtfs-rt-sa': ['a2']}
+    ], flush_records=3, flush_interval=3600)
+    consumer.stream()
+    # Threshold reached on the second poll, the remaining buffer is flushed on shutdown
+    assert batches == [(['t1', 't2', 't3'], ['a1']), ([], ['a2'])]
+    consumer.stream_consumer.close.assert_called_once()
+
+def test_stream_flushes_on_latency(var_dict):
+    consumer, batches = make_stream_consumer(var_dict, [{'gtfs-rt-tu': ['t1']}, {}, {'gtfs-rt-sa': ['a1']}],
+                                             flush_records=1000, flush_interval=0)
+    consumer.stream()
+    assert batches == [(['t1'], []), ([], ['a1'])]
+
+def test_offsets_committed_after_ingestion(var_dict):
+    consumer, batches = make_stream_consumer(var_dict, [{'gtfs-rt-tu': ['t1']}], flush_interval=0)
+    kafka_consumer = consumer.stream_consumer
+    kafka_consumer.commit.side_effect = lambda: batches.append('commit')
+    consumer.stream()
+    assert batches == [(['t1'], []), 'commit']
+
+def test_auto_commit_disabled(var_dict):
+    consumer = GTFSConsumer(var_dict)
+    with patch('consumer.KafkaConsumer') as mock_kafka:
+        consumer.get_consumer('topic', 'group')
+    assert mock_kafka.call_args.kwargs['enable_auto_commit'] is False
+
+def make_failing_consumer(var_dict, failures, **delivery):
+    consumer = make_consumer(var_dict, DELIVERY={'max_retries': 2, 'retry_backoff': 0, **delivery})
+    calls = []
+    def ingest_batch(tu_data, sa_data):
+        calls.append(tu_data)
+        if len(calls) <= failures:
+            raise RuntimeError('database down')
+    consumer.ingest_batch = ingest_batch
+    return consumer, calls
+
+def test_commit_batch_retries_then_commits(var_dict):
+    consumer, calls = make_failing_consumer(var_dict, failures=2)
+    kafka_consumer = MagicMock()
+    assert consumer.commit_batch([kafka_consumer], [{'id': 't1'}], []) is True
+    assert len(calls) == 3
+    kafka_consumer.commit.assert_called_once()
+
+def test_commit_batch_dead_letter(var_dict):
+    consumer, calls = make_failing_consumer(var_dict, failures=10, dead_letter_topic='dlq')
+    kafka_consumer = MagicMock()
+    with patch('consumer.KafkaProducer') as mock_producer:
+        assert consumer.commit_batch([kafka_consumer], [{'id': 't1'}], [{'id': 'a1'}]) is False
+    producer = mock_producer.return_value
+    assert [call.args for call in producer.send.call_args_list] == [('dlq', {'id': 't1'}), ('dlq', {'id': 'a1'})]
+    assert dict(producer.send.call_args_list[0].kwargs['headers'])['kind'] == b'trip_update'
+    assert len(calls) == 3
+    kafka_consumer.commit.assert_called_once()
+    producer.send.return_value.get.assert_called_with(timeout=30.0)
+
+def test_commit_batch_rewinds_on_dead_letter_failure(var_dict):
+    from kafka.errors import KafkaTimeoutError
+    from kafka.structs import TopicPartition
+    consumer, _calls = make_failing_consumer(var_dict, failures=10, dead_letter_topic='dlq')
+    kafka_consumer = MagicMock()
+    tp0 = TopicPartition('gtfs-rt-tu', 0)
+    kafka_consumer.assignment.return_value = [tp0]
+    kafka_consumer.committed.return_value = 42
+    with patch('consumer.KafkaProducer') as mock_producer:
+        # flush() returns normally, the failed record only shows in its future
+        mock_producer.return_value.send.return_value.get.side_effect = KafkaTimeoutError("record expired")
+        assert consumer.commit_batch([kafka_consumer], [{'id': 't1'}], []) is False
+    mock_producer.return_value.flush.assert_called_once()
+    kafka_consumer.commit.assert_not_called()
+    kafka_consumer.seek.assert_called_once_with(tp0, 42)
+
+def test_commit_batch_rewinds_without_dead_letter(var_dict):
+    from kafka.structs import TopicPartition
+    consumer, _calls = make_failing_consumer(var_dict, failures=10)
+    kafka_consumer = MagicMock()
+    tp0, tp1 = TopicPartition('gtfs-rt-tu', 0), TopicPartition('gtfs-rt-tu', 1)
+    kafka_consumer.assignment.return_value = [tp0, tp1]
+    kafka_consumer.committed.side_effect = lambda tp: {tp0: 42, tp1: None}[tp]
+    assert consumer.commit_batch([kafka_consumer], [{'id': 't1'}], []) is False
+    kafka_consumer.commit.assert_not_called()
+    kafka_consumer.seek.assert_called_once_with(tp0, 42)
+    kafka_consumer.seek_to_beginning.assert_called_once_with(tp1)
+
+def test_rebalance_flushes_before_revoke(var_dict):
+    from kafka.structs import TopicPartition
+    consumer, batches = make_stream_consumer(var_dict, [])
+    kafka_consumer = consumer.stream_consumer
+    listener = kafka_consumer.subscribe.call_args.kwargs['listener']
+    assert kafka_consumer.subscribe.call_args.args[0] == ['gtfs-rt-tu', 'gtfs-rt-sa']
+    consumer.tu_buffer = [{'id': 't1'}]
+    listener.on_partitions_revoked({TopicPartition('gtfs-rt-tu', 0)})
+    assert batches == [(['t1'], [])]
+    kafka_consumer.commit.assert_called_once()
+    assert consumer.tu_buffer == [] and consumer.first_buffered_at is None
+
+def test_run_workers_caps_db_connections(var_dict):
+    var_dict['POSTGRES_POOL'] = {'min_size': 2, 'max_size': 6}
+    with patch('consumer.multiprocessing.get_context') as get_context:
+        run_workers(var_dict, 3)
+    process_cls = get_context.return_value.Process
+    assert process_cls.call_count == 3
+    worker_var_dict, index = process_cls.call_args_list[2].kwargs['args']
+    assert index == 2
+    assert worker_var_dict['CONSUMER_MODE'] == 'stream'
+    assert worker_var_dict['POSTGRES_POOL'] == {'min_size': 2, 'max_size': 2}
+    assert process_cls.return_value.start.call_count == 3
+    assert var_dict['POSTGRES_POOL']['max_size'] == 6
+
+def test_get_lag_per_partition(var_dict):
+    from kafka.structs import TopicPartition
+    consumer = GTFSConsumer(var_dict)
+    kafka_consumer = MagicMock()
+    tp0, tp1 = TopicPartition('gtfs-rt-tu', 0), TopicPartition('gtfs-rt-tu', 1)
+    kafka_consumer.assignment.return_value = {tp0, tp1}
+    kafka_consumer.end_offsets.return_value = {tp0: 10, tp1: 5}
+    kafka_consumer.position.side_effect = lambda tp: {tp0: 4, tp1: 5}[tp]
+    assert consumer.get_lag(kafka_consumer) == {('gtfs-rt-tu', 0): 6, ('gtfs-rt-tu', 1): 0}
+
+def make_feed_entities():
+    feed = gtfs_realtime_pb2.FeedMessage()
+    tu = feed.entity.add(id='trip_1').trip_update
+    tu.trip.trip_id = 'trip_1'
+    tu.trip.start_time = '08:00:00'
+    tu.trip.start_date = '20250701'
+    tu.timestamp = 1751356800
+    stu = tu.stop_time_update.add(stop_id='StopPoint:A')
+    stu.departure.time = 1751356900
+    stu.departure.delay = 120
+    stu = tu.stop_time_update.add(stop_id='StopPoint:B')
+    stu.arrival.time = 1751360000
+    stu = tu.stop_time_update.add()
+    alert = feed.entity.add(id='alert_1').alert
+    period = alert.active_period.add()
+    period.start = 1751356800
+    alert.informed_entity.add().trip.trip_id = 'trip_1'
+    alert.informed_entity.add(route_id='route_1')
+    alert.cause = gtfs_realtime_pb2.Alert.TECHNICAL_PROBLEM
+    alert.header_text.translation.add(text='Retard', language='fr')
+    alert.description_text.translation.add(text='Delay', language='en')
+    return feed.entity
+
+def test_msgpack_projection_matches_message_to_dict(var_dict):
+    consumer = GTFSConsumer(var_dict)
+    tu_entity, sa_entity = make_feed_entities()
+    projected_tu = msgpack.unpackb(msgpack.packb({'id': tu_entity.id, 'trip_update': project_trip_update(tu_entity.trip_update)}))
+    projected_sa = msgpack.unpackb(msgpack.packb({'id': sa_entity.id, 'alert': project_alert(sa_entity.alert)}))
+    full_tu = {'id': tu_entity.id, 'trip_update': MessageToDict(tu_entity.trip_update)}
+    full_sa = {'id': sa_entity.id, 'alert': MessageToDict(sa_entity.alert)}
+    assert consumer.decompose_tu_data([projected_tu]) == consumer.decompose_tu_data([full_tu])
+    assert consumer.decompose_sa_data([projected_sa]) == consumer.decompose_sa_data([full_sa])
+
+
+# --- decompose_tu_rows equivalence ---
+
+epochs = st.one_of(st.none(), st.integers(0, 4_000_000_000), st.integers(0, 4_000_000_000).map(str),
+                   st.sampled_from(['', 'abc', '12:00:00']), st.sampled_from([1751356800, '1751356800', 1751357400]))
+events = st.fixed_dictionaries({}, optional={'time': epochs, 'delay': st.one_of(st.none(), st.integers(-3600, 3600))})
+stop_time_updates = st.fixed_dictionaries({}, optional={
+    'stopId': st.one_of(st.none(), st.just(''), st.text(min_size=1, max_size=5)),
+    'arrival': events,
+    'departure': events
+})
+trips = st.fixed_dictionaries({}, optional={
+    'startTime': st.one_of(st.just('08:00:00'), st.integers(0, 10**9)),
+    'startDate': st.sampled_from(['20250701', '2025-07-01', None])
+})
+trip_update_messages = st.fixed_dictionaries({'id': st.text(min_size=1, max_size=8)}, optional={
+    'trip_update': st.fixed_dictionaries({}, optional={
+        'trip': trips,
+        'timestamp': epochs,
+        'stopTimeUpdate': st.lists(stop_time_updates, max_size=6)
+    })
+})
+
+@contextlib.contextmanager
+def capture_logs(name='consumer'):
+    """Collect the messages logged by {name} (usable inside hypothesis tests, unlike caplog)"""
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    logger = logging.getLogger(name)
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    try:
+        yield messages
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+@settings(max_examples=300, deadline=None)
+@given(st.lists(trip_update_messages, max_size=8))
+def test_decompose_tu_rows_matches_decompose_tu_data(tu_data):
+    consumer = GTFSConsumer.__new__(GTFSConsumer)
+    with capture_logs() as expected_log:
+        trip_updates, stop_time_updates = consumer.decompose_tu_data(tu_data)
+    with capture_logs() as log:
+        trip_update_rows, stop_time_update_rows = consumer.decompose_tu_rows(tu_data)
+
+    assert trip_update_rows == [tuple(row.values()) for row in trip_updates]
+    assert stop_time_update_rows == [tuple(row.values()) for row in stop_time_updates]
+    assert all(list(row.keys()) == TRIP_UPDATE_COLUMNS for row in trip_updates)
+    assert all(list(row.keys()) == STOP_TIME_UPDATE_COLUMNS for row in stop_time_updates)
+    assert log == expected_log
+
+
+# --- Delta ingestion of stop time updates ---
+
+def make_tu_message(timestamp, delay):
+    return {'id': 'trip_1', 'trip_update': {
+        'trip': {'startTime': '08:00:00', 'startDate': '20250701'},
+        'timestamp': timestamp,
+        'stopTimeUpdate': [
+            {'stopId': 'StopPoint:A', 'departure': {'time': 1751356900 + delay, 'delay': delay}},
+            {'stopId': 'StopPoint:B', 'arrival': {'time': 1751360000, 'delay': 0}, 'departure': {'time': 1751360060, 'delay': 0}}
+        ]
+    }}
+
+def test_delta_ingestion_disabled_by_default(var_dict):
+    assert GTFSConsumer(var_dict).stop_time_state is None
+
+def test_delta_ingestion_writes_changed_stops_only(make_state_consumer):
+    consumer, _engine, written = make_state_consumer('DELTA', enabled=True)
+    consumer.ingest_batch([make_tu_message(1751356800, 60)], [])
+    consumer.ingest_batch([make_tu_message(1751356830, 60), make_tu_message(1751356860, 120)], [])
+    assert written == [
+        ('trip_updates', [(1751356800, '2025-07-01')]),
+        ('stop_time_updates', [(1751356800, 'StopPoint:A'), (1751356800, 'StopPoint:B')]),
+        ('trip_updates', [(1751356830, '2025-07-01'), (1751356860, '2025-07-01')]),
+        ('stop_time_updates', [(1751356860, 'StopPoint:A')])
+    ]
+
+def test_delta_ingestion_heartbeat(make_state_consumer):
+    consumer, _engine, written = make_state_consumer('DELTA', enabled=True, heartbeat=600)
+    consumer.ingest_batch([make_tu_message(1751356800, 60)], [])
+    consumer.ingest_batch([make_tu_message(1751357100, 60)], [])
+    consumer.ingest_batch([make_tu_message(1751357400, 60)], [])
+    assert [rows for table, rows in written if table == 'stop_time_updates'] == [
+        [(1751356800, 'StopPoint:A'), (1751356800, 'StopPoint:B')],
+        [(1751357400, 'StopPoint:A'), (1751357400, 'StopPoint:B')]
+    ]
+
+def test_delta_ingestion_state_recorded_after_commit(make_state_consumer):
+    consumer, engine, written = make_state_consumer('DELTA', enabled=True)
+    engine.commit.side_effect = [Exception("connection lost"), None]
+    with pytest.raises(Exception, match="connection lost"):
+        consumer.ingest_batch([make_tu_message(1751356800, 60)], [])
+    assert len(consumer.stop_time_state) == 0
+    # The retried batch is written again in full
+    consumer.ingest_batch([make_tu_message(1751356800, 60)], [])
+    assert written[1] == written[3] == ('stop_time_updates', [(1751356800, 'StopPoint:A'), (1751356800, 'StopPoint:B')])
+    assert len(consumer.stop_time_state) == 2
+
+def test_delta_ingestion_state_is_bounded(make_state_consumer):
+    consumer, _engine, _written = make_state_consumer('DELTA', enabled=True, max_size=1)
+    consumer.ingest_batch([make_tu_message(1751356800, 60)], [])
+    assert len(consumer.stop_time_state) == 1
+
+def test_delta_ingestion_warm_start(make_state_consumer):
+    from datetime import UTC, datetime
+    consumer, engine, written = make_state_consumer('DELTA', enabled=True, warm_start_hours=3)
+    to_datetime = lambda ts: datetime.fromtimestamp(ts, tz=UTC)
+    engine.fetch_query.return_value = [
+        ('trip_1', 'StopPoint:A', to_datetime(1751356960), to_datetime(1751356960), 0, 60, to_datetime(1751356700)),
+        ('trip_0', 'StopPoint:A', to_datetime(1751356000), to_datetime(1751356000), 0, 0, to_datetime(1751355900))
+    ]
+    consumer.load_stop_time_state()
+    query, params = engine.fetch_query.call_args.args
+    assert params == (3, 200000)
+    # The limit keeps the most recent stops, not the first (trip_id, stop_id) pairs
+    assert query.index('ORDER BY feed_timestamp DESC') < query.index('LIMIT')
+    assert list(consumer.stop_time_state._entries)[-1] == ('trip_1', 'StopPoint:A')
+    consumer.ingest_batch([make_tu_message(1751356800, 60)], [])
+    assert written[1] == ('stop_time_updates', [(1751356800, 'StopPoint:B')])
+
+def test_delta_ingestion_state_cleared_on_revoke(var_dict):
+    from kafka.structs import TopicPartition
+    var_dict['DELTA'] = {'enabled': True}
+    consumer, _batches = make_stream_consumer(var_dict, [])
+    consumer.stop_time_state.put(('trip_1', 'StopPoint:A'), (None, None, 0, 0, None))
+    listener = consumer.stream_consumer.subscribe.call_args.kwargs['listener']
+    listener.on_partitions_revoked({TopicPartition('gtfs-rt-tu', 0)})
+    assert len(consumer.stop_time_state) == 0
+    consumer.db_engine = MagicMock()
+    engine = consumer.db_engine.borrow.return_value.__enter__.return_value
+    engine.fetch_query.return_value = [('trip_2', 'StopPoint:A', None, None, 0, 0, None)]
+    listener.on_partitions_assigned({TopicPartition('gtfs-rt-tu', 1)})
+    assert list(consumer.stop_time_state._entries) == [('trip_2', 'StopPoint:A')]
+
+def test_delta_ingestion_state_kept_on_first_join(var_dict):
+    var_dict['DELTA'] = {'enabled': True}
+    var_dict['ALERT_CACHE'] = {}
+    consumer, _batches = make_stream_consumer(var_dict, [])
+    consumer.stop_time_state.put(('trip_1', 'StopPoint:A'), (None, None, 0, 0, None))
+    consumer.alert_state.put('a1', 'hash')
+    consumer.db_engine = MagicMock()
+    listener = consumer.stream_consumer.subscribe.call_args.kwargs['listener']
+    # The eager protocol revokes an empty set before the first assignment
+    listener.on_partitions_revoked(set())
+    listener.on_partitions_assigned(set())
+    assert len(consumer.stop_time_state) == 1
+    assert len(consumer.alert_state) == 1
+    consumer.db_engine.borrow.assert_not_called()
+
+
+# --- Alert state cache ---
+
+def make_sa_message(alert_id, description, trip_ids):
+    return {'id': alert_id, 'alert': {
+        'activePeriod': [{'start': 1751356800}],
+        'informedEntity': [{'trip': {'tripId': trip_id}} for trip_id in trip_ids],
+        'descriptionText': {'translation': [{'text': description, 'language': 'fr'}]}
+    }}
+
+def test_alert_cache_skips_unchanged_alerts(make_state_consumer):
+    consumer, engine, written = make_state_consumer('ALERT_CACHE')
+    consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1']), make_sa_message('a2', 'Panne', ['t2'])])
+    consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1', 't3']), make_sa_message('a2', 'Panne réparée', ['t2'])])
+    consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1', 't3'])])
+    assert [table for table, rows in written] == ['alerts', 'alert_entities', 'alerts', 'alert_entities']
+    assert [row[0] for row in written[2][1]] == ['a2']
+    assert written[3][1] == [('t3', 'a1')]
+    assert engine.commit.call_count == 2
+
+def test_alert_cache_state_recorded_after_commit(make_state_consumer):
+    consumer, engine, written = make_state_consumer('ALERT_CACHE')
+    engine.commit.side_effect = [Exception("connection lost"), None]
+    with pytest.raises(Exception, match="connection lost"):
+        consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1'])])
+    consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1'])])
+    assert written[:2] == written[2:]
+
+def test_alert_cache_disabled(make_state_consumer):
+    consumer, _engine, written = make_state_consumer('ALERT_CACHE', enabled=False)
+    for _ in range(2):
+        consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1'])])
+    assert len(written) == 4
+    assert consumer.get_caches() == {}
+
+def test_alert_cache_stats(make_state_consumer):
+    from prometheus_client import REGISTRY
+    consumer, _engine, _written = make_state_consumer('ALERT_CACHE')
+    labels = {'cache': 'alert_state'}
+    hits = REGISTRY.get_sample_value('gtfs_consumer_cache_hits_total', labels) or 0
+    misses = REGISTRY.get_sample_value('gtfs_consumer_cache_misses_total', labels) or 0
+    for _ in range(3):
+        consumer.ingest_batch([], [make_sa_message('a1', 'Retard', ['t1'])])
+    with capture_logs() as log:
+        consumer.report_cache_stats()
+    assert any("Cache alert_state: hit rate 66.7% (2 hits, 1 misses), 1 entries" in message for message in log)
+    assert consumer.alert_entity_state.pop_stats()['hits'] == 0
+    assert REGISTRY.get_sample_value('gtfs_consumer_cache_hits_total', labels) == hits + 2
+    assert REGISTRY.get_sample_value('gtfs_consumer_cache_misses_total', labels) == misses + 1
+    assert REGISTRY.get_sample_value('gtfs_consumer_cache_entries', labels) == 1
+
+
+# --- Backfill mode ---
+
+class FakeBackfillKafka:
+    """Kafka consumer over in-memory partitions: {TopicPartition: [(timestamp_ms, value)]}"""
+    def __init__(self, partitions, **kwargs):
+        self.kwargs = kwargs
+        self.partitions = partitions
+        self.positions = {}
+        self.committed_offsets = {}
+        self.paused = set()
+        self.closed = False
+
+    def partitions_for_topic(self, topic):
+        return {tp.partition for tp in self.partitions if tp.topic == topic}
+
+    def assign(self, partitions):
+        self.assigned = list(partitions)
+
+    def assignment(self):
+        return set(self.assigned)
+
+    def end_offsets(self, partitions):
+        return {tp: len(self.partitions[tp]) for tp in partitions}
+
+    def beginning_offsets(self, partitions):
+        return {tp: 0 for tp in partitions}
+
+    def offsets_for_times(self, timestamps):
+        from kafka.structs import OffsetAndTimestamp
+        found = {}
+        for tp, timestamp_ms in timestamps.items():
+            offsets = [i for i, (ts, _) in enumerate(self.partitions[tp]) if ts >= timestamp_ms]
+            found[tp] = OffsetAndTimestamp(offsets[0], timestamp_ms, -1) if offsets else None
+        return found
+
+    def seek(self, tp, offset):
+        self.positions[tp] = offset
+
+    def seek_to_beginning(self, tp):
+        self.positions[tp] = 0
+
+    def position(self, tp):
+        return self.positions[tp]
+
+    def committed(self, tp):
+        return self.committed_offsets.get(tp)
+
+    def commit(self):
+        self.committed_offsets = dict(self.positions)
+
+    def pause(self, *partitions):
+        self.paused = set(partitions)
+
+    def poll(self, timeout_ms, max_records):
+        from kafka.consumer.fetcher import ConsumerRecord
+        for tp in self.assigned:
+            if tp in self.paused or self.positions[tp] >= len(self.partitions[tp]):
+                continue
+            start = self.positions[tp]
+            records = self.partitions[tp][start:start + max_records]
+            self.positions[tp] = start + len(records)
+            return {tp: [MagicMock(spec=ConsumerRecord, value=value, headers=[], offset=start + i) for i, (_, value) in enumerate(records)]}
+        return {}
+
+    def close(self):
+        self.closed = True
+
+def make_backfill_consumer(var_dict, n_messages=5, **backfill):
+    from kafka.structs import TopicPartition
+    partitions = {
+        TopicPartition('gtfs-rt-tu', 0): [(1000 * i, encode_message(f'tu_{i}')) for i in range(n_messages)],
+        TopicPartition('gtfs-rt-tu', 1): [],
+        TopicPartition('gtfs-rt-sa', 0): [(1000 * i, encode_message(f'sa_{i}')) for i in range(2)]
+    }
+    consumer = make_consumer(var_dict, CONSUMER_MODE='backfill', BACKFILL={'batch_records': 3, 'progress_interval': 0, **backfill})
+    consumer.db_engine = MagicMock()
+    return consumer, FakeBackfillKafka(partitions), record_batches(consumer)
+
+def test_backfill_drains_topics_in_batches(var_dict):
+    consumer, fake, batches = make_backfill_consumer(var_dict, max_poll_records=3)
+    with patch('consumer.KafkaConsumer', return_value=fake) as kafka_consumer, capture_logs() as log:
+        consumer.run()
+    assert kafka_consumer.call_args.kwargs['group_id'] == 'gtfs-rt-backfill'
+    assert consumer.ingest_strategy == 'copy'
+    assert batches == [(['tu_0', 'tu_1', 'tu_2'], []), (['tu_3', 'tu_4'], ['sa_0', 'sa_1'])]
+    assert set(fake.committed_offsets.values()) == {5, 0, 2}
+    assert fake.closed
+    assert any(message.startswith("Backfill progress: 7/7 messages (100.0%)") for message in log)
+    consumer.db_engine.open_pool.assert_called_once()
+
+def test_backfill_from_timestamp(var_dict):
+    from datetime import UTC, datetime
+    consumer, fake, batches = make_backfill_consumer(var_dict)
+    with patch('consumer.KafkaConsumer', return_value=fake):
+        consumer.backfill(start_timestamp=datetime.fromtimestamp(3, tz=UTC))
+    assert batches == [(['tu_3', 'tu_4'], [])]
+
+def test_backfill_from_configured_timestamp(var_dict):
+    consumer, fake, batches = make_backfill_consumer(var_dict, start_timestamp='1970-01-01T00:00:03')
+    assert consumer.backfill_config['start_timestamp'].tzinfo is not None
+    with patch('consumer.KafkaConsumer', return_value=fake):
+        consumer.run()
+    assert batches == [(['tu_3', 'tu_4'], [])]
+
+def test_backfill_resumes_from_committed(var_dict):
+    from kafka.structs import TopicPartition
+    consumer, fake, batches = make_backfill_consumer(var_dict)
+    fake.committed_offsets = {TopicPartition('gtfs-rt-tu', 0): 4, TopicPartition('gtfs-rt-sa', 0): 2}
+    with patch('consumer.KafkaConsumer', return_value=fake):
+        consumer.backfill(start_offset='committed')
+    assert batches == [(['tu_4'], [])]
+
+def test_topic_config_is_opt_in(var_dict):
+    consumer = GTFSConsumer(var_dict)
+    consumer.set_topic_config = MagicMock()
+    consumer.consume_loop = MagicMock()
+    consumer.db_engine = MagicMock()
+    consumer.run()
+    consumer.set_topic_config.assert_not_called()
+    consumer.topic_config = {'retention.ms': 86400000}
+    consumer.run()
+    consumer.set_topic_config.assert_any_call('gtfs-rt-tu', {'retention.ms': 86400000})
+
+def test_parse_backfill_args():
+    from consumer import parse_args
+    args = parse_args(['--backfill', '--from-timestamp', '2025-07-01T00:00:00'])
+    assert args.backfill and args.from_timestamp.year == 2025 and args.from_offset is None
+    assert args.from_timestamp.utcoffset().total_seconds() == 0
+    assert parse_args([]).backfill is False
+    assert parse_args(['/bin/sh', '-c', 'python consumer.py']).backfill is False
+    with pytest.raises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+        parse_args(['--from-offset', '0', '--from-timestamp', '2025-07-01'])
+
+
+# --- Metrics and logging ---
+
+def test_ingest_rows_records_table_metrics(var_dict):
+    from prometheus_client import REGISTRY
+    consumer = GTFSConsumer(var_dict)
+    labels = {'table': 'alerts'}
+    before = REGISTRY.get_sample_value('gtfs_consumer_ingest_rows_total', labels) or 0
+    consumer.ingest_rows(MagicMock(), 'alerts', ['alert_id'], [('a1',), ('a2',)])
+    assert REGISTRY.get_sample_value('gtfs_consumer_ingest_rows_total', labels) == before + 2
+    assert REGISTRY.get_sample_value('gtfs_consumer_ingest_seconds_count', labels) >= 1
+
+def test_json_log_lines():
+    from common_metrics import JsonFormatter
+    record = logging.LogRecord('consumer', logging.INFO, __file__, 1, "Lag %s: %d messages", ('gtfs-rt-tu[0]', 3), None)
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry['level'], entry['logger'], entry['message']) == ('INFO', 'consumer', "Lag gtfs-rt-tu[0]: 3 messages")
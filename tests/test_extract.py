@@ -2,9 +2,16 @@
 
 import sys
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+import requests
+from google.transit import gtfs_realtime_pb2
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/producer')))
 from unittest.mock import patch
-from src.producer.producer import fetch_gtfs_rt, extract_ids_and_trip_updates, is_already_sent
+from conftest import make_feed_bytes
+from src.producer.producer import fetch_gtfs_rt, get_http_session, read_feed_header, extract_ids_and_trip_updates, is_already_sent, filter_already_sent, \
+    entity_fingerprint, filter_unchanged, wait_until_ready, iter_chunks, iter_entities, process_feed_data, load_feeds, record_key
 
 # --- fetch_gtfs_rt ---
 def test_fetch_gtfs_rt_returns_none_on_error():
@@ -12,6 +19,96 @@ def test_fetch_gtfs_rt_returns_none_on_error():
         result = fetch_gtfs_rt('http://bad.url')
         assert result is None
 
+class FeedStub:
+    """Local HTTP stub serving a GTFS-RT feed, optionally honouring If-None-Match"""
+    def __init__(self):
+        self.body = make_feed_bytes(1000, ['1'])
+        self.etag = None
+        self.requests = []
+
+@pytest.fixture
+def feed_stub():
+    stub = FeedStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            stub.requests.append(dict(self.headers))
+            if stub.etag and self.headers.get('If-None-Match') == stub.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            if stub.etag:
+                self.send_header('ETag', stub.etag)
+            self.send_header('Content-Length', str(len(stub.body)))
+            self.end_headers()
+            self.wfile.write(stub.body)
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stub.url = f'http://127.0.0.1:{server.server_port}/feed'
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+def test_read_feed_header():
+    header = read_feed_header(make_feed_bytes(1234, ['1', '2']))
+    assert header.timestamp == 1234
+    assert read_feed_header(b'') is None
+
+def test_fetch_gtfs_rt_not_modified(feed_stub):
+    feed_stub.etag = '"v1"'
+    state = {}
+    with requests.Session() as session:
+        assert len(fetch_gtfs_rt(feed_stub.url, session, state).entity) == 1
+        assert state['status'] == 'changed'
+        assert fetch_gtfs_rt(feed_stub.url, session, state) is None
+    assert state['status'] == 'unchanged'
+    assert feed_stub.requests[1]['If-None-Match'] == '"v1"'
+
+def test_http_session_per_thread():
+    sessions = []
+    thread = threading.Thread(target = lambda: sessions.append(get_http_session()))
+    thread.start()
+    thread.join()
+    assert get_http_session() is get_http_session()
+    assert sessions[0] is not get_http_session()
+
+def test_fetch_gtfs_rt_identical_body(feed_stub):
+    state = {}
+    assert fetch_gtfs_rt(feed_stub.url, feed_state=state) is not None
+    assert fetch_gtfs_rt(feed_stub.url, feed_state=state) is None
+    assert state['status'] == 'unchanged'
+    # Same header timestamp, different body: still the same snapshot
+    feed_stub.body = make_feed_bytes(1000, ['2', '1'])
+    assert fetch_gtfs_rt(feed_stub.url, feed_state=state) is None
+    # New snapshot
+    feed_stub.body = make_feed_bytes(1060, ['1', '2'])
+    assert len(fetch_gtfs_rt(feed_stub.url, feed_state=state).entity) == 2
+    assert state['status'] == 'changed'
+
+def test_fetch_gtfs_rt_unparsable_body_keeps_no_validators(feed_stub):
+    feed_stub.etag = '"v1"'
+    feed_stub.body = b'\x0a\xff\xff'
+    state = {}
+    assert fetch_gtfs_rt(feed_stub.url, feed_state=state) is None
+    assert state['status'] == 'error'
+    assert 'etag' not in state and 'digest' not in state
+    # The next poll fetches the snapshot again instead of getting a 304
+    feed_stub.body = make_feed_bytes(1000, ['1'])
+    assert len(fetch_gtfs_rt(feed_stub.url, feed_state=state).entity) == 1
+    assert 'If-None-Match' not in feed_stub.requests[1]
+    assert state['etag'] == '"v1"'
+
+def test_fetch_gtfs_rt_error_status(feed_stub):
+    state = {}
+    with patch('src.producer.producer.requests.get', side_effect = Exception('fail')):
+        assert fetch_gtfs_rt(feed_stub.url, feed_state=state) is None
+    assert state['status'] == 'error'
+
 # --- extract_ids_and_trip_updates ---
 class FakeEntity:
     def __init__(self, id, has_trip_update = False, has_alert = False):
@@ -78,4 +175,173 @@ def test_is_already_sent_false():
     assert redis.set_calls == [('type_id', '1', 123)]
 
 
+# --- filter_already_sent ---
+class DummyBatchRedis:
+    def __init__(self, already_sent = ()):
+        self.keys = set(already_sent)
+        self.calls = []
+    def claim_many(self, keys, ttl):
+        self.calls.append((list(keys), ttl))
+        result = []
+        for key in keys:
+            result.append(key not in self.keys)
+            self.keys.add(key)
+        return result
+
+
+def test_filter_already_sent_single_call():
+    redis = DummyBatchRedis(already_sent=['type_2'])
+    data = [{'id': '1'}, {'id': '2'}, {'id': '3'}, {'id': '1'}]
+    result = filter_already_sent(redis, 'type', data, delay=123)
+    assert result == [{'id': '1'}, {'id': '3'}]
+    assert redis.calls == [(['type_1', 'type_2', 'type_3', 'type_1'], 123)]
+
+def test_filter_already_sent_empty():
+    redis = DummyBatchRedis()
+    assert filter_already_sent(redis, 'type', []) == []
+    assert redis.calls == []
+
+
+# --- fingerprint mode ---
+def make_trip_update(timestamp, delay):
+    return {'id': '1', 'trip_update': {'timestamp': timestamp, 'stopTimeUpdate': [{'stopId': 'A', 'arrival': {'delay': delay}}]}}
+
+def test_entity_fingerprint_ignores_timestamp():
+    assert entity_fingerprint(make_trip_update('100', 60)) == entity_fingerprint(make_trip_update('200', 60))
+
+def test_entity_fingerprint_detects_delay_change():
+    assert entity_fingerprint(make_trip_update('100', 60)) != entity_fingerprint(make_trip_update('100', 120))
+
+class DummyFingerprintRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.pruned = []
+    def claim_changed(self, hash_key, fingerprints):
+        stored = self.hashes.setdefault(hash_key, {})
+        result = []
+        for field, digest in fingerprints:
+            result.append(stored.get(field) != digest)
+            stored[field] = digest
+        return result
+    def prune_fingerprints(self, hash_key, max_age):
+        self.pruned.append((hash_key, max_age))
+        return 0
+
+def test_filter_unchanged_republishes_updates():
+    redis = DummyFingerprintRedis()
+    assert filter_unchanged(redis, 'trip_update', [make_trip_update('100', 60)]) == [make_trip_update('100', 60)]
+    assert filter_unchanged(redis, 'trip_update', [make_trip_update('200', 60)]) == []
+    assert filter_unchanged(redis, 'trip_update', [make_trip_update('300', 120)]) == [make_trip_update('300', 120)]
+    assert list(redis.hashes) == ['fingerprints_trip_update']
+
+
+# --- wait_until_ready ---
+class DummyProbe:
+    def __init__(self, results):
+        self.results = list(results)
+    def ping(self):
+        return self.results.pop(0)
+    def is_ready(self, topics):
+        return True
+
+def test_wait_until_ready_retries_until_ready():
+    probe = DummyProbe([False, False, True])
+    assert wait_until_ready(probe, probe, ['topic'], timeout=10, interval=0) is True
+    assert probe.results == []
+
+def test_wait_until_ready_timeout():
+    probe = DummyProbe([False] * 100)
+    assert wait_until_ready(probe, probe, ['topic'], timeout=0, interval=0) is False
+
+
+# --- streaming pipeline ---
+def test_iter_chunks():
+    assert list(iter_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_chunks([], 2)) == []
+
+def test_iter_entities_is_lazy(monkeypatch):
+    converted = []
+    monkeypatch.setattr('src.producer.producer.MessageToDict', lambda x: converted.append(x) or x)
+    entities = iter_entities(FakeFeed([FakeEntity(str(i), has_trip_update=True) for i in range(3)]))
+    assert next(entities)['id'] == '0'
+    assert len(converted) == 1
+
+class DummyKafkaEngine:
+    wire_format = 'json'
+    def __init__(self):
+        self.batches = []
+        self.keys = []
+    def send(self, topic, records, key=None):
+        self.batches.append((topic, [record['id'] for record in records]))
+        if key:
+            self.keys.extend(key(record) for record in records)
+        return len(records)
+
+def test_process_feed_data_in_chunks(monkeypatch):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    for i in range(5):
+        feed.entity.add(id=str(i)).trip_update.trip.trip_id = str(i)
+    monkeypatch.setattr('src.producer.producer.fetch_gtfs_rt', lambda url, session, state: state.update(status='changed') or feed)
+    redis = DummyBatchRedis(already_sent=['trip_update_1'])
+    kafka = DummyKafkaEngine()
+
+    state = process_feed_data('http://feed', 'trip_update', 'gtfs-rt-tu', redis, kafka, chunk_size=2)
+
+    assert state['status'] == 'changed'
+    assert [len(keys) for keys, _ in redis.calls] == [2, 2, 1]
+    assert kafka.batches == [('gtfs-rt-tu', ['0']), ('gtfs-rt-tu', ['2', '3']), ('gtfs-rt-tu', ['4'])]
+
+def test_process_feed_data_counts_entities(monkeypatch):
+    from prometheus_client import REGISTRY
+    feed = gtfs_realtime_pb2.FeedMessage()
+    for i in range(3):
+        feed.entity.add(id=str(i)).trip_update.trip.trip_id = str(i)
+    monkeypatch.setattr('src.producer.producer.fetch_gtfs_rt', lambda url, session, state: state.update(status='changed') or feed)
+    count = lambda stage: REGISTRY.get_sample_value('gtfs_producer_entities_total', {'topic': 'metrics-tu', 'stage': stage}) or 0
+    before = {stage: count(stage) for stage in ('fetched', 'filtered', 'published')}
+
+    process_feed_data('http://feed', 'trip_update', 'metrics-tu', DummyBatchRedis(already_sent=['trip_update_1']), DummyKafkaEngine())
+
+    assert {stage: count(stage) - before[stage] for stage in before} == {'fetched': 3, 'filtered': 1, 'published': 2}
+
+# --- feeds config & record keys ---
+
+def test_load_feeds_legacy_urls():
+    feeds = load_feeds({'gtfs_rt_tu_url': 'http://tu', 'gtfs_rt_sa_url': 'http://sa'})
+    assert [(feed['name'], feed['topic'], feed['key'], feed['redis_type']) for feed in feeds] == [
+        ('trip_update', 'gtfs-rt-tu', 'trip_id', 'trip_update'),
+        ('service_alert', 'gtfs-rt-sa', 'alert_id', 'service_alert')
+    ]
+
+def test_load_feeds_defaults_and_validation():
+    feeds = load_feeds({'feeds': [{'name': 'op_tu', 'url': 'http://tu', 'kind': 'trip_update'}]})
+    assert feeds[0]['topic'] == 'gtfs-rt-tu'
+    assert feeds[0]['key'] is None
+    assert feeds[0]['redis_type'] == 'op_tu'
+    with pytest.raises(ValueError):
+        load_feeds({'feeds': [{'name': 'op', 'url': 'http://x', 'kind': 'vehicle_position'}]})
+    with pytest.raises(ValueError):
+        load_feeds({'feeds': [{'name': 'op', 'url': 'http://x', 'kind': 'trip_update', 'key': 'route_id'}]})
+    with pytest.raises(ValueError):
+        load_feeds({'feeds': [{'name': 'op', 'url': 'http://x', 'kind': 'trip_update'}] * 2})
+
+def test_record_key():
+    item = {'id': 'entity_1', 'trip_update': {'trip': {'tripId': 'trip_1'}}}
+    assert record_key(item, 'trip_id') == 'trip_1'
+    assert record_key(item, 'entity_id') == 'entity_1'
+    assert record_key({'id': 'alert_1', 'alert': {}}, 'alert_id') == 'alert_1'
+    assert record_key({'id': 'entity_2', 'trip_update': {}}, 'trip_id') == 'entity_2'
+    assert record_key(item, None) is None
+
+@pytest.mark.parametrize('wire_format', ['json', 'msgpack'])
+def test_process_feed_data_keys_by_trip_id(monkeypatch, wire_format):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    for i in range(3):
+        feed.entity.add(id=f'entity_{i}').trip_update.trip.trip_id = f'trip_{i}'
+    monkeypatch.setattr('src.producer.producer.fetch_gtfs_rt', lambda url, session, state: state.update(status='changed') or feed)
+    kafka = DummyKafkaEngine()
+    kafka.wire_format = wire_format
+
+    process_feed_data('http://feed', 'op_tu', 'gtfs-rt-tu', DummyBatchRedis(), kafka, key_strategy='trip_id')
 
+    assert kafka.keys == ['trip_0', 'trip_1', 'trip_2']
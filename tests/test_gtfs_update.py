@@ -1,9 +1,14 @@
 # tests/test_gtfs_update.py
+from hypothesis import given, settings, strategies as st
 from unittest.mock import patch, MagicMock
+import datetime
 import pandas as pd
+import pytest
+import io
 import sys
 import os
 import importlib
+import zipfile
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/gtfs_update')))
 gtfs_update = importlib.import_module('gtfs_update')
@@ -11,7 +16,7 @@ gtfs_update = importlib.import_module('gtfs_update')
 def test_pipeline_extract(monkeypatch):
     monkeypatch.setattr(gtfs_update, 'download_gtfs_data', lambda url: b'data')
     monkeypatch.setattr(gtfs_update, 'extract_data_from_zip', lambda data: None)
-    monkeypatch.setattr(gtfs_update, 'load_df_dict', lambda: {'foo': pd.DataFrame({'a': [1,2]})})
+    monkeypatch.setattr(gtfs_update, 'load_df_dict', lambda **kwargs: {'foo': pd.DataFrame({'a': [1,2]})})
     monkeypatch.setattr(gtfs_update, 'remove_tmp_files', lambda: None)
     result = gtfs_update.pipeline_extract('fake_url')
     assert 'foo' in result
@@ -56,4 +61,266 @@ def test_pipeline_load():
         MockPg.return_value.__enter__.return_value = mock_pg
         gtfs_update.pipeline_load(df_dict, pg_vars)
         assert mock_pg.execute_batch_query.call_count == 5
-        mock_pg.commit.assert_called_once() 
\ No newline at end of file
+        mock_pg.commit.assert_called_once() 
+
+def make_gtfs_zip(tables: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, content in tables.items():
+            zf.writestr(f'{name}.txt', content)
+    return buffer.getvalue()
+
+
+GTFS_ZIP = make_gtfs_zip({
+    'agency': 'agency_id,agency_name\nA1,SNCF\n',
+    'stops': 'stop_id,stop_name\nS1,Paris\nS2,Lyon\n',
+    'routes': 'route_id,agency_id\nR1,A1\n',
+    'trips': 'trip_id,route_id\nT1,R1\n',
+    'stop_times': 'trip_id,stop_sequence,arrival_time\nT1,0,08:00:00\nT1,1,25:10:00\n',
+    'calendar_dates': 'service_id,date\nX,20250101\n',
+    'feed_info': 'feed_publisher_name\nSNCF\n'
+})
+
+
+class FakeResponse:
+    def __init__(self, content: bytes, chunk_size: int = 7):
+        self.content = content
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size = None):
+        for i in range(0, len(self.content), self.chunk_size):
+            yield self.content[i:i + self.chunk_size]
+
+
+def test_load_df_dict_from_zip_reads_only_requested_tables():
+    result = gtfs_update.load_df_dict_from_zip(io.BytesIO(GTFS_ZIP), tables = gtfs_update.GTFS_TABLES)
+    assert sorted(result) == sorted(gtfs_update.GTFS_TABLES)
+    assert list(result['stops']['stop_id']) == ['S1', 'S2']
+    assert list(result['stop_times']['arrival_time']) == ['08:00:00', '25:10:00']
+
+
+def test_load_df_dict_from_zip_all_members():
+    result = gtfs_update.load_df_dict_from_zip(io.BytesIO(GTFS_ZIP))
+    assert 'calendar_dates' in result
+    assert 'feed_info' in result
+
+
+def test_download_gtfs_archive_streams_to_spooled_file():
+    with (patch('gtfs_update.requests.get', return_value = FakeResponse(GTFS_ZIP)) as mock_get,
+          gtfs_update.download_gtfs_archive('fake_url', spool_max_size = 16) as archive):
+        assert archive._rolled
+        assert archive.read() == GTFS_ZIP
+    mock_get.assert_called_once_with('fake_url', stream = True)
+
+
+def test_download_gtfs_archive_in_memory():
+    with (patch('gtfs_update.requests.get', return_value = FakeResponse(GTFS_ZIP)),
+          gtfs_update.download_gtfs_archive('fake_url') as archive):
+        assert not archive._rolled
+        assert archive.read() == GTFS_ZIP
+
+
+def test_download_gtfs_archive_rolls_over_by_default():
+    # An archive above the default threshold is not kept in memory
+    chunk = b'\0' * gtfs_update.DOWNLOAD_CHUNK_SIZE
+    response = FakeResponse(b'')
+    response.iter_content = lambda chunk_size = None: (chunk for _ in range(gtfs_update.SPOOL_MAX_SIZE // len(chunk) + 1))
+    with (patch('gtfs_update.requests.get', return_value = response),
+          gtfs_update.download_gtfs_archive('fake_url') as archive):
+        assert archive._rolled
+
+
+def test_pipeline_extract_streamed_modes_match_disk_mode(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gtfs_update, 'download_gtfs_data', lambda url: GTFS_ZIP)
+    disk = gtfs_update.pipeline_extract('fake_url', mode = 'disk')
+    assert not os.path.exists(tmp_path / 'tmp_gtfs')
+    for mode in ('spooled', 'memory'):
+        with patch('gtfs_update.requests.get', return_value = FakeResponse(GTFS_ZIP)):
+            result = gtfs_update.pipeline_extract('fake_url', mode = mode, spool_max_size = 16, tables = gtfs_update.GTFS_TABLES)
+        assert sorted(result) == sorted(gtfs_update.GTFS_TABLES)
+        for table in gtfs_update.GTFS_TABLES:
+            pd.testing.assert_frame_equal(result[table], disk[table])
+    assert os.listdir(tmp_path) == []
+
+
+def test_pipeline_extract_disk_mode_reads_only_requested_tables(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gtfs_update, 'download_gtfs_data', lambda url: GTFS_ZIP)
+    parsed = []
+    read_gtfs_csv = gtfs_update.read_gtfs_csv
+    def spy(f, table_name, **kwargs):
+        parsed.append(table_name)
+        return read_gtfs_csv(f, table_name, **kwargs)
+    monkeypatch.setattr(gtfs_update, 'read_gtfs_csv', spy)
+    result = gtfs_update.pipeline_extract('fake_url', mode = 'disk', tables = gtfs_update.GTFS_TABLES)
+    assert sorted(parsed) == sorted(result) == sorted(gtfs_update.GTFS_TABLES)
+    assert 'calendar_dates' not in parsed
+
+
+def test_pipeline_extract_unknown_mode():
+    with pytest.raises(ValueError):
+        gtfs_update.pipeline_extract('fake_url', mode = 'tape')
+
+
+def test_pipeline_transform_without_skipped_tables():
+    df_dict = gtfs_update.load_df_dict_from_zip(io.BytesIO(GTFS_ZIP), tables = gtfs_update.GTFS_TABLES)
+    df_dict['stop_times']['stop_headsign'] = None
+    df_dict['stop_times']['shape_dist_traveled'] = None
+    df_dict['routes'] = df_dict['routes'].assign(route_desc = None, route_url = None, route_color = None, route_text_color = None)
+    df_dict['trips'] = df_dict['trips'].assign(shape_id = None, direction_id = None)
+    df_dict['stops'] = df_dict['stops'].assign(stop_desc = None, zone_id = None, stop_url = None, parent_station = None)
+    result = gtfs_update.pipeline_transform(df_dict)
+    assert sorted(result) == sorted(gtfs_update.GTFS_TABLES)
+
+
+@pytest.mark.parametrize('engine', ['pyarrow', 'c'])
+def test_read_gtfs_csv_prunes_and_types_columns(engine):
+    content = ('\ufefftrip_id,arrival_time,departure_time,stop_id,stop_sequence,stop_headsign,pickup_type,drop_off_type,shape_dist_traveled\n'
+               'T1,08:00:00,08:01:00,S1,0,Paris,,0,\n'
+               'T1,25:10:00,25:12:00,S2,1,Lyon,1,,\n').encode('utf-8')
+    df = gtfs_update.read_gtfs_csv(io.BytesIO(content), 'stop_times', engine = engine)
+    assert list(df.columns) == ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence', 'pickup_type', 'drop_off_type']
+    assert isinstance(df['trip_id'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['stop_id'].dtype, pd.CategoricalDtype)
+    assert df['stop_sequence'].dtype == 'int32'
+    assert df['pickup_type'].dtype == 'Int8'
+    assert df['pickup_type'].isna().tolist() == [True, False]
+    assert list(df['arrival_time']) == ['08:00:00', '25:10:00']
+
+
+def test_read_gtfs_csv_missing_optional_columns():
+    content = b'route_id,service_id,trip_id\nR1,X,T1\n'
+    df = gtfs_update.read_gtfs_csv(io.BytesIO(content), 'trips')
+    assert list(df.columns) == ['route_id', 'service_id', 'trip_id']
+
+
+def test_read_gtfs_csv_unknown_table_read_as_is():
+    content = b'service_id,date,exception_type\nX,20250101,1\n'
+    df = gtfs_update.read_gtfs_csv(io.BytesIO(content), 'calendar_dates')
+    assert list(df.columns) == ['service_id', 'date', 'exception_type']
+
+
+def test_pipeline_load_sends_missing_values_as_null():
+    df_dict = {
+        'stop_times': gtfs_update.read_gtfs_csv(io.BytesIO(b'trip_id,stop_id,stop_sequence,pickup_type\nT1,S1,0,\n'), 'stop_times')
+    }
+    pg_vars = {
+        'POSTGRES_HOST': 'h',
+        'POSTGRES_PORT': 'p',
+        'POSTGRES_DB': 'd',
+        'POSTGRES_USER': 'u',
+        'POSTGRES_PASSWORD': 'pw'
+    }
+    with patch('gtfs_update.PostgreEngine') as MockPg:
+        mock_pg = MagicMock()
+        MockPg.return_value.__enter__.return_value = mock_pg
+        gtfs_update.pipeline_load(df_dict, pg_vars)
+        _, values_list = mock_pg.execute_batch_query.call_args.args
+        assert values_list == [('T1', 'S1', 0, None)]
+
+
+gtfs_times = st.one_of(
+    st.none(),
+    st.builds(lambda h, m, s, width: f"{h:0{width}d}:{m:02d}:{s:02d}",
+              st.integers(0, 120), st.integers(0, 59), st.integers(0, 59), st.sampled_from([1, 2])),
+    st.sampled_from(['', 'abc', '12:60:00', '12:00:61', '12:00', '08:00:00x', ' 07:05:09', ':00:00', '24:09:00'])
+)
+
+
+@settings(max_examples = 50)
+@given(st.lists(gtfs_times, max_size = 20))
+def test_convert_gtfs_times_match_reference(values):
+    times = pd.Series(values, dtype = object)
+    assert gtfs_update.convert_gtfs_times_to_time(times).tolist() == [gtfs_update.convert_gtfs_time_to_time(v) for v in values]
+
+    # The reference timestamp converter carries minutes / seconds >= 60 over, the vectorized one rejects them
+    service_date = datetime.date(2025, 7, 1)
+    expected = []
+    for v in values:
+        with patch('gtfs_update.datetime') as mock_datetime:
+            mock_datetime.now.return_value.date.return_value = service_date
+            mock_datetime.combine = datetime.datetime.combine
+            mock_datetime.min = datetime.datetime.min
+            timestamp = gtfs_update.convert_gtfs_time_to_timestamp(v)
+        expected.append(timestamp if gtfs_update.convert_gtfs_time_to_time(v) is not None else None)
+    result = gtfs_update.convert_gtfs_times_to_timestamp(times, service_date = service_date)
+    assert [None if pd.isna(ts) else ts.to_pydatetime() for ts in result] == expected
+
+
+def test_convert_gtfs_times_to_seconds_keeps_service_day():
+    times = pd.Series(['08:00:00', '23:59:59', '24:09:00', '25:10:00', None], index = [5, 6, 7, 8, 9], name = 'arrival_time')
+    seconds = gtfs_update.convert_gtfs_times_to_seconds(times)
+    assert seconds.dtype == 'Int32'
+    assert list(seconds.index) == [5, 6, 7, 8, 9]
+    assert seconds.name == 'arrival_time'
+    assert seconds.iloc[:4].tolist() == [28800, 86399, 86940, 90600]
+    assert (seconds.iloc[:4] // gtfs_update.SECONDS_PER_DAY).tolist() == [0, 0, 1, 1]
+    assert seconds.isna().tolist() == [False, False, False, False, True]
+
+
+def test_convert_gtfs_times_empty():
+    assert gtfs_update.convert_gtfs_times_to_seconds(pd.Series([], dtype = object)).tolist() == []
+    assert gtfs_update.convert_gtfs_times_to_time(pd.Series([], dtype = 'str')).tolist() == []
+
+
+def test_pipeline_transform_keeps_service_day_seconds():
+    df_dict = gtfs_update.load_df_dict_from_zip(io.BytesIO(GTFS_ZIP), tables = gtfs_update.GTFS_TABLES)
+    result = gtfs_update.pipeline_transform(df_dict)
+    stop_times = result['stop_times']
+    assert stop_times['arrival_seconds'].tolist() == [8 * 3600, 25 * 3600 + 10 * 60]
+    assert stop_times['arrival_time'].tolist() == [datetime.time(8, 0), datetime.time(1, 10)]
+    assert stop_times['arrival_seconds'].is_monotonic_increasing
+    assert 'departure_seconds' not in stop_times.columns
+
+
+def test_iter_csv_chunks():
+    df = pd.DataFrame({
+        'trip_id': pd.Categorical(['T1', 'T1', 'T2']),
+        'arrival_time': [datetime.time(8, 0), None, datetime.time(1, 10)],
+        'pickup_type': pd.array([None, 1, 0], dtype = 'Int8'),
+        'stop_headsign': ['Paris, Nord', 'Lyon', None]
+    })
+    chunks = list(gtfs_update.iter_csv_chunks(df, chunk_rows = 2))
+    assert chunks == ['T1,08:00:00,,"Paris, Nord"\nT1,,1,Lyon\n', 'T2,01:10:00,0,\n']
+
+
+def test_pipeline_load_copy_strategy():
+    df_dict = {
+        'stop_times': pd.DataFrame({'trip_id': ['T1'], 'stop_sequence': [0]}),
+        'agency': pd.DataFrame({'agency_id': ['A1'], 'agency_name': ['SNCF']}),
+        'stops': pd.DataFrame()
+    }
+    pg_vars = {
+        'POSTGRES_HOST': 'h',
+        'POSTGRES_PORT': 'p',
+        'POSTGRES_DB': 'd',
+        'POSTGRES_USER': 'u',
+        'POSTGRES_PASSWORD': 'pw'
+    }
+    with patch('gtfs_update.PostgreEngine') as MockPg:
+        mock_pg = MagicMock()
+        MockPg.return_value.__enter__.return_value = mock_pg
+        copied = []
+        mock_pg.execute_copy_merge.side_effect = lambda table_name, columns, chunks, keys: copied.append((table_name, columns, ''.join(chunks), keys))
+        gtfs_update.pipeline_load(df_dict, pg_vars, strategy = 'copy')
+        assert copied == [
+            ('agency', ['agency_id', 'agency_name'], 'A1,SNCF\n', ['agency_id']),
+            ('stop_times', ['trip_id', 'stop_sequence'], 'T1,0\n', ['trip_id', 'stop_sequence'])
+        ]
+        mock_pg.execute_batch_query.assert_not_called()
+        mock_pg.commit.assert_called_once()
+
+
+def test_pipeline_load_unknown_strategy():
+    with pytest.raises(ValueError):
+        gtfs_update.pipeline_load({}, {}, strategy = 'bulk')
@@ -0,0 +1,116 @@
+# tests/test_kafka_engine.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/producer')))
+from unittest.mock import MagicMock, patch
+
+import pytest
+from kafka.errors import KafkaConnectionError, KafkaTimeoutError
+from prometheus_client import REGISTRY
+
+from src.producer.KafkaEngine import KafkaEngine
+
+
+@pytest.fixture
+def kafka_mock():
+    with patch("src.producer.KafkaEngine.KafkaProducer") as mock_producer:
+        yield mock_producer
+
+
+def test_producer_is_created_once(kafka_mock):
+    engine = KafkaEngine(["localhost:9092"], linger_ms=10, compression_type="lz4")
+    engine.send("topic", [{"id": "1"}])
+    engine.send("topic", [{"id": "2"}])
+
+    kafka_mock.assert_called_once()
+    kwargs = kafka_mock.call_args.kwargs
+    assert kwargs["bootstrap_servers"] == ["localhost:9092"]
+    assert kwargs["linger_ms"] == 10
+    assert kwargs["compression_type"] == "lz4"
+
+
+def test_send_does_not_flush_and_tracks_deliveries(kafka_mock):
+    producer = kafka_mock.return_value
+    future = MagicMock()
+    producer.send.return_value = future
+
+    engine = KafkaEngine(["localhost:9092"])
+    queued = engine.send("topic", [{"id": "1"}, {"id": "2"}])
+
+    assert queued == 2
+    producer.flush.assert_not_called()
+    future.add_callback.call_args.args[0](None)
+    future.add_errback.call_args.args[0](Exception("fail"))
+    assert engine.pop_stats() == {"delivered": 1, "failed": 1}
+    assert engine.pop_stats() == {"delivered": 0, "failed": 0}
+
+
+def test_send_encodes_record_keys(kafka_mock):
+    producer = kafka_mock.return_value
+
+    engine = KafkaEngine(["localhost:9092"])
+    engine.send("topic", [{"id": "1"}, {"id": "2"}], key=lambda record: record["id"])
+    engine.send("topic", [{"id": "3"}])
+
+    assert [call.kwargs["key"] for call in producer.send.call_args_list] == [b"1", b"2", None]
+
+
+def test_send_counts_immediate_failures(kafka_mock):
+    kafka_mock.return_value.send.side_effect = KafkaTimeoutError("buffer full")
+
+    engine = KafkaEngine(["localhost:9092"])
+
+    assert engine.send("topic", [{"id": "1"}]) == 0
+    assert engine.pop_stats()["failed"] == 1
+
+
+def test_close_flushes_and_closes(kafka_mock):
+    producer = kafka_mock.return_value
+
+    with KafkaEngine(["localhost:9092"]) as engine:
+        engine.send("topic", [{"id": "1"}])
+
+    producer.flush.assert_called_once()
+    producer.close.assert_called_once()
+    assert engine.producer is None
+
+
+def test_close_without_producer(kafka_mock):
+    engine = KafkaEngine(["localhost:9092"])
+    engine.close()
+
+    kafka_mock.assert_not_called()
+
+
+def test_is_ready(kafka_mock):
+    kafka_mock.return_value.partitions_for.side_effect = lambda topic: {0} if topic == "ok" else None
+
+    engine = KafkaEngine(["localhost:9092"])
+
+    assert engine.is_ready(["ok"]) is True
+    assert engine.is_ready(["ok", "missing"]) is False
+
+
+def test_is_ready_no_brokers(kafka_mock):
+    kafka_mock.side_effect = KafkaConnectionError("no brokers available")
+
+    engine = KafkaEngine(["localhost:9092"])
+
+    assert engine.is_ready(["ok"]) is False
+
+
+def test_send_records_delivery_metrics(kafka_mock):
+    future = MagicMock()
+    kafka_mock.return_value.send.return_value = future
+    labels = {"topic": "metrics-topic"}
+    before = REGISTRY.get_sample_value("gtfs_producer_kafka_send_seconds_count", labels) or 0
+
+    engine = KafkaEngine(["localhost:9092"])
+    engine.send("metrics-topic", [{"id": "1"}])
+    future.add_callback.call_args.args[0](None)
+    future.add_errback.call_args.args[0](Exception("fail"))
+
+    assert REGISTRY.get_sample_value("gtfs_producer_kafka_send_seconds_count", labels) == before + 1
+    assert REGISTRY.get_sample_value("gtfs_producer_kafka_deliveries_total", {**labels, "result": "failed"}) >= 1
@@ -0,0 +1,61 @@
+# tests/test_lru_cache.py
+
+from src.common.LRUCache import LRUCache
+
+
+def test_get_put_and_counters():
+    cache = LRUCache()
+    assert cache.get("a") is None
+    cache.put("a", (1, 2))
+    assert cache.get("a") == (1, 2)
+    stats = cache.pop_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"], stats["size"]) == (1, 1, 0.5, 1)
+    assert cache.pop_stats()["hit_rate"] is None
+
+
+def test_lru_eviction_is_bounded():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+    assert cache.pop_stats()["evictions"] == 1
+
+
+def test_clear_keeps_counters():
+    cache = LRUCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.pop_stats()["hits"] == 1
+
+
+def test_entries_expire():
+    cache = LRUCache(max_ttl=100)
+    cache.put("a", True, 10, now=0)
+    cache.put("b", True, 1000, now=0)
+    cache.put("c", True, now=0)
+    assert cache.get("a", now=9) is True
+    assert cache.get("a", now=10) is None
+    # Lifetime is capped to max_ttl, which is also the default lifetime
+    assert cache.get("b", now=100) is None
+    assert cache.get("c", now=100) is None
+    assert len(cache) == 0
+
+
+def test_entries_without_max_ttl_never_expire():
+    cache = LRUCache()
+    cache.put("a", True, now=0)
+    cache.put("b", True, 10, now=0)
+    assert cache.get("a", now=1e9) is True
+    assert cache.get("b", now=10) is None
+
+
+def test_non_positive_ttl_is_not_cached():
+    cache = LRUCache()
+    cache.put("a", True, -0.001)
+    assert len(cache) == 0
@@ -0,0 +1,80 @@
+# tests/test_poll_scheduler.py
+
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/producer')))
+from src.producer.PollScheduler import PollScheduler
+
+
+def make_scheduler(**kwargs):
+    return PollScheduler({'tu': lambda: {'status': 'changed'}}, min_interval=30, max_interval=300, max_backoff=900, margin=5, **kwargs)
+
+
+def test_first_poll_uses_min_interval():
+    scheduler = make_scheduler()
+    assert scheduler.update('tu', 'changed', 1000, now=1010) == 30
+
+
+def test_changed_feed_aligns_on_upstream_refresh():
+    scheduler = make_scheduler()
+    scheduler.update('tu', 'changed', 1000, now=1010)
+    # Upstream refreshes every 120s: next poll right after the expected refresh (1240 + 120 + 5)
+    delay = scheduler.update('tu', 'changed', 1120, now=1130)
+    assert delay == 1120 + 120 + 5 - 1130
+    assert REGISTRY.get_sample_value('gtfs_producer_feed_lag_seconds', {'feed': 'tu'}) == 10
+    assert REGISTRY.get_sample_value('gtfs_producer_feed_next_poll_seconds', {'feed': 'tu'}) == delay
+
+
+def test_unchanged_feed_waits_for_expected_refresh_then_backs_off():
+    scheduler = make_scheduler()
+    scheduler.update('tu', 'changed', 1000, now=1010)
+    scheduler.update('tu', 'changed', 1120, now=1130)
+    assert scheduler.update('tu', 'unchanged', now=1200) == 45
+    # Upstream is late, intervals grow up to max_interval
+    assert scheduler.update('tu', 'unchanged', now=1250) == 60
+    assert scheduler.update('tu', 'unchanged', now=1310) == 120
+    assert scheduler.update('tu', 'unchanged', now=1430) == 240
+    assert scheduler.update('tu', 'unchanged', now=1670) == 300
+
+
+def test_error_backoff_with_jitter():
+    scheduler = make_scheduler()
+    with patch('src.producer.PollScheduler.random.random', return_value=1.0):
+        assert scheduler.update('tu', 'error', now=0) == 60
+        assert scheduler.update('tu', 'error', now=60) == 120
+        for _ in range(10):
+            delay = scheduler.update('tu', 'error', now=0)
+    assert delay == 900
+    with patch('src.producer.PollScheduler.random.random', return_value=0.0):
+        assert scheduler.update('tu', 'error', now=0) == 450
+    assert scheduler.update('tu', 'changed', 1000, now=1000) == 30
+    assert scheduler.states['tu']['consecutive_errors'] == 0
+    assert scheduler.states['tu']['errors'] == 13
+
+
+def test_run_polls_each_feed_until_stopped():
+    stop_event = threading.Event()
+    polls = {'tu': 0, 'sa': 0}
+
+    def poll(name):
+        polls[name] += 1
+        if polls['tu'] >= 3:
+            stop_event.set()
+        if name == 'sa':
+            raise RuntimeError("fail")
+        return {'status': 'unchanged'}
+
+    scheduler = PollScheduler({'tu': lambda: poll('tu'), 'sa': lambda: poll('sa')}, min_interval=0.05, max_interval=0.05, max_backoff=10)
+    errors_before = REGISTRY.get_sample_value('gtfs_producer_feed_polls_total', {'feed': 'sa', 'status': 'error'}) or 0
+    scheduler.run(stop_event)
+
+    assert polls['tu'] == 3
+    assert 1 <= polls['sa'] < polls['tu']
+    assert scheduler.states['sa']['consecutive_errors'] == scheduler.states['sa']['errors']
+    errors = REGISTRY.get_sample_value('gtfs_producer_feed_polls_total', {'feed': 'sa', 'status': 'error'}) - errors_before
+    assert errors == scheduler.states['sa']['errors']
@@ -3,6 +3,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from src.gtfs_update.PostgreEngine import PostgreEngine
+from src.consumer.PostgreEngine import PostgreEngine as ConsumerPostgreEngine
 
 @pytest.fixture
 def db_params():
@@ -86,4 +87,78 @@ def test_execute_batch_query_success(mock_connect, db_params):
     engine = PostgreEngine(**db_params)
     engine.connect()
     engine.execute_batch_query('INSERT INTO t VALUES (%s)', [(1,), (2,)])
-    mock_cursor.executemany.assert_called_once_with('INSERT INTO t VALUES (%s)', [(1,), (2,)]) 
\ No newline at end of file
+    mock_cursor.executemany.assert_called_once_with('INSERT INTO t VALUES (%s)', [(1,), (2,)]) 
+
+@patch('src.gtfs_update.PostgreEngine.psycopg.connect')
+def test_gtfs_execute_copy_merge(mock_connect, db_params):
+    mock_cursor = mock_connect.return_value.cursor.return_value
+    copy = mock_cursor.copy.return_value.__enter__.return_value
+    engine = PostgreEngine(**db_params)
+    engine.connect()
+    engine.execute_copy_merge('stop_times', ['trip_id', 'stop_sequence', 'arrival_time'],
+                              iter(['T1,0,08:00:00\n', 'T1,1,\n']), ['trip_id', 'stop_sequence'])
+
+    mock_cursor.copy.assert_called_once_with("COPY stage_stop_times (trip_id, stop_sequence, arrival_time) FROM STDIN (FORMAT csv)")
+    assert [call.args[0] for call in copy.write.call_args_list] == ['T1,0,08:00:00\n', 'T1,1,\n']
+    statements = [' '.join(call.args[0].split()) for call in mock_cursor.execute.call_args_list]
+    assert statements[0].startswith('CREATE TEMP TABLE IF NOT EXISTS stage_stop_times (LIKE stop_times')
+    assert statements[0].endswith('ON COMMIT DROP')
+    assert statements[1] == ('INSERT INTO stop_times (trip_id, stop_sequence, arrival_time) '
+                             'SELECT DISTINCT ON (trip_id, stop_sequence) trip_id, stop_sequence, arrival_time FROM stage_stop_times '
+                             'ORDER BY trip_id, stop_sequence, stage_row DESC '
+                             'ON CONFLICT (trip_id, stop_sequence) DO UPDATE SET arrival_time = EXCLUDED.arrival_time')
+    assert statements[2] == 'TRUNCATE stage_stop_times'
+
+@patch('src.consumer.PostgreEngine.psycopg.connect')
+def test_execute_copy_merge(mock_connect, db_params):
+    mock_cursor = mock_connect.return_value.cursor.return_value
+    copy = mock_cursor.copy.return_value.__enter__.return_value
+    engine = ConsumerPostgreEngine(**db_params)
+    engine.connect()
+    engine.execute_copy_merge('trip_updates', ['trip_id', 'feed_timestamp', 'start_time'],
+                              iter([('t1', 1, '10:00:00'), ('t1', 1, '10:05:00')]), ['trip_id', 'feed_timestamp'])
+
+    mock_cursor.copy.assert_called_once_with("COPY stage_trip_updates (trip_id, feed_timestamp, start_time) FROM STDIN")
+    assert copy.write_row.call_count == 2
+    statements = [' '.join(call.args[0].split()) for call in mock_cursor.execute.call_args_list]
+    assert statements[0].startswith('CREATE TEMP TABLE IF NOT EXISTS stage_trip_updates (LIKE trip_updates')
+    assert statements[1] == ('INSERT INTO trip_updates (trip_id, feed_timestamp, start_time) '
+                             'SELECT DISTINCT ON (trip_id, feed_timestamp) trip_id, feed_timestamp, start_time FROM stage_trip_updates '
+                             'ORDER BY trip_id, feed_timestamp, stage_row DESC '
+                             'ON CONFLICT (trip_id, feed_timestamp) DO UPDATE SET start_time = EXCLUDED.start_time')
+    assert statements[2] == 'TRUNCATE stage_trip_updates'
+
+@patch('src.consumer.PostgreEngine.psycopg.connect')
+def test_execute_copy_merge_keys_only(mock_connect, db_params):
+    mock_cursor = mock_connect.return_value.cursor.return_value
+    engine = ConsumerPostgreEngine(**db_params)
+    engine.connect()
+    engine.execute_copy_merge('alert_entities', ['alert_id', 'trip_id'], [('a1', 't1')], ['alert_id', 'trip_id'])
+    assert mock_cursor.execute.call_args_list[1].args[0].split()[-2:] == ['DO', 'NOTHING']
+
+
+@patch('src.consumer.PostgreEngine.ConnectionPool')
+def test_pooled_mode_borrows_connections(mock_pool_cls, db_params):
+    pool = mock_pool_cls.return_value
+    conn = pool.connection.return_value.__enter__.return_value
+    engine = ConsumerPostgreEngine(**db_params, pool_config={'max_size': 4, 'max_lifetime': 600})
+
+    with engine.borrow() as borrowed:
+        borrowed.execute_query('SELECT 1')
+        borrowed.commit()
+    with engine.borrow() as borrowed:
+        pass
+
+    mock_pool_cls.assert_called_once()
+    kwargs = mock_pool_cls.call_args.kwargs
+    assert kwargs['kwargs']['dbname'] == 'testdb'
+    assert kwargs['max_size'] == 4 and kwargs['max_lifetime'] == 600
+    assert kwargs['check'] is mock_pool_cls.check_connection
+    assert pool.connection.call_count == 2
+    conn.cursor.return_value.execute.assert_called_once_with('SELECT 1', None)
+    conn.commit.assert_called_once()
+    assert borrowed is not engine and engine.pool is pool
+
+    engine.close_pool()
+    pool.close.assert_called_once()
+    assert engine.pool is None
@@ -0,0 +1,108 @@
+# tests/test_producer_async.py
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/producer')))
+import aiohttp
+import fakeredis
+from aiohttp import web
+from conftest import make_feed_bytes
+from prometheus_client import REGISTRY
+
+from src.producer.AsyncRedisEngine import AsyncRedisEngine
+from src.producer.producer_async import (
+    fetch_gtfs_rt_async,
+    main_async,
+    process_feed_data_async,
+)
+
+
+class DummyAsyncKafkaEngine:
+    wire_format = 'json'
+    def __init__(self):
+        self.batches = []
+    async def send(self, topic, records, key=None):
+        self.batches.append((topic, [record['id'] for record in records]))
+        return len(records)
+
+
+async def start_stub(bodies: dict, etag: str | None = None):
+    """Local aiohttp stub serving one GTFS-RT body per path"""
+    async def handler(request):
+        if etag and request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        headers = {'ETag': etag} if etag else {}
+        return web.Response(body=bodies[request.path], headers=headers)
+    app = web.Application()
+    app.router.add_get('/{name}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+def make_redis_engine():
+    engine = AsyncRedisEngine(host='localhost', port=6379)
+    engine.conn = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return engine
+
+
+def test_fetch_gtfs_rt_async_not_modified():
+    async def scenario():
+        runner, base_url = await start_stub({'/tu': make_feed_bytes(1000, ['1'])}, etag='"v1"')
+        state = {}
+        try:
+            async with aiohttp.ClientSession() as session:
+                first = await fetch_gtfs_rt_async(session, f'{base_url}/tu', state)
+                second = await fetch_gtfs_rt_async(session, f'{base_url}/tu', state)
+        finally:
+            await runner.cleanup()
+        return first, second, state
+    first, second, state = asyncio.run(scenario())
+    assert len(first.entity) == 1
+    assert second is None
+    assert state['status'] == 'unchanged'
+
+
+def test_process_feed_data_async_dedup_and_chunks():
+    async def scenario():
+        runner, base_url = await start_stub({'/tu': make_feed_bytes(1000, ['1', '2', '3'])})
+        feed = {'name': 'tu', 'url': f'{base_url}/tu', 'redis_type': 'trip_update', 'topic': 'gtfs-rt-tu', 'key': 'trip_id'}
+        kafka = DummyAsyncKafkaEngine()
+        redis_engine = make_redis_engine()
+        await redis_engine.claim_many(['trip_update_2'], 60)
+        try:
+            async with aiohttp.ClientSession() as session:
+                state = await process_feed_data_async(feed, session, redis_engine, kafka, chunk_size=2)
+        finally:
+            await runner.cleanup()
+        return state, kafka.batches
+    state, batches = asyncio.run(scenario())
+    assert state['status'] == 'changed'
+    assert batches == [('gtfs-rt-tu', ['1']), ('gtfs-rt-tu', ['3'])]
+
+
+def test_main_async_polls_all_feeds_and_stops():
+    async def scenario():
+        bodies = {f'/feed{i}': make_feed_bytes(1000 + i, [f'{i}_a', f'{i}_b']) for i in range(4)}
+        runner, base_url = await start_stub(bodies)
+        feeds = [{'name': f'feed{i}', 'url': f'{base_url}/feed{i}', 'redis_type': f'type{i}', 'topic': f'topic{i}', 'key': None}
+                 for i in range(4)]
+        kafka = DummyAsyncKafkaEngine()
+        stop_event = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.5, stop_event.set)
+        try:
+            await main_async(make_redis_engine(), kafka, feeds, polling={'min_interval': 0.05, 'max_interval': 0.05},
+                             stop_event=stop_event, shutdown_timeout=1)
+        finally:
+            await runner.cleanup()
+        return kafka.batches
+    batches = asyncio.run(scenario())
+    assert sorted(batches) == [(f'topic{i}', [f'{i}_a', f'{i}_b']) for i in range(4)]
+    for i in range(4):
+        assert REGISTRY.get_sample_value('gtfs_producer_feed_lag_seconds', {'feed': f'feed{i}'}) > 0
+        assert REGISTRY.get_sample_value('gtfs_producer_feed_next_poll_seconds', {'feed': f'feed{i}'}) == 0.05
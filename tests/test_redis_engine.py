@@ -1,10 +1,18 @@
 # tests/test_redis_engine.py
 
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/producer')))
+import fakeredis
 import pytest
+from prometheus_client import REGISTRY
 from redis.exceptions import RedisError, ConnectionError
 from unittest.mock import patch, MagicMock
 
-from src.producer.RedisEngine import RedisEngine
+from src.common.LRUCache import LRUCache
+from src.producer.RedisEngine import PRUNE_INTERVAL, RedisEngine
 
 
 @pytest.fixture
@@ -101,4 +109,150 @@ def test_get_key_failure(redis_mock):
     engine = RedisEngine(host="localhost", port=6379)
     result = engine.get_key("test_key")
 
-    assert result is False
\ No newline at end of file
+    assert result is False
+
+def test_claim_many_single_round_trip(redis_mock):
+    instance = MagicMock()
+    redis_mock.return_value = instance
+    instance.ping.return_value = True
+    pipe = instance.pipeline.return_value
+    pipe.execute.return_value = [True, None, True]
+
+    engine = RedisEngine(host="localhost", port=6379)
+    result = engine.claim_many(["a", "b", "c"], 60)
+
+    assert result == [True, False, True]
+    pipe.set.assert_any_call("a", "1", ex=60, nx=True)
+    assert pipe.set.call_count == 3
+    pipe.execute.assert_called_once()
+
+
+def test_claim_many_counts_round_trips(redis_mock):
+    instance = MagicMock()
+    redis_mock.return_value = instance
+    instance.pipeline.return_value.execute.return_value = [True, True]
+    labels = {"operation": "claim_many"}
+    before = REGISTRY.get_sample_value("gtfs_producer_redis_round_trips_total", labels) or 0
+
+    engine = RedisEngine(host="localhost", port=6379)
+    engine.claim_many(["a", "b"], 60)
+
+    assert REGISTRY.get_sample_value("gtfs_producer_redis_round_trips_total", labels) == before + 1
+
+
+def test_claim_many_failure_considers_all_new(redis_mock):
+    instance = MagicMock()
+    redis_mock.return_value = instance
+    instance.ping.return_value = True
+    instance.pipeline.return_value.execute.side_effect = RedisError("Some error")
+
+    engine = RedisEngine(host="localhost", port=6379)
+    result = engine.claim_many(["a", "b"], 60)
+
+    assert result == [True, True]
+    assert engine.conn is None
+
+
+def test_claim_changed_detects_new_digests(redis_mock):
+    redis_mock.return_value = fakeredis.FakeRedis(decode_responses=True)
+
+    engine = RedisEngine(host="localhost", port=6379)
+    assert engine.claim_changed("fp", [("a", "111"), ("b", "222")]) == [True, True]
+    assert engine.claim_changed("fp", [("a", "111"), ("b", "333")]) == [False, True]
+    assert engine.prune_fingerprints("fp", 3600) == 0
+    assert engine.prune_fingerprints("fp", -3600, interval = 0) == 2
+
+
+def test_prune_fingerprints_is_throttled(redis_mock):
+    redis_mock.return_value = fakeredis.FakeRedis(decode_responses=True)
+
+    engine = RedisEngine(host="localhost", port=6379)
+    engine.claim_changed("fp", [("a", "111")])
+    assert engine.prune_fingerprints("fp", 3600) == 0
+    # A second pass within the interval does not run the script
+    assert engine.prune_fingerprints("fp", -3600) == 0
+    assert engine.conn.hlen("fp") == 1
+    engine.last_pruned["fp"] -= PRUNE_INTERVAL
+    assert engine.prune_fingerprints("fp", -3600) == 1
+
+
+def test_claim_changed_no_connection(redis_mock):
+    redis_mock.return_value.ping.side_effect = ConnectionError("Connection error")
+
+    engine = RedisEngine(host="localhost", port=6379)
+
+    assert engine.claim_changed("fp", [("a", "111")]) == [True]
+
+
+def test_claim_many_local_cache_skips_redis(redis_mock):
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    redis_mock.return_value = fake
+    fake.set("b", "1", ex=60)
+
+    engine = RedisEngine(host="localhost", port=6379, local_cache=LRUCache(max_ttl=3600))
+    assert engine.claim_many(["a", "b"], 3600) == [True, False]
+
+    with patch.object(fake, "eval", wraps=fake.eval) as script, patch.object(fake, "pttl") as pttl:
+        assert engine.claim_many(["a", "b", "c"], 3600) == [False, False, True]
+        assert engine.claim_many(["a", "b", "c"], 3600) == [False, False, False]
+    assert script.call_count == 1
+    pttl.assert_not_called()
+    assert engine.local_cache.pop_stats()["hits"] == 5
+
+
+def test_claim_many_local_cache_keeps_remaining_ttl(redis_mock):
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    redis_mock.return_value = fake
+    fake.set("b", "1", ex=1)
+
+    engine = RedisEngine(host="localhost", port=6379, local_cache=LRUCache(max_ttl=3600))
+    engine.claim_many(["b"], 3600)
+
+    value, expires_at = engine.local_cache._entries["b"]
+    assert value is True
+    assert expires_at - time.monotonic() <= 1
+
+
+def test_claim_many_redis_down_publishes_once(redis_mock):
+    instance = MagicMock()
+    redis_mock.return_value = instance
+    instance.eval.side_effect = RedisError("Some error")
+
+    engine = RedisEngine(host="localhost", port=6379, local_cache=LRUCache(max_ttl=3600))
+    assert engine.claim_many(["a", "b"], 60) == [True, True]
+    assert engine.claim_many(["a", "b", "c"], 60) == [False, False, True]
+    assert engine.exists("a") is True
+
+
+def test_claim_many_redis_down_without_local_cache_publishes_once(redis_mock):
+    instance = MagicMock()
+    redis_mock.return_value = instance
+    instance.pipeline.return_value.execute.side_effect = RedisError("Some error")
+
+    engine = RedisEngine(host="localhost", port=6379)
+    assert engine.claim_many(["a", "b"], 60) == [True, True]
+    assert engine.claim_many(["a", "b", "c"], 60) == [False, False, True]
+
+
+def test_claim_changed_redis_down_without_local_cache_publishes_changes_once(redis_mock):
+    instance = MagicMock()
+    redis_mock.return_value = instance
+    instance.eval.side_effect = RedisError("Some error")
+
+    engine = RedisEngine(host="localhost", port=6379)
+    assert engine.claim_changed("fp", [("a", "111"), ("b", "222")]) == [True, True]
+    assert engine.claim_changed("fp", [("a", "111"), ("b", "333")]) == [False, True]
+
+
+def test_claim_changed_local_cache(redis_mock):
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    redis_mock.return_value = fake
+
+    engine = RedisEngine(host="localhost", port=6379, local_cache=LRUCache(max_ttl=3600))
+    assert engine.claim_changed("fp", [("a", "111"), ("b", "222")]) == [True, True]
+    with patch.object(fake, "eval", wraps=fake.eval) as script:
+        assert engine.claim_changed("fp", [("a", "111"), ("b", "222")]) == [False, False]
+        script.assert_not_called()
+        assert engine.claim_changed("fp", [("a", "111"), ("b", "333")]) == [False, True]
+        script.assert_called_once()
+        assert script.call_args.args[4:] == ("b", "333")